@@ -1,13 +1,17 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional
-import io
+from typing import List, Optional
+import asyncio
+import functools
+import os
+import queue
+import random
+import time
 import torch
-from PIL import Image
-import torchvision.transforms as T
 import logging
+import logging.handlers
 from contextlib import asynccontextmanager
 
 # Configuration du logging
@@ -16,51 +20,245 @@ logger = logging.getLogger(__name__)
 
 # Import des configurations et modèles
 from src.utils.config import load_all_configs
-from src.models.models import build_model
+from src.models.runtime import CPU_ONLY_RUNTIMES
+from src.data.preprocess import BatchPreprocessor
+from src.serving.batcher import MicroBatcher
+from src.serving.cache import PredictionCache, content_hash, make_backend
+from src.serving.archive import extract_images, is_archive
+from src.serving.decode import decode_image, decode_many, timed
+from src.serving.executor import ExecutorStage, Overloaded, configure_torch_threads
+from src.serving.registry import ModelRegistry
+from src.serving.telemetry import Histogram, MetricsRegistry
 
-# Variables globales pour le modèle
-model = None
+# Variables globales (un registre de modèles, un micro-batcher et un cache par modèle chargé)
+registry = None
 device = None
-tfm = None
+prep = None
 cfg = None
+batchers = {}
+decode_stage = None
+infer_stage = None
+caches = {}
+watcher = None
+thresholds = {}  # modèle servi -> seuil de décision (configs/api.yaml: threshold), absent = non validé
+log_sample_rate = 1.0  # fraction des requêtes loggées (configs/api.yaml: logging.request_sample_rate)
+log_listener = None
+
+# Métriques /metrics (format Prometheus) : comptées pour toutes les requêtes, logs ou pas
+LATENCY_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+metrics = MetricsRegistry()
+requests_total = metrics.counter("api_requests_total", "Requêtes HTTP par route et statut", ("endpoint", "method", "status"))
+request_seconds = {}  # route -> Histogram (durée totale côté serveur)
+metrics.register("api_request_duration_seconds", "Durée des requêtes HTTP par route", "histogram",
+                 lambda: [({"endpoint": k}, h) for k, h in list(request_seconds.items())])
+bytes_total = metrics.counter("api_received_bytes_total", "Octets d'images reçus", ("endpoint",))
+images_total = metrics.counter("api_images_total", "Images reçues par route", ("endpoint",))
+predictions_total = metrics.counter("api_predictions_total", "Prédictions par modèle et classe", ("model", "label"))
+decode_seconds = metrics.histogram("api_decode_seconds", "Décodage d'une image (dans le worker)", LATENCY_BUCKETS_S)
+preprocess_seconds = metrics.histogram("api_preprocess_seconds", "Prétraitement d'un batch (BatchPreprocessor)",
+                                       LATENCY_BUCKETS_S)
+forward_seconds = metrics.histogram("api_forward_seconds", "Forward d'un batch", LATENCY_BUCKETS_S)
+metrics.register("api_queue_wait_seconds", "Attente en file du micro-batcher", "histogram",
+                 lambda: [({"model": k}, b.queue_wait_ms) for k, b in list(batchers.items())], scale=1e-3)
+metrics.register("api_batch_size", "Taille des batchs du micro-batcher", "histogram",
+                 lambda: [({"model": k}, b.batch_sizes) for k, b in list(batchers.items())])
+metrics.register("api_queue_depth", "Requêtes en file du micro-batcher", "gauge",
+                 lambda: [({"model": k}, b.stats()["queue_depth"]) for k, b in list(batchers.items())])
+metrics.register("api_rejected_total", "Requêtes refusées (backpressure) par étage", "counter",
+                 lambda: [({"stage": st.name}, st.rejected) for st in (decode_stage, infer_stage) if st is not None]
+                 + [({"stage": f"batcher:{k}"}, b.rejected) for k, b in list(batchers.items())])
+metrics.register("api_cache_hits_total", "Hits du cache de prédictions", "counter",
+                 lambda: [({"model": k}, c.hits) for k, c in list(caches.items())])
+metrics.register("api_cache_misses_total", "Misses du cache de prédictions", "counter",
+                 lambda: [({"model": k}, c.misses) for k, c in list(caches.items())])
+metrics.register("api_model_swaps_total", "Rechargements à chaud de checkpoints", "counter",
+                 lambda: [({}, registry.swaps)] if registry is not None else [])
+
+
+def _sampled() -> bool:
+    """Log par requête échantillonné : le formatage n'est fait que pour les requêtes retenues."""
+    return log_sample_rate >= 1.0 or (log_sample_rate > 0.0 and random.random() < log_sample_rate)
+
+
+def _start_async_logging():
+    """Handlers racine déplacés derrière une file : l'écriture des logs se fait dans un thread dédié."""
+    root = logging.getLogger()
+    handlers = [h for h in root.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+    if not handlers:
+        return None
+    q = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    for h in handlers:
+        root.removeHandler(h)
+    root.addHandler(logging.handlers.QueueHandler(q))
+    listener.start()
+    return listener
+
+
+def _stop_async_logging(listener):
+    root = logging.getLogger()
+    for h in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(h)
+    listener.stop()  # vide la file avant de rendre les handlers
+    for h in listener.handlers:
+        root.addHandler(h)
+
+
+def _refresh_threshold(name: str):
+    """Seuil re-vérifié pour le checkpoint servi ; en cas d'écart le modèle répond 503 jusqu'à un rapport à jour."""
+    try:
+        value = _resolve_threshold(name)
+    except RuntimeError as e:
+        if thresholds.pop(name, None) is not None:
+            logger.error(f"❌ {e} (prédictions refusées en attendant)")
+        return
+    if thresholds.get(name) != value:
+        logger.info(f"🎯 {name}: seuil de décision {value:.4f}")
+    thresholds[name] = value
+
+
+async def _watch_checkpoints(interval_s: float):
+    """Hot swap : recharge en arrière-plan les checkpoints modifiés, puis invalide le cache du modèle."""
+    while True:
+        await asyncio.sleep(interval_s)
+        for name in registry.names():
+            if name not in thresholds:  # rapport de seuils réécrit depuis le swap ?
+                _refresh_threshold(name)
+        try:
+            swapped = await asyncio.to_thread(registry.check_updates, logger)
+        except Exception as e:
+            logger.error(f"❌ Surveillance des checkpoints: {e}")
+            continue
+        for entry in swapped:
+            if entry.name in caches:
+                caches[entry.name].set_namespace(entry.name, entry.digest, registry.img_size, registry.tta)
+            _refresh_threshold(entry.name)
+
+
+def _preload_names(cfg) -> tuple:
+    """(noms à pré-charger en plus du défaut, strict) ; "all" = modèles de configs/models.yaml avec checkpoint."""
+    preload = cfg["api"].get("models", {}).get("preload", [])
+    if preload == "all":
+        return list(cfg["models"]["available"]), False
+    return list(preload or []), True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestion du cycle de vie de l'application"""
-    global model, device, tfm, cfg
+    global registry, device, prep, cfg, batchers, decode_stage, infer_stage, caches, watcher, thresholds
+    global log_sample_rate, log_listener
     
     # Startup
     logger.info("🚀 Initialisation de l'API Cancer Detection...")
     try:
         cfg = load_all_configs()
-        best_checkpoint = f"checkpoints/best_{cfg['train']['model_name']}.pt"
-        img_size = cfg["train"]["img_size"]
+        lcfg = cfg["api"].get("logging", {})
+        log_sample_rate = float(lcfg.get("request_sample_rate", 1.0))
+        if lcfg.get("async", False) and log_listener is None:
+            log_listener = _start_async_logging()
+        runtime = cfg["api"].get("runtime", "eager")
+        
+        # Threads torch + pools d'exécution (décodage / inférence) hors boucle asyncio
+        ecfg = cfg["api"].get("executor", {})
+        configure_torch_threads(ecfg.get("torch_threads"), ecfg.get("torch_interop_threads"))
+        decode_stage = ExecutorStage(
+            "decode",
+            ecfg.get("decode_backend", "thread"), ecfg.get("decode_workers", 2),
+            max_pending=ecfg.get("max_pending_decode", 64),
+        )
+        infer_stage = ExecutorStage(
+            "inference",
+            "thread", ecfg.get("inference_workers", 1),
+            max_pending=ecfg.get("max_pending_inference", 8),
+        )
+        logger.info(f"🧵 torch threads={torch.get_num_threads()}, "
+                    f"décodage={ecfg.get('decode_backend', 'thread')}x{decode_stage.workers}, "
+                    f"inférence={infer_stage.workers}")
         
         # Configuration du device
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        device = torch.device("cuda" if torch.cuda.is_available() and runtime not in CPU_ONLY_RUNTIMES else "cpu")
         logger.info(f"📱 Device utilisé: {device}")
         
-        # Chargement du modèle
-        logger.info(f"📦 Chargement du modèle: {cfg['train']['model_name']}")
-        model = build_model(
-            cfg["train"]["model_name"], 
-            num_classes=1, 
-            pretrained=False
-        ).to(device)
+        # Registre : modèle par défaut + pré-chargements (eager, ou artefacts TorchScript / ONNX de src.export).
+        # Chaque modèle est chauffé par un forward à blanc, qui échoue dès le démarrage si l'artefact
+        # ne correspond pas à img_size.
+        img_size = cfg["train"]["img_size"]
+        channels_last = bool(cfg["api"].get("channels_last", False))
+        prep = BatchPreprocessor(img_size, channels_last=channels_last)
+        default = cfg["train"]["model_name"]
+        registry = ModelRegistry(prep, img_size, runtime, device, channels_last, default=default,
+                                 preprocess_s=preprocess_seconds, forward_s=forward_seconds,
+                                 tta=int(cfg["api"].get("tta", 1)))
+        logger.info(f"📦 Chargement du modèle: {default} (runtime={runtime}"
+                    + (f", TTA {registry.tta} vues)" if registry.tta > 1 else ")"))
+        await asyncio.to_thread(registry.load, default)
+        names, strict = _preload_names(cfg)
+        for name in names:
+            if name in registry.names():
+                continue
+            if not strict and not os.path.exists(registry.checkpoint(name)):
+                logger.info(f"⏭️ {name}: pas de {registry.checkpoint(name)}, non chargé")
+                continue
+            try:
+                await asyncio.to_thread(registry.load, name)
+            except Exception as e:
+                if strict:
+                    raise
+                logger.warning(f"⚠️ {name} non chargé: {e}")
+        ens_cfg = cfg["api"].get("ensemble") or {}
+        if ens_cfg.get("report"):
+            # ensemble de src.ensemble servi comme un modèle (?model=ensemble), sur les modèles du registre
+            ens_name = ens_cfg.get("name", "ensemble")
+            await asyncio.to_thread(registry.add_ensemble, ens_name, ens_cfg["report"], ens_cfg.get("workers"))
+            stale = registry.stale_members(ens_name)
+            if stale:
+                logger.warning(f"⚠️ {ens_name}: poids ajustés sur d'autres checkpoints pour {stale} "
+                               f"(relancer python -m src.ensemble)")
+        for name in registry.names():
+            e = registry.get(name)
+            logger.info(f"✅ Modèle {name} chargé ({e.load_ms:.0f}ms + warmup {e.warmup_ms:.0f}ms, {e.memory_mb:.1f}Mo)")
+        # un seuil par modèle servi ; un seuil nommé calculé pour un autre modèle empêche le démarrage
+        for name in registry.names():
+            thresholds[name] = _resolve_threshold(name)
+        logger.info(f"🎯 Seuils de décision ({cfg['api'].get('threshold', 0.5)}): "
+                    + ", ".join(f"{n}={t:.4f}" for n, t in thresholds.items()))
+        
+        # Cache de prédictions (namespace = modèle + empreinte du checkpoint + img_size)
+        ccfg = cfg["api"].get("cache", {})
+        if ccfg.get("enabled", True):
+            for name in registry.names():
+                caches[name] = PredictionCache(
+                    max_entries=ccfg.get("max_entries", 50000),
+                    ttl_s=ccfg.get("ttl_s", 3600),
+                    backend=make_backend(ccfg.get("backend", "memory"), disk_dir=ccfg.get("disk_dir", ".cache/predictions")),
+                )
+                caches[name].set_namespace(name, registry.get(name).digest, img_size, registry.tta)
+                logger.info(f"🗃️ Cache de prédictions actif ({caches[name].stats()['backend']}, "
+                            f"namespace={caches[name].namespace})")
         
-        model.load_state_dict(torch.load(best_checkpoint, map_location=device))
-        model.eval()
-        logger.info("✅ Modèle chargé avec succès")
+        # Micro-batching des requêtes concurrentes, par modèle (forward exécuté dans le pool d'inférence)
+        bcfg = cfg["api"].get("batching", {})
+        for name in registry.names():
+            batchers[name] = MicroBatcher(
+                functools.partial(registry.forward, name),
+                max_batch_size=bcfg.get("max_batch_size", 32),
+                max_wait_ms=bcfg.get("max_wait_ms", 5),
+                executor=infer_stage,
+                max_queue=ecfg.get("max_queue", 128),
+            )
+            await batchers[name].start()
+        logger.info(f"✅ Micro-batching actif (max_batch_size={bcfg.get('max_batch_size', 32)}, "
+                    f"max_wait_ms={bcfg.get('max_wait_ms', 5):g})")
         
-        # Transformations d'image
-        tfm = T.Compose([
-            T.Resize((img_size, img_size)),
-            T.ToTensor(),
-            T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ])
+        # Rechargement à chaud des checkpoints modifiés
+        interval = float(cfg["api"].get("models", {}).get("watch_interval_s", 0))
+        if interval > 0:
+            watcher = asyncio.create_task(_watch_checkpoints(interval))
+            logger.info(f"👀 Surveillance des checkpoints toutes les {interval:g}s")
         
-        logger.info("✅ API prête à recevoir des requêtes")
+        logger.info(f"✅ API prête à recevoir des requêtes (logs par requête: {log_sample_rate:.0%}, "
+                    f"{'asynchrones' if log_listener is not None else 'synchrones'} ; compteurs sur /metrics)")
         
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'initialisation: {str(e)}")
@@ -70,6 +268,18 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Arrêt de l'API...")
+    if watcher is not None:
+        watcher.cancel()
+    for b in batchers.values():
+        await b.stop()
+    for stage in (decode_stage, infer_stage):
+        if stage is not None:
+            stage.shutdown()
+    if registry is not None:
+        registry.close()
+    if log_listener is not None:
+        _stop_async_logging(log_listener)
+        log_listener = None
 
 
 # Création de l'application FastAPI
@@ -90,12 +300,43 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    """Compteur par route / statut + durée côté serveur (route = gabarit FastAPI, pas l'URL brute)."""
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        requests_total.inc(endpoint=endpoint, method=request.method, status=status)
+        hist = request_seconds.get(endpoint)
+        if hist is None:
+            hist = request_seconds.setdefault(endpoint, Histogram(LATENCY_BUCKETS_S))
+        hist.observe(time.perf_counter() - t0)
+
+
 # Modèles Pydantic
 class PredictionResponse(BaseModel):
     probability_cancer: float = Field(..., ge=0.0, le=1.0, description="Probabilité de cancer (0-1)")
     label: int = Field(..., ge=0, le=1, description="Classe prédite (0: sain, 1: cancer)")
     confidence: float = Field(..., ge=0.0, le=1.0, description="Niveau de confiance")
     prediction: str = Field(..., description="Prédiction en texte")
+    model_name: Optional[str] = Field(None, description="Modèle ayant produit la prédiction")
+
+
+class BatchItemResponse(PredictionResponse):
+    index: int = Field(..., ge=0, description="Position de l'image dans la requête")
+    filename: str
+
+
+class BatchItemError(BaseModel):
+    index: int
+    filename: str
+    error: str
 
 
 class HealthResponse(BaseModel):
@@ -103,6 +344,7 @@ class HealthResponse(BaseModel):
     model_name: str
     device: str
     image_size: int
+    models: List[str] = []
 
 
 class ErrorResponse(BaseModel):
@@ -110,6 +352,83 @@ class ErrorResponse(BaseModel):
     detail: Optional[str] = None
 
 
+ALLOWED_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/tiff", "image/tif"]
+ALLOWED_EXTENSIONS = [".jpg", ".jpeg", ".png", ".tif", ".tiff"]
+
+
+def _is_supported(file: UploadFile) -> bool:
+    # Vérification par extension si le content_type n'est pas reconnu
+    file_extension = file.filename.lower().split('.')[-1] if file.filename else ""
+    return file.content_type in ALLOWED_TYPES or f".{file_extension}" in ALLOWED_EXTENSIONS
+
+
+def _resolve_threshold(name: str) -> float:
+    """
+    Seuil fixe (ex: 0.5) ou point de fonctionnement "best_f1" / "target_recall" calculé pour le modèle
+    servi `name` (src.evaluate, ou src.ensemble pour un ensemble) ; RuntimeError si le rapport ne lui correspond pas.
+    """
+    value = cfg["api"].get("threshold", 0.5)
+    if not isinstance(value, str):
+        return float(value)
+    return registry.operating_point(name, value, cfg["api"].get("threshold_report", "reports/metrics.json"))
+
+
+def _threshold(name: str) -> float:
+    """Seuil courant de `name` ; 503 tant que son rapport ne correspond pas au checkpoint rechargé."""
+    if name not in thresholds:
+        raise HTTPException(status_code=503, detail=f"Seuil de décision de {name} non validé pour le checkpoint servi")
+    return thresholds[name]
+
+
+def _to_response(probability: float, threshold: float, model_name: Optional[str] = None) -> dict:
+    """Probabilité -> champs de PredictionResponse (classe, confiance, texte)."""
+    label = int(probability >= threshold)
+    confidence = probability if label == 1 else (1 - probability)
+    return {
+        "probability_cancer": round(probability, 4),
+        "label": label,
+        "confidence": round(confidence, 4),
+        "prediction": "Cancer détecté" if label == 1 else "Tissu sain",
+        "model_name": model_name,
+    }
+
+
+def _resolve_model(name: Optional[str]) -> str:
+    """?model= -> nom d'un modèle chargé (défaut si absent), 404 sinon."""
+    if name is None:
+        return registry.default
+    if name not in registry.names():
+        raise HTTPException(status_code=404, detail=f"Modèle non chargé: {name}. Disponibles: {registry.names()}")
+    return name
+
+
+async def _cache_key(data: bytes) -> str:
+    # Hash hors boucle asyncio pour les gros fichiers
+    if len(data) > 1024 * 1024:
+        return await asyncio.to_thread(content_hash, data)
+    return content_hash(data)
+
+
+async def _run_with_retry(stage: ExecutorStage, fn, *args):
+    """Pour un flux déjà ouvert : on attend qu'une place se libère au lieu d'échouer."""
+    while True:
+        try:
+            return await stage.run(fn, *args)
+        except Overloaded:
+            await asyncio.sleep(0.01)
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    """Backpressure : file pleine -> 503 (ou 429) + Retry-After plutôt que d'empiler."""
+    ecfg = cfg["api"].get("executor", {})
+    logger.warning(f"⏳ Requête refusée: {e}")
+    return HTTPException(
+        status_code=int(ecfg.get("overload_status", 503)),
+        detail=f"Serveur saturé ({e.stage}). Veuillez réessayer.",
+        headers={"Retry-After": str(ecfg.get("retry_after_s", 1))}
+    )
+
+
 # Routes
 @app.get("/", tags=["General"])
 async def root():
@@ -122,7 +441,12 @@ async def root():
             "docs": "/docs",
             "redoc": "/redoc",
             "health": "/health",
-            "predict": "/predict"
+            "predict": "/predict",
+            "predict_batch": "/predict/batch",
+            "batching_stats": "/batching/stats",
+            "executor_stats": "/executor/stats",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics"
         }
     }
 
@@ -130,42 +454,40 @@ async def root():
 @app.get("/health", response_model=HealthResponse, tags=["General"])
 async def health_check():
     """Vérification de l'état de santé de l'API et du modèle"""
-    if model is None or cfg is None:
+    if registry is None or cfg is None:
         raise HTTPException(status_code=503, detail="Modèle non initialisé")
     
     return HealthResponse(
         status="healthy",
-        model_name=cfg['train']['model_name'],
+        model_name=registry.default,
         device=str(device),
-        image_size=cfg["train"]["img_size"]
+        image_size=cfg["train"]["img_size"],
+        models=registry.names()
     )
 
 
 @app.post("/predict", response_model=PredictionResponse, tags=["Prediction"])
-async def predict(file: UploadFile = File(..., description="Image médicale à analyser (JPG, PNG, TIFF)")):
+async def predict(file: UploadFile = File(..., description="Image médicale à analyser (JPG, PNG, TIFF)"),
+                  model: Optional[str] = Query(None, description="Modèle chargé à utiliser (défaut: train.model_name)")):
     """
     Prédiction de cancer à partir d'une image médicale
     
     - **file**: Image au format JPG, PNG, JPEG, TIF, TIFF
+    - **model**: (optionnel) un des modèles chargés, voir /model/info
     - Retourne: Probabilité de cancer et classification
     """
     
     # Vérification du modèle
-    if model is None or tfm is None:
+    if registry is None or not batchers or decode_stage is None:
         raise HTTPException(
             status_code=503, 
             detail="Modèle non initialisé. Veuillez réessayer."
         )
+    name = _resolve_model(model)
+    cache = caches.get(name)
     
     # Vérification du type de fichier
-    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/tiff", "image/tif"]
-    allowed_extensions = [".jpg", ".jpeg", ".png", ".tif", ".tiff"]
-    
-    # Vérification par extension si le content_type n'est pas reconnu
-    file_extension = file.filename.lower().split('.')[-1] if file.filename else ""
-    is_valid_extension = f".{file_extension}" in allowed_extensions
-    
-    if file.content_type not in allowed_types and not is_valid_extension:
+    if not _is_supported(file):
         raise HTTPException(
             status_code=400,
             detail=f"Format de fichier non supporté. Formats acceptés: JPG, PNG, TIFF"
@@ -173,8 +495,11 @@ async def predict(file: UploadFile = File(..., description="Image médicale à a
     
     try:
         # Lecture et traitement de l'image
-        logger.info(f"📷 Traitement de l'image: {file.filename}")
+        if _sampled():
+            logger.info(f"📷 Traitement de l'image: {file.filename}")
         image_data = await file.read()
+        bytes_total.inc(len(image_data), endpoint="/predict")
+        images_total.inc(endpoint="/predict")
         
         # Vérification de la taille du fichier (max 10MB)
         if len(image_data) > 10 * 1024 * 1024:
@@ -183,32 +508,35 @@ async def predict(file: UploadFile = File(..., description="Image médicale à a
                 detail="Fichier trop volumineux. Taille maximale: 10MB"
             )
         
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
+        # Cache : même image + même checkpoint => pas de nouveau forward
+        key = await _cache_key(image_data) if cache is not None else None
+        probability = cache.get(key) if key is not None else None
         
-        # Transformation et préparation pour le modèle
-        x = tfm(image).unsqueeze(0).to(device)
-        
-        # Prédiction
-        with torch.no_grad():
-            logits = model(x)
-            probability = torch.sigmoid(logits).item()
+        if probability is None:
+            namespace = cache.namespace if cache is not None else None
+            # Décodage + transformation dans le pool dédié (ne bloque pas la boucle asyncio)
+            x, elapsed = await decode_stage.run(timed, decode_image, image_data, cfg["train"]["img_size"])
+            decode_seconds.observe(elapsed)
+            
+            # Prédiction (regroupée avec les requêtes concurrentes du même modèle)
+            probability = await batchers[name].submit(x)
+            # pas de mise en cache si le checkpoint a été rechargé pendant le forward
+            if key is not None and cache.namespace == namespace:
+                cache.put(key, probability)
         
         # Détermination de la classe et de la confiance
-        label = int(probability >= 0.5)
-        confidence = probability if label == 1 else (1 - probability)
-        prediction_text = "Cancer détecté" if label == 1 else "Tissu sain"
+        response = PredictionResponse(**_to_response(probability, _threshold(name), name))
+        predictions_total.inc(model=name, label=response.label)
         
-        logger.info(f"✅ Prédiction: {prediction_text} (prob: {probability:.4f})")
+        if _sampled():
+            logger.info(f"✅ Prédiction: {response.prediction} (prob: {probability:.4f})")
         
-        return PredictionResponse(
-            probability_cancer=round(probability, 4),
-            label=label,
-            confidence=round(confidence, 4),
-            prediction=prediction_text
-        )
+        return response
         
     except HTTPException:
         raise
+    except Overloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.error(f"❌ Erreur lors de la prédiction: {str(e)}")
         raise HTTPException(
@@ -217,28 +545,199 @@ async def predict(file: UploadFile = File(..., description="Image médicale à a
         )
 
 
+@app.post("/predict/batch", tags=["Prediction"])
+async def predict_batch(files: List[UploadFile] = File(..., description="Images, ou une archive zip/tar de patches"),
+                        model: Optional[str] = Query(None, description="Modèle chargé à utiliser (défaut: train.model_name)")):
+    """
+    Prédiction en lot (ex: patches d'une lame entière)
+    
+    - **files**: plusieurs images, ou une seule archive .zip / .tar / .tar.gz
+    - **model**: (optionnel) un des modèles chargés, voir /model/info
+    - Retourne: flux NDJSON, une ligne par image, dans l'ordre d'entrée
+    """
+    
+    # Vérification du modèle
+    if registry is None or decode_stage is None or infer_stage is None:
+        raise HTTPException(
+            status_code=503, 
+            detail="Modèle non initialisé. Veuillez réessayer."
+        )
+    name = _resolve_model(model)
+    _threshold(name)
+    cache = caches.get(name)
+    
+    bcfg = cfg["api"].get("batch", {})
+    max_total_mb = int(bcfg.get("max_total_mb", 256))
+    max_total = max_total_mb * 1024 * 1024
+    chunk_size = max(1, int(bcfg.get("chunk_size", 64)))
+    img_size = cfg["train"]["img_size"]
+    
+    # Lecture des fichiers avec limite de taille cumulée
+    items, total = [], 0
+    for f in files:
+        data = await f.read()
+        total += len(data)
+        if total > max_total:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Lot trop volumineux. Taille maximale: {max_total_mb}MB"
+            )
+        if len(files) == 1 and is_archive(f.filename):
+            try:
+                items = await asyncio.to_thread(extract_images, data, f.filename, max_total)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Archive illisible: {e}")
+        elif not _is_supported(f):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Format de fichier non supporté ({f.filename}). Formats acceptés: JPG, PNG, TIFF, ZIP, TAR"
+            )
+        else:
+            items.append((f.filename or f"file_{len(items)}", data))
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="Aucune image à traiter")
+    bytes_total.inc(total, endpoint="/predict/batch")
+    images_total.inc(len(items), endpoint="/predict/batch")
+    if _sampled():
+        logger.info(f"📦 Lot de {len(items)} images ({total / 1024 / 1024:.1f}MB)")
+    
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    n_split = decode_stage.workers
+    
+    async def decode_chunk(chunk):
+        # Les images déjà en cache ne sont ni décodées ni prédites (float à la place du tenseur)
+        namespace = cache.namespace if cache is not None else None
+        keys = [await _cache_key(data) for _, data in chunk] if cache is not None else [None] * len(chunk)
+        decoded = [cache.get(k) if k is not None else None for k in keys]
+        todo = [i for i, x in enumerate(decoded) if x is None]
+        if todo:
+            # Un sous-lot par worker : décodage concurrent sans saturer la file du pool
+            datas = [chunk[i][1] for i in todo]
+            step = -(-len(datas) // n_split)
+            parts = await asyncio.gather(*(
+                _run_with_retry(decode_stage, timed, decode_many, datas[j:j + step], img_size)
+                for j in range(0, len(datas), step)
+            ))
+            for part, elapsed in parts:
+                for _ in part:
+                    decode_seconds.observe(elapsed / len(part))  # temps moyen par image du sous-lot
+            for i, x in zip(todo, (x for part, _ in parts for x in part)):
+                decoded[i] = x
+        return decoded, keys, namespace
+    
+    async def stream():
+        offset = 0
+        next_decode = asyncio.ensure_future(decode_chunk(chunks[0]))
+        try:
+            for k, chunk in enumerate(chunks):
+                decoded, keys, namespace = await next_decode
+                # On décode le chunk suivant pendant le forward du chunk courant
+                if k + 1 < len(chunks):
+                    next_decode = asyncio.ensure_future(decode_chunk(chunks[k + 1]))
+                
+                ok = [i for i, x in enumerate(decoded) if isinstance(x, torch.Tensor)]
+                probs = []
+                if ok:
+                    xb = torch.stack([decoded[i] for i in ok])
+                    try:
+                        probs = (await _run_with_retry(infer_stage, registry.forward, name, xb)).tolist()
+                    except Exception as e:
+                        logger.error(f"❌ Erreur lors de la prédiction du lot: {str(e)}")
+                        decoded = [f"Erreur lors de la prédiction: {e}"] * len(chunk)
+                        ok = []
+                by_index = {i: x for i, x in enumerate(decoded) if isinstance(x, float)}
+                # pas de mise en cache si le checkpoint a été rechargé depuis le décodage du chunk
+                fresh = cache is not None and cache.namespace == namespace
+                for i, p in zip(ok, probs):
+                    by_index[i] = p
+                    if fresh and keys[i] is not None:
+                        cache.put(keys[i], p)
+                threshold = thresholds.get(name)  # retiré si un hot swap l'a invalidé en cours de lot
+                if threshold is None:
+                    by_index = {}
+                    decoded = [f"Seuil de décision de {name} non validé pour le checkpoint servi"] * len(chunk)
+                
+                for i, (fname, _) in enumerate(chunk):
+                    if i in by_index:
+                        line = BatchItemResponse(index=offset + i, filename=fname,
+                                                 **_to_response(by_index[i], threshold, name))
+                        predictions_total.inc(model=name, label=line.label)
+                    else:
+                        line = BatchItemError(index=offset + i, filename=fname, error=decoded[i])
+                    yield line.model_dump_json() + "\n"
+                offset += len(chunk)
+        finally:
+            next_decode.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.get("/model/info", tags=["Model"])
-async def model_info():
-    """Informations détaillées sur le modèle chargé"""
-    if model is None or cfg is None:
+async def model_info(model: Optional[str] = Query(None, description="Modèle chargé (défaut: train.model_name)")):
+    """Informations détaillées sur un modèle chargé + registre (mémoire, temps de chargement de chaque modèle)"""
+    if registry is None or cfg is None:
         raise HTTPException(status_code=503, detail="Modèle non initialisé")
+    name = _resolve_model(model)
     
     try:
-        total_params = sum(p.numel() for p in model.parameters())
-        trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+        entry = registry.get(name)
+        trainable_params = sum(p.numel() for p in entry.predictor.parameters() if p.requires_grad)
         
         return {
-            "model_name": cfg['train']['model_name'],
-            "total_parameters": total_params,
+            **entry.info(),
             "trainable_parameters": trainable_params,
             "input_size": cfg["train"]["img_size"],
             "device": str(device),
-            "checkpoint": f"checkpoints/best_{cfg['train']['model_name']}.pt"
+            "runtime": registry.runtime,
+            "threshold": thresholds.get(name),
+            "registry": registry.info(),
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/batching/stats", tags=["Model"])
+async def batching_stats(model: Optional[str] = Query(None, description="Modèle chargé (défaut: train.model_name)")):
+    """Histogrammes de taille de batch et d'attente en file du micro-batcher d'un modèle"""
+    if registry is None or not batchers:
+        raise HTTPException(status_code=503, detail="Modèle non initialisé")
+    return batchers[_resolve_model(model)].stats()
+
+
+@app.get("/executor/stats", tags=["Model"])
+async def executor_stats():
+    """Occupation des pools de décodage / inférence et requêtes refusées"""
+    if decode_stage is None or infer_stage is None:
+        raise HTTPException(status_code=503, detail="Modèle non initialisé")
+    return {
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "decode": decode_stage.stats(),
+        "inference": infer_stage.stats(),
+    }
+
+
+@app.get("/cache/stats", tags=["Model"])
+async def cache_stats(model: Optional[str] = Query(None, description="Modèle chargé (défaut: train.model_name)")):
+    """Compteurs hit/miss/éviction du cache de prédictions d'un modèle"""
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Modèle non initialisé")
+    cache = caches.get(_resolve_model(model))
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/metrics", tags=["General"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Compteurs et histogrammes au format texte Prometheus (requêtes, octets, décodage, prétraitement,
+    forward, attente en file, répartition des classes prédites)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Gestion des erreurs globales
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
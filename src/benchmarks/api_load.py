@@ -0,0 +1,353 @@
+# src/benchmarks/api_load.py
+# ------------------------------------------------------------
+# Test de charge de l'API (src/api.py) :
+# - espace de travail temporaire : configs du dépôt + checkpoint synthétique (ou --weights),
+#   cache de prédictions coupé (sinon on mesure le cache, pas le modèle)
+# - API lancée in-process (httpx + ASGI) ou via uvicorn sur localhost (process séparé)
+# - payloads type PCam : tuiles 96x96 TIF / PNG générées
+# - scénarios : concurrence fixe (boucle fermée) et débit fixe (boucle ouverte, latence mesurée
+#   depuis l'instant d'envoi prévu : pas de "coordinated omission")
+# - rapport : débit, latences p50/p95/p99, CPU et RSS du serveur ; JSON comparable entre commits
+# Usage : python -m src.benchmarks.api_load --concurrency 1,8,32 --rates 20,50 --out-json reports/api_load.json
+#         python -m src.benchmarks.api_load ... --compare reports/api_load.base.json  (code 1 si régression)
+# ------------------------------------------------------------
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import torch
+import yaml
+from PIL import Image
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_yaml
+from src.models.models import build_model
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONTENT_TYPES = {"tif": "image/tiff", "png": "image/png"}
+
+
+def make_payloads(n: int = 32, size: int = 96, formats=("tif", "png"), seed: int = 0) -> list:
+    """Tuiles RGB type H&E (fond rosé + noyaux sombres), encodées en TIF / PNG ; toutes distinctes."""
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for i in range(n):
+        base = np.array([230, 180, 210]) + rng.normal(0, 12, (size, size, 3))
+        for _ in range(int(rng.integers(10, 40))):  # noyaux
+            cy, cx, r = rng.integers(0, size, 2).tolist() + [int(rng.integers(2, 6))]
+            yy, xx = np.ogrid[:size, :size]
+            base[(yy - cy) ** 2 + (xx - cx) ** 2 <= r * r] = np.array([90, 50, 140]) + rng.normal(0, 10, 3)
+        fmt = formats[i % len(formats)]
+        buf = io.BytesIO()
+        Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(buf, format="TIFF" if fmt == "tif" else "PNG")
+        payloads.append((f"tile_{i:03d}.{fmt}", buf.getvalue(), CONTENT_TYPES[fmt]))
+    return payloads
+
+
+def make_workspace(root: str, model_name: str, img_size: int, runtime: str = "eager", weights: str | None = None,
+                   cache: bool = False) -> str:
+    """Copie de configs/ + checkpoints/best_<model>.pt (synthétique si weights=None) dans `root`."""
+    shutil.copytree(os.path.join(REPO_ROOT, "configs"), os.path.join(root, "configs"))
+    train = load_yaml(os.path.join(root, "configs", "train.yaml"))
+    train.update({"model_name": model_name, "img_size": img_size})
+    api = load_yaml(os.path.join(root, "configs", "api.yaml"))
+    api.update({"runtime": runtime, "threshold": 0.5, "models": {"preload": [], "watch_interval_s": 0}})
+    api.setdefault("cache", {})["enabled"] = cache
+    for name, data in (("train.yaml", train), ("api.yaml", api)):
+        with open(os.path.join(root, "configs", name), "w", encoding="utf-8") as f:
+            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+
+    ckpt = os.path.join(root, "checkpoints", f"best_{model_name}.pt")
+    os.makedirs(os.path.dirname(ckpt), exist_ok=True)
+    if weights:
+        shutil.copy(weights, ckpt)
+        for ext in (".ts", ".onnx", ".int8.ts"):  # artefacts exportés à côté du checkpoint
+            src = os.path.splitext(weights)[0] + ext
+            if os.path.exists(src):
+                shutil.copy(src, os.path.splitext(ckpt)[0] + ext)
+    else:
+        torch.manual_seed(0)
+        torch.save(build_model(model_name, num_classes=1, pretrained=False).state_dict(), ckpt)
+    return root
+
+
+def _process_tree(pid: int) -> list:
+    """pid + descendants (ex: workers uvicorn), via /proc/<pid>/task/*/children."""
+    pids, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        pids.append(p)
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children", "r") as f:
+                    todo += [int(c) for c in f.read().split()]
+        except OSError:
+            continue
+    return pids
+
+
+def proc_usage(pid: int):
+    """(temps CPU user+sys en s, RSS en Mo) d'un process et de ses enfants via /proc (Linux) ; (nan, nan) sinon."""
+    try:
+        cpu = rss = 0.0
+        for p in _process_tree(pid):
+            with open(f"/proc/{p}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            with open(f"/proc/{p}/status", "r") as f:
+                rss += next(int(l.split()[1]) for l in f if l.startswith("VmRSS:")) / 1024
+        return cpu, rss
+    except (OSError, StopIteration, ValueError):
+        return float("nan"), float("nan")
+
+
+def summarize(name: str, records: list, wall_s: float, usage_before, usage_after, **extra) -> dict:
+    """records = [(latence_s, status)] -> débit, erreurs, latences (ms) des réponses 200."""
+    lat = np.asarray([l for l, s in records if s == 200], dtype=np.float64) * 1000.0
+    errors = {}
+    for _, s in records:
+        if s != 200:
+            errors[str(s)] = errors.get(str(s), 0) + 1
+    pct = np.percentile(lat, [50, 95, 99]) if lat.size else [float("nan")] * 3
+    cpu = usage_after[0] - usage_before[0]
+    return {
+        "scenario": name,
+        **extra,
+        "requests": len(records),
+        "ok": int(lat.size),
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(lat.size / max(wall_s, 1e-9), 2),
+        "latency_ms": {
+            "p50": round(float(pct[0]), 2), "p95": round(float(pct[1]), 2), "p99": round(float(pct[2]), 2),
+            "mean": round(float(lat.mean()), 2) if lat.size else float("nan"),
+            "max": round(float(lat.max()), 2) if lat.size else float("nan"),
+        },
+        "cpu_util": round(cpu / max(wall_s, 1e-9), 3),  # cœurs occupés en moyenne (périmètre : meta.resource_scope)
+        "rss_mb": round(usage_after[1], 1),
+    }
+
+
+async def _post(client, payload, records, t_start):
+    name, data, ctype = payload
+    try:
+        r = await client.post("/predict", files={"file": (name, data, ctype)})
+        status = r.status_code
+    except httpx.HTTPError as e:
+        status = f"exc:{type(e).__name__}"
+    records.append((time.perf_counter() - t_start, status))
+
+
+async def run_closed(client, concurrency: int, duration_s: float, payloads) -> tuple:
+    """`concurrency` clients enchaînant les requêtes pendant duration_s."""
+    records, deadline = [], time.perf_counter() + duration_s
+
+    async def user(k):
+        i = k
+        while time.perf_counter() < deadline:
+            await _post(client, payloads[i % len(payloads)], records, time.perf_counter())
+            i += concurrency
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(k) for k in range(concurrency)))
+    return records, time.perf_counter() - t0
+
+
+async def run_open(client, rate: float, duration_s: float, payloads) -> tuple:
+    """Arrivées à débit fixe (rate req/s) ; latence comptée depuis l'instant d'envoi prévu."""
+    records, tasks = [], []
+    n = max(1, int(rate * duration_s))
+    t0 = time.perf_counter()
+    for i in range(n):
+        scheduled = t0 + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_post(client, payloads[i % len(payloads)], records, scheduled)))
+    await asyncio.gather(*tasks)
+    return records, time.perf_counter() - t0
+
+
+async def run_scenarios(client, pid: int, scenarios: list, payloads, duration_s: float, warmup: int = 8,
+                        logger=None) -> list:
+    for i in range(warmup):
+        await _post(client, payloads[i % len(payloads)], [], time.perf_counter())
+    results = []
+    for kind, value in scenarios:
+        before = proc_usage(pid)
+        if kind == "concurrency":
+            records, wall = await run_closed(client, int(value), duration_s, payloads)
+        else:
+            records, wall = await run_open(client, float(value), duration_s, payloads)
+        r = summarize(f"{kind}={value:g}", records, wall, before, proc_usage(pid), **{kind: value})
+        results.append(r)
+        if logger:
+            lat = r["latency_ms"]
+            logger.info(f"[LOAD] {r['scenario']:<16} {r['throughput_rps']:>8.1f} req/s  p50 {lat['p50']:.1f}ms  "
+                        f"p95 {lat['p95']:.1f}ms  p99 {lat['p99']:.1f}ms  cpu {r['cpu_util']:.2f}  "
+                        f"rss {r['rss_mb']:.0f}Mo  erreurs {sum(r['errors'].values())}")
+    return results
+
+
+async def bench_inprocess(workspace: str, scenarios, payloads, duration_s, logger=None) -> list:
+    """
+    App montée dans ce process (lifespan compris), requêtes via le transport ASGI de httpx.
+    CPU / RSS mesurés sur ce process : générateur de charge compris (client+serveur).
+    """
+    from src.api import app  # import avant le chdir (sys.path relatif)
+
+    cwd = os.getcwd()
+    os.chdir(workspace)  # l'API lit configs/ et checkpoints/ en relatif
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                return await run_scenarios(client, os.getpid(), scenarios, payloads, duration_s, logger=logger)
+    finally:
+        os.chdir(cwd)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def bench_uvicorn(workspace: str, scenarios, payloads, duration_s, workers: int = 1, logger=None) -> list:
+    """API dans un process uvicorn séparé (HTTP réel sur localhost) ; CPU / RSS du serveur seul (workers compris)."""
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    cmd = [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=workspace, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            deadline = time.perf_counter() + 180
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn arrêté au démarrage (code {proc.returncode})")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("API non prête après 180s")
+                await asyncio.sleep(0.5)
+            return await run_scenarios(client, proc.pid, scenarios, payloads, duration_s, logger=logger)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def compare(base: dict, new: dict, tolerance: float = 0.15) -> list:
+    """
+    Scénarios communs aux deux rapports ; régression si le débit baisse ou si p95 / p99 augmentent
+    de plus de `tolerance` (relatif). Renvoie une ligne par scénario avec les ratios et le verdict.
+    """
+    old = {r["scenario"]: r for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        b = old.get(r["scenario"])
+        if b is None:
+            continue
+        ratios = {
+            "throughput": r["throughput_rps"] / max(b["throughput_rps"], 1e-9),
+            "p95": r["latency_ms"]["p95"] / max(b["latency_ms"]["p95"], 1e-9),
+            "p99": r["latency_ms"]["p99"] / max(b["latency_ms"]["p99"], 1e-9),
+        }
+        regressed = (ratios["throughput"] < 1 - tolerance or ratios["p95"] > 1 + tolerance
+                     or ratios["p99"] > 1 + tolerance)
+        rows.append({"scenario": r["scenario"], **{k: round(v, 3) for k, v in ratios.items()},
+                     "regression": bool(regressed)})
+    return rows
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    ap.add_argument("--model", default="resnet18")
+    ap.add_argument("--img-size", type=int, default=96)
+    ap.add_argument("--runtime", default="eager", help="eager | torchscript | onnxruntime | int8 (avec --weights)")
+    ap.add_argument("--weights", default=None, help="Checkpoint réel (défaut: poids aléatoires synthétiques)")
+    ap.add_argument("--concurrency", default="1,8,32", help="Niveaux de concurrence (boucle fermée), '' = aucun")
+    ap.add_argument("--rates", default="", help="Débits fixes en req/s (boucle ouverte), ex: 20,50")
+    ap.add_argument("--duration", type=float, default=10.0, help="Durée de chaque scénario (s)")
+    ap.add_argument("--payloads", type=int, default=32, help="Nb d'images distinctes envoyées en rotation")
+    ap.add_argument("--formats", default="tif,png")
+    ap.add_argument("--workers", type=int, default=1, help="Workers uvicorn (--mode uvicorn)")
+    ap.add_argument("--cache", action="store_true", help="Garde le cache de prédictions actif")
+    ap.add_argument("--out-json", default=None, help="Rapport JSON (ex: reports/api_load.json)")
+    ap.add_argument("--compare", default=None, help="Rapport de référence : code de sortie 1 si régression")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="Écart relatif toléré (débit, p95, p99)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    scenarios = ([("concurrency", int(c)) for c in args.concurrency.split(",") if c.strip()]
+                 + [("rate", float(r)) for r in args.rates.split(",") if r.strip()])
+    payloads = make_payloads(args.payloads, 96, tuple(f.strip() for f in args.formats.split(",")))
+
+    with tempfile.TemporaryDirectory(prefix="api_load_") as ws:
+        make_workspace(ws, args.model, args.img_size, args.runtime,
+                       os.path.abspath(args.weights) if args.weights else None, args.cache)
+        logger.info(f"[LOAD] {args.mode}, {args.model} ({args.runtime}, img {args.img_size}), "
+                    f"{len(scenarios)} scénarios x {args.duration:g}s")
+        bench = (bench_inprocess(ws, scenarios, payloads, args.duration, logger) if args.mode == "inprocess"
+                 else bench_uvicorn(ws, scenarios, payloads, args.duration, args.workers, logger))
+        results = asyncio.run(bench)
+
+    report = {
+        "meta": {"git_rev": _git_rev(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "mode": args.mode,
+                 "model": args.model, "runtime": args.runtime, "img_size": args.img_size,
+                 "synthetic_weights": args.weights is None, "cache": args.cache, "duration_s": args.duration,
+                 "payloads": args.payloads, "formats": args.formats, "cpu_count": os.cpu_count(),
+                 "uvicorn_workers": args.workers if args.mode == "uvicorn" else None,
+                 # périmètre de cpu_util / rss_mb : le mode in-process compte aussi le générateur de charge
+                 "resource_scope": "client+server" if args.mode == "inprocess" else "server"},
+        "results": results,
+    }
+    if args.out_json:
+        out_dir = os.path.dirname(args.out_json)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Load report written to: {args.out_json}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            rows = compare(json.load(f), report, args.tolerance)
+        print(f"{'scenario':<18} {'débit':>7} {'p95':>7} {'p99':>7}")
+        for r in rows:
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"{r['scenario']:<18} {r['throughput']:>7.2f} {r['p95']:>7.2f} {r['p99']:>7.2f}{flag}")
+        if any(r["regression"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
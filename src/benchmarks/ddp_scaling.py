@@ -0,0 +1,116 @@
+# src/benchmarks/ddp_scaling.py
+# ------------------------------------------------------------
+# Benchmark de scaling du training DDP CPU (gloo) :
+# - N process x (cœurs / N) threads, batch fixe par process (weak scaling)
+# - données synthétiques : on mesure forward + backward + all-reduce + step, pas l'I/O
+# - rapport : images/s, speedup et efficacité vs 1 process (table + JSON optionnel)
+# Usage : python -m src.benchmarks.ddp_scaling --model resnet18 --procs 1,2,4,8
+# ------------------------------------------------------------
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import torch
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.optim import AdamW
+
+from src.utils.logger import setup_logging
+from src.utils import distributed as ddp
+from src.models.models import build_model
+
+
+def _bench_worker(model_name, img_size, batch_size, steps, warmup, out_path):
+    ddp.init_distributed("gloo")
+    torch.manual_seed(0)
+    model = build_model(model_name, num_classes=1, pretrained=False)
+    if ddp.is_distributed():
+        model = DDP(model)
+    optim = AdamW(model.parameters(), lr=1e-4)
+    criterion = nn.BCEWithLogitsLoss()
+    xb = torch.randn(batch_size, 3, img_size, img_size)
+    yb = torch.randint(0, 2, (batch_size, 1)).float()
+    model.train()
+
+    def step():
+        optim.zero_grad()
+        criterion(model(xb), yb).backward()
+        optim.step()
+
+    for _ in range(warmup):
+        step()
+    if ddp.is_distributed():
+        torch.distributed.barrier()
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        step()
+    elapsed = ddp.all_reduce_sum(time.perf_counter() - t0)[0] / ddp.world_size()
+    if ddp.is_main():
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_s": elapsed, "threads_per_proc": torch.get_num_threads()}, f)
+    ddp.cleanup()
+
+
+def run_scaling(model_name="resnet18", procs=(1, 2, 4, 8), img_size=96, batch_size=32,
+                steps=20, warmup=3, logger=None):
+    # speedup / efficacité rapportés à 1 process : la référence est toujours mesurée
+    procs = sorted({1, *(int(n) for n in procs)})
+    results = []
+    for n in procs:
+        with tempfile.TemporaryDirectory() as tmp:
+            out_path = os.path.join(tmp, "rank0.json")
+            args = (model_name, img_size, batch_size, steps, warmup, out_path)
+            if n == 1:
+                torch.set_num_threads(os.cpu_count() or 1)
+                _bench_worker(*args)
+            else:
+                ddp.spawn(_bench_worker, n, *args)
+            with open(out_path, "r", encoding="utf-8") as f:
+                r = json.load(f)
+        images = n * steps * batch_size
+        r.update({"procs": n, "images": images, "img_s": images / r["elapsed_s"]})
+        results.append(r)
+        if logger:
+            logger.info(f"[DDP {model_name}] {n} proc x {r['threads_per_proc']} threads : {r['img_s']:.1f} img/s")
+
+    base = results[0]["img_s"]  # procs == 1
+    for r in results:
+        r["speedup"] = r["img_s"] / base
+        r["efficiency"] = r["img_s"] / (base * r["procs"])
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="resnet18", help="Nom du modèle (ex: resnet18)")
+    ap.add_argument("--procs", default="1,2,4,8", help="Nb de process à tester (séparés par des virgules, 1 = référence toujours ajoutée)")
+    ap.add_argument("--img-size", type=int, default=96)
+    ap.add_argument("--batch-size", type=int, default=32, help="Batch par process")
+    ap.add_argument("--steps", type=int, default=20, help="Steps mesurés par process")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--out-json", default=None, help="Rapport JSON (ex: reports/ddp_scaling.json)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    results = run_scaling(args.model, [int(p) for p in args.procs.split(",")], args.img_size,
+                          args.batch_size, args.steps, args.warmup, logger)
+
+    print(f"{'procs':>5} {'threads':>7} {'img/s':>9} {'speedup':>8} {'effic.':>7}")
+    for r in results:
+        print(f"{r['procs']:>5} {r['threads_per_proc']:>7} {r['img_s']:>9.1f} {r['speedup']:>8.2f} {r['efficiency']:>7.0%}")
+
+    if args.out_json:
+        out_dir = os.path.dirname(args.out_json)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "img_size": args.img_size, "batch_size": args.batch_size,
+                       "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+        logger.info(f"Scaling report written to: {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
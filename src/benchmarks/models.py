@@ -0,0 +1,225 @@
+# src/benchmarks/models.py
+# ------------------------------------------------------------
+# Matrice de micro-benchmarks d'inférence CPU des architectures de build_model :
+# - modèles (configs/models.yaml) x img_size x batch size x threads x chemin d'exécution :
+#   eager (autograd actif) | no_grad | inference_mode | compile (torch.compile + inference_mode)
+# - par cellule : images/s, latence par batch (p50 / p90), pic RSS ; compile : temps de compilation
+# - par modèle : nb de paramètres, cold start (build_model + torch.load + load_state_dict)
+# - table + JSON + un run MLflow par modèle (coût de service à mettre en face de l'AUC, cf. train_many)
+# Usage : python -m src.benchmarks.models --models all --img-sizes 96,224 --batch-sizes 1,32 --threads 1,4
+# ------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+import numpy as np
+import torch
+import mlflow
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.utils.profiling import peak_rss_mb
+from src.models.models import build_model
+
+MODES = ("eager", "no_grad", "inference_mode", "compile")
+
+
+def _reset_peak_rss() -> bool:
+    """Remet le pic RSS (VmHWM) du process à la valeur courante (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        return peak_rss_mb()  # pic depuis le démarrage (pas de reset possible)
+
+
+def cold_start(name: str, state_path: str) -> tuple:
+    """(modèle prêt en eval, secondes) : construction + lecture du checkpoint + load_state_dict."""
+    t0 = time.perf_counter()
+    model = build_model(name, num_classes=1, pretrained=False)
+    model.load_state_dict(torch.load(state_path, map_location="cpu"))
+    model.eval()
+    return model, time.perf_counter() - t0
+
+
+def _context(mode: str):
+    if mode == "eager":
+        return nullcontext()
+    if mode == "no_grad":
+        return torch.no_grad()
+    return torch.inference_mode()
+
+
+def bench_cell(model, mode: str, img_size: int, batch_size: int, threads: int, repeats: int = 20,
+               warmup: int = 3) -> dict:
+    """Latences d'un forward [batch, 3, img, img] ; `model` est déjà compilé pour mode=compile."""
+    torch.set_num_threads(threads)
+    xb = torch.randn(batch_size, 3, img_size, img_size)
+    _reset_peak_rss()
+    with _context(mode):
+        t0 = time.perf_counter()
+        model(xb)  # 1er appel : compilation pour torch.compile
+        first_s = time.perf_counter() - t0
+        for _ in range(max(0, warmup - 1)):
+            model(xb)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model(xb)
+            times.append(time.perf_counter() - t0)
+    times = np.asarray(times)
+    return {
+        "mode": mode, "img_size": img_size, "batch_size": batch_size, "threads": threads,
+        "img_s": round(batch_size / float(times.mean()), 2),
+        "latency_ms_p50": round(float(np.percentile(times, 50)) * 1000, 3),
+        "latency_ms_p90": round(float(np.percentile(times, 90)) * 1000, 3),
+        "first_call_s": round(first_s, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def bench_model(name: str, img_sizes, batch_sizes, threads, modes=MODES, repeats=20, warmup=3, logger=None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, f"{name}.pt")
+        torch.manual_seed(0)
+        torch.save(build_model(name, num_classes=1, pretrained=False).state_dict(), state_path)
+        gc.collect()
+        model, cold_s = cold_start(name, state_path)
+
+    result = {"model": name, "parameters": sum(p.numel() for p in model.parameters()),
+              "cold_start_s": round(cold_s, 3), "cells": []}
+    if logger:
+        logger.info(f"[BENCH {name}] {result['parameters'] / 1e6:.2f}M paramètres, cold start {cold_s:.2f}s")
+    runner = model
+    for mode in modes:
+        runner = model
+        if mode == "compile":
+            torch._dynamo.reset()
+            runner = torch.compile(model)
+        for img in img_sizes:
+            for bs in batch_sizes:
+                for th in threads:
+                    try:
+                        cell = bench_cell(runner, mode, img, bs, th, repeats, warmup)
+                    except Exception as e:  # ex: torch.compile sans compilateur C++ -> cellule en échec, on continue
+                        cell = {"mode": mode, "img_size": img, "batch_size": bs, "threads": th, "error": str(e)}
+                        if logger:
+                            logger.error(f"[BENCH {name}] {mode} img={img} bs={bs} t={th}: {e}")
+                    result["cells"].append(cell)
+                    if logger and "error" not in cell:
+                        logger.info(f"[BENCH {name}] {mode:<14} img={img:<3} bs={bs:<3} t={th:<2} "
+                                    f"{cell['img_s']:>8.1f} img/s  p50 {cell['latency_ms_p50']:.1f}ms  "
+                                    f"rss {cell['peak_rss_mb']:.0f}Mo")
+    del model, runner
+    gc.collect()
+    return result
+
+
+def log_mlflow(result: dict, mlruns_dir: str):
+    """Un run MLflow par modèle : params, cold start, une métrique par cellule."""
+    mlflow.set_tracking_uri(mlruns_dir)
+    mlflow.set_experiment("cancer-detection-ai")
+    with mlflow.start_run(run_name=f"bench-{result['model']}", tags={"benchmark": "models"}):
+        mlflow.log_params({"model_name": result["model"], "parameters": result["parameters"]})
+        mlflow.log_metric("cold_start_s", result["cold_start_s"])
+        for c in result["cells"]:
+            if "error" in c:
+                continue
+            key = f"{c['mode']}_{c['img_size']}_b{c['batch_size']}_t{c['threads']}"
+            mlflow.log_metrics({f"img_s_{key}": c["img_s"], f"latency_ms_{key}": c["latency_ms_p50"],
+                                f"peak_rss_mb_{key}": c["peak_rss_mb"]})
+        best = max((c for c in result["cells"] if "error" not in c), key=lambda c: c["img_s"], default=None)
+        if best is not None:
+            mlflow.log_metric("best_img_s", best["img_s"])
+        mlflow.log_dict(result, "bench_models.json")
+
+
+def serving_cost(report: dict, model: str, img_size: int | None = None) -> dict | None:
+    """Meilleur débit mesuré d'un modèle (à img_size si donné) + cold start ; None si absent du rapport."""
+    res = next((r for r in report["results"] if r["model"] == model), None)
+    if res is None:
+        return None
+    cells = [c for c in res["cells"] if "error" not in c and (img_size is None or c["img_size"] == img_size)]
+    if not cells:
+        return None
+    best = max(cells, key=lambda c: c["img_s"])
+    return {"img_s": best["img_s"], "mode": best["mode"], "cold_start_s": res["cold_start_s"]}
+
+
+def table(results) -> str:
+    lines = [f"{'model':<16} {'mode':<14} {'img':>4} {'bs':>4} {'thr':>4} {'img/s':>9} {'p50 ms':>8} "
+             f"{'rss Mo':>7} {'params':>8} {'cold s':>7}"]
+    for r in results:
+        for c in r["cells"]:
+            if "error" in c:
+                lines.append(f"{r['model']:<16} {c['mode']:<14} {c['img_size']:>4} {c['batch_size']:>4} "
+                             f"{c['threads']:>4} {'échec':>9}")
+                continue
+            lines.append(f"{r['model']:<16} {c['mode']:<14} {c['img_size']:>4} {c['batch_size']:>4} "
+                         f"{c['threads']:>4} {c['img_s']:>9.1f} {c['latency_ms_p50']:>8.2f} "
+                         f"{c['peak_rss_mb']:>7.0f} {r['parameters'] / 1e6:>7.2f}M {r['cold_start_s']:>7.2f}")
+    return "\n".join(lines)
+
+
+def _ints(s: str) -> list:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", default="all", help="Liste séparée par des virgules ou 'all' (configs/models.yaml)")
+    ap.add_argument("--img-sizes", default="96,224")
+    ap.add_argument("--batch-sizes", default="1,32")
+    ap.add_argument("--threads", default=None, help="Threads torch testés (défaut: 1,<nb cœurs>)")
+    ap.add_argument("--modes", default=",".join(MODES), help="eager,no_grad,inference_mode,compile")
+    ap.add_argument("--repeats", type=int, default=20, help="Forwards mesurés par cellule")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--no-mlflow", dest="mlflow", action="store_false", help="Pas de runs MLflow")
+    ap.add_argument("--out-json", default=None, help="Rapport JSON (ex: reports/bench_models.json)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    cfg = load_all_configs()
+    models = (cfg["models"]["available"] if args.models.lower() == "all"
+              else [m.strip() for m in args.models.split(",") if m.strip()])
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise ValueError(f"Modes inconnus: {sorted(unknown)} ({'|'.join(MODES)})")
+    threads = _ints(args.threads) if args.threads else sorted({1, os.cpu_count() or 1})
+
+    results = []
+    for name in models:
+        r = bench_model(name, _ints(args.img_sizes), _ints(args.batch_sizes), threads, modes,
+                        args.repeats, args.warmup, logger)
+        results.append(r)
+        if args.mlflow:
+            os.makedirs(cfg["paths"]["mlruns_dir"], exist_ok=True)
+            log_mlflow(r, cfg["paths"]["mlruns_dir"])
+
+    print(table(results))
+    if args.out_json:
+        out_dir = os.path.dirname(args.out_json)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.out_json, "w", encoding="utf-8") as f:
+            json.dump({"cpu_count": os.cpu_count(), "torch": torch.__version__, "results": results}, f, indent=2)
+        logger.info(f"Benchmark report written to: {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
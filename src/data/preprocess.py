@@ -0,0 +1,83 @@
+# src/data/preprocess.py
+# ------------------------------------------------------------
+# Prétraitement vectorisé, définition unique pour l'API, predict_test et l'entraînement :
+# - les datasets / le décodage renvoient des tuiles uint8 [H,W,C] brutes
+# - un batch uint8 NHWC est converti en une passe : resize (sauté si déjà à la
+#   bonne taille) + float + normalisation fusionnée (x * 1/(255*std) - mean/std)
+# - sortie NCHW contiguë ou channels_last (optionnel)
+# ------------------------------------------------------------
+
+import io
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch.utils.data import default_collate
+
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+def decode_tile(src, size: int | None = None) -> np.ndarray:
+    """Chemin ou octets d'image -> uint8 [H,W,3]. Resize PIL seulement si la taille diffère de `size`."""
+    img = Image.open(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src).convert("RGB")
+    if size is not None and img.size != (size, size):
+        img = img.resize((size, size), Image.BILINEAR)
+    return np.array(img, dtype=np.uint8)
+
+
+def stack_tiles(tiles, size: int) -> torch.Tensor:
+    """Liste de tuiles uint8 [H,W,C] -> batch uint8 [N,H,W,C] (tailles hétérogènes ramenées à `size`)."""
+    tiles = [torch.as_tensor(t) for t in tiles]
+    if all(t.shape == tiles[0].shape for t in tiles):
+        return torch.stack(tiles)
+    out = []
+    for t in tiles:
+        if t.shape[0] != size or t.shape[1] != size:
+            t = F.interpolate(t.permute(2, 0, 1).unsqueeze(0).float(), size=(size, size),
+                              mode="bilinear", align_corners=False, antialias=True)
+            t = t.round_().clamp_(0, 255).to(torch.uint8).squeeze(0).permute(1, 2, 0)
+        out.append(t)
+    return torch.stack(out)
+
+
+class BatchPreprocessor:
+    """Batch uint8 [N,H,W,C] -> float normalisé [N,C,img_size,img_size] en une passe vectorisée."""
+    def __init__(self, img_size: int, channels_last: bool = False, train: bool = False,
+                 mean=MEAN, std=STD):
+        self.img_size = int(img_size)
+        self.channels_last = channels_last
+        self.train = train  # flips H/V aléatoires par échantillon
+        std = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        mean = torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+        self.scale = 1.0 / (255.0 * std)
+        self.bias = -mean / std
+
+    def __call__(self, xb: torch.Tensor, device=None) -> torch.Tensor:
+        if device is not None:
+            xb = xb.to(device, non_blocking=True)  # transfert en uint8 : 4x moins d'octets
+        # NHWC -> NCHW logique ; en mémoire c'est déjà du channels_last, sans copie
+        x = xb.permute(0, 3, 1, 2).float()
+        if x.shape[-2:] != (self.img_size, self.img_size):
+            x = F.interpolate(x, size=(self.img_size, self.img_size), mode="bilinear",
+                              align_corners=False, antialias=True)
+        x = torch.addcmul(self.bias.to(x.device), x, self.scale.to(x.device))
+        if self.train:
+            n = x.shape[0]
+            flip_w = torch.rand(n, device=x.device) < 0.5
+            flip_h = torch.rand(n, device=x.device) < 0.5
+            x = torch.where(flip_w.view(n, 1, 1, 1), x.flip(-1), x)
+            x = torch.where(flip_h.view(n, 1, 1, 1), x.flip(-2), x)
+        fmt = torch.channels_last if self.channels_last else torch.contiguous_format
+        return x.contiguous(memory_format=fmt)
+
+
+class PreprocessCollate:
+    """collate_fn de DataLoader : [(tuile uint8, cible)] -> (batch prétraité, cibles)."""
+    def __init__(self, preprocessor: BatchPreprocessor):
+        self.preprocessor = preprocessor
+
+    def __call__(self, batch):
+        tiles, targets = zip(*batch)
+        return self.preprocessor(stack_tiles(tiles, self.preprocessor.img_size)), default_collate(list(targets))
@@ -0,0 +1,187 @@
+# src/data/shards.py
+# ------------------------------------------------------------
+# Format "shards" pré-décodé pour les tuiles PCam :
+# - packing unique des splits train/val/test en tableaux uint8 NHWC
+#   (fichiers bruts lus via numpy.memmap, N images par shard)
+# - index des ids (ids.txt, dans l'ordre du CSV source) + labels.npy (-1 = inconnu)
+# - Datasets lisant les tuiles sans copie : plus aucun open()/stat par image
+# - prétraitement fait par batch (src/data/preprocess.py) dans le collate_fn
+#
+# Arborescence : <shards_dir>/<split>/{meta.json, ids.txt, labels.npy, images-00000.u8, ...}
+# Usage : python -m src.data.shards --splits train,val,test --workers 8
+# ------------------------------------------------------------
+
+import argparse
+import csv
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.data.preprocess import BatchPreprocessor, PreprocessCollate, decode_tile
+
+# Même priorité d'extensions que predict_test.find_image
+EXTS = (".png", ".jpg", ".jpeg", ".tif")
+
+
+def index_images(root: str) -> dict:
+    """Un seul scandir du dossier -> {id: chemin} (au lieu de 4 os.path.exists par id)."""
+    rank = {ext: i for i, ext in enumerate(EXTS)}
+    found = {}
+    with os.scandir(root) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if ext in rank and (stem not in found or rank[ext] < rank[found[stem][1]]):
+                found[stem] = (entry.path, ext)
+    return {k: v[0] for k, v in found.items()}
+
+
+def _read_tile(args):
+    path, tile_size = args
+    return decode_tile(path, tile_size)
+
+
+def pack_split(ids, labels, img_root: str, out_dir: str, tile_size: int = 96,
+               shard_size: int = 50000, workers: int = 4, logger=None):
+    """Décode toutes les images du split une fois et les écrit dans des shards uint8 NHWC."""
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # meta.json écrit en dernier = pack complet
+
+    paths = index_images(img_root)
+    missing = [i for i in ids if i not in paths]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} images introuvables dans {img_root} (ex: {missing[0]})")
+
+    n = len(ids)
+    shards = []
+    jobs = ((paths[i], tile_size) for i in ids)
+    with Pool(max(1, workers)) as pool:
+        tiles = pool.imap(_read_tile, jobs, chunksize=256)
+        for start in range(0, n, shard_size):
+            count = min(shard_size, n - start)
+            name = f"images-{len(shards):05d}.u8"
+            mm = np.memmap(os.path.join(out_dir, name), dtype=np.uint8, mode="w+",
+                           shape=(count, tile_size, tile_size, 3))
+            for k in range(count):
+                mm[k] = next(tiles)
+            mm.flush()
+            del mm
+            shards.append({"file": name, "count": count})
+            if logger:
+                logger.info(f"[SHARDS] {out_dir}: {start + count}/{n}")
+
+    with open(os.path.join(out_dir, "ids.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(ids) + "\n")
+    np.save(os.path.join(out_dir, "labels.npy"),
+            np.asarray([-1 if l is None else int(l) for l in labels], dtype=np.int8))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"n": n, "height": tile_size, "width": tile_size, "channels": 3,
+                   "dtype": "uint8", "layout": "NHWC", "shards": shards}, f, indent=2)
+    return out_dir
+
+
+class ShardDataset(Dataset):
+    """
+    Lit un split packé. Renvoie (image, label) ou (image, id) si return_ids=True.
+    Sans transform, l'image est un tenseur uint8 [H,W,C] qui partage la mémoire du memmap.
+    """
+    def __init__(self, root: str, split: str, transform=None, return_ids: bool = False):
+        self.dir = os.path.join(root, split)
+        meta_path = os.path.join(self.dir, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"{meta_path} absent : lancer `python -m src.data.shards --splits {split}`")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.transform = transform
+        self.return_ids = return_ids
+        self.labels = np.load(os.path.join(self.dir, "labels.npy"))
+        if return_ids:
+            with open(os.path.join(self.dir, "ids.txt"), "r", encoding="utf-8") as f:
+                self.ids = f.read().split()
+        self.offsets = np.cumsum([0] + [s["count"] for s in self.meta["shards"]])
+        self._maps = None  # ouverts paresseusement : un jeu de memmaps par worker DataLoader
+
+    def _open(self):
+        h, w, c = self.meta["height"], self.meta["width"], self.meta["channels"]
+        # mode "c" (copy-on-write) : lecture sans copie, tenseurs torch écrivables sans toucher au fichier
+        self._maps = [np.memmap(os.path.join(self.dir, s["file"]), dtype=np.uint8, mode="c",
+                                shape=(s["count"], h, w, c)) for s in self.meta["shards"]]
+
+    def __len__(self):
+        return int(self.meta["n"])
+
+    def __getitem__(self, idx):
+        if self._maps is None:
+            self._open()
+        s = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        img = torch.from_numpy(self._maps[s][idx - self.offsets[s]])
+        if self.transform is not None:
+            img = self.transform(img)
+        if self.return_ids:
+            return img, self.ids[idx]
+        return img, int(self.labels[idx])
+
+
+def _loader(ds, batch_size, shuffle, num_workers, preprocessor):
+    kwargs = dict(batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                  pin_memory=torch.cuda.is_available(), collate_fn=PreprocessCollate(preprocessor))
+    if num_workers and num_workers > 0:
+        kwargs.update(dict(persistent_workers=True, prefetch_factor=2))
+    return DataLoader(ds, **kwargs)
+
+
+def get_shard_loaders(shards_dir: str, batch_size: int = 64, img_size: int = 96, num_workers: int = 2,
+                      channels_last: bool = False):
+    """Même contrat que get_loaders() (train, val), mais à partir des shards."""
+    train_ds = ShardDataset(shards_dir, "train")
+    val_ds = ShardDataset(shards_dir, "val")
+    return (_loader(train_ds, batch_size, True, num_workers,
+                    BatchPreprocessor(img_size, channels_last=channels_last, train=True)),
+            _loader(val_ds, batch_size, False, num_workers,
+                    BatchPreprocessor(img_size, channels_last=channels_last)))
+
+
+def _read_csv(path, with_labels=True):
+    ids, labels = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            ids.append(row["id"])
+            labels.append(int(row["label"]) if with_labels and row.get("label") not in (None, "") else None)
+    return ids, labels
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--splits", default="train,val,test", help="Splits à packer (train,val,test)")
+    ap.add_argument("--out", default=None, help="Dossier de sortie (défaut: paths.shards_dir)")
+    ap.add_argument("--tile-size", type=int, default=96, help="Taille des tuiles stockées (PCam: 96)")
+    ap.add_argument("--shard-size", type=int, default=50000, help="Nb d'images par fichier shard")
+    ap.add_argument("--workers", type=int, default=4, help="Processus de décodage")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    paths = load_all_configs()["paths"]
+    out = args.out or paths["shards_dir"]
+
+    for split in [s.strip() for s in args.splits.split(",") if s.strip()]:
+        if split == "test":
+            ids, labels = _read_csv(paths["sample_sub_csv"], with_labels=False)
+            img_root = paths["test_images"]
+        else:
+            ids, labels = _read_csv(os.path.join(paths["splits_dir"], f"{split}.csv"))
+            img_root = paths["train_images"]
+        logger.info(f"[SHARDS] {split}: {len(ids)} images -> {os.path.join(out, split)}")
+        pack_split(ids, labels, img_root, os.path.join(out, split), tile_size=args.tile_size,
+                   shard_size=args.shard_size, workers=args.workers, logger=logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# src/ensemble.py
+# ------------------------------------------------------------
+# Ensemble des checkpoints best_<model>.pt (moteur : src/models/ensemble.py) :
+# - probas des membres sur le split val (tuiles décodées une fois, partagées entre membres)
+# - AUC val par membre et par méthode (mean, rank, weighted) ; poids weighted ajustés sur val,
+#   AUC weighted donnée sur les données d'ajustement (in_sample, optimiste) et hors pli (oof, 2 plis)
+# - rapport JSON (membres, empreintes, poids, références rank, seuils best_f1 / target_recall),
+#   servi par l'API (configs/api.yaml: ensemble)
+# - submissions/submission_ensemble.csv avec la méthode choisie
+# - run MLflow "ensemble"
+# Usage : python -m src.ensemble --members resnet18,ibracancermodel@96 --method weighted
+# ------------------------------------------------------------
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import mlflow
+from torch.utils.data import DataLoader
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.utils.metrics import roc_auc, threshold_sweep
+from src.data.preprocess import stack_tiles
+from src.data.shards import ShardDataset
+from src.models.ensemble import (METHODS, EnsembleEngine, combine, cross_fit_auc, fit_weights, member_digests,
+                                 parse_members, reference_quantiles)
+from src.models.runtime import CPU_ONLY_RUNTIMES, RUNTIMES, artifact_path
+from src.models.tta import TTA_VIEWS
+from src.predict_test import TestCSV, TestStream
+
+
+class RawCollate:
+    """collate_fn : [(tuile uint8, clé)] -> (batch uint8 [N,H,W,C], clés) ; prétraitement fait par le moteur."""
+    def __init__(self, size: int):
+        self.size = size
+
+    def __call__(self, batch):
+        tiles, keys = zip(*batch)
+        return stack_tiles(tiles, self.size), list(keys)
+
+
+def _loader(ds, batch_size, num_workers, size):
+    kwargs = dict(batch_size=batch_size, shuffle=False, num_workers=num_workers, collate_fn=RawCollate(size))
+    if num_workers and num_workers > 0:
+        kwargs.update(dict(persistent_workers=True, prefetch_factor=2))
+    return DataLoader(ds, **kwargs)
+
+
+def val_dataset(paths, data_format: str):
+    """(dataset de tuiles brutes du split val, labels dans l'ordre)."""
+    if data_format == "shards":
+        ds = ShardDataset(paths["shards_dir"], "val")
+        return ds, np.asarray(ds.labels)
+    with open(os.path.join(paths["splits_dir"], "val.csv"), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return TestCSV([r["id"] for r in rows], paths["train_images"]), np.asarray([int(r["label"]) for r in rows])
+
+
+def test_dataset(paths, data_format: str, block_size: int):
+    if data_format == "shards":
+        return ShardDataset(paths["shards_dir"], "test", return_ids=True)
+    return TestStream(paths["sample_sub_csv"], paths["test_images"], block_size=block_size)
+
+
+def collect(engine: EnsembleEngine, loader, logger=None, tag: str = "") -> tuple:
+    """Probas [M,N] des membres sur tout le loader, clés dans l'ordre, débit (img/s, forwards seulement)."""
+    parts, keys, forward_s = [], [], 0.0
+    for b, (xb, kb) in enumerate(loader, start=1):
+        t0 = time.perf_counter()
+        parts.append(engine.member_probs(xb).numpy())
+        forward_s += time.perf_counter() - t0
+        keys += kb
+        if logger and b % 50 == 0:
+            logger.info(f"[ENSEMBLE {tag}] {len(keys)} images")
+    probs = np.concatenate(parts, axis=1) if parts else np.empty((len(engine.members), 0))
+    return probs, keys, len(keys) / forward_s if forward_s > 0 else 0.0
+
+
+def write_submission(out_path: str, ids, scores):
+    with open(out_path + ".partial", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "label"])
+        w.writerows(zip(ids, np.asarray(scores).tolist()))
+    os.replace(out_path + ".partial", out_path)
+    return out_path
+
+
+def run_ensemble(cfg, logger, members="all", method="weighted", runtime="eager", img_size=None, batch_size=None,
+                 num_workers=None, workers=None, tta=1, data_format=None, out_dir="submissions",
+                 out_json="reports/ensemble.json", fit=True, predict=True):
+    paths, trcfg = cfg["paths"], cfg["train"]
+    img_size = int(img_size or trcfg["img_size"])
+    batch_size = int(batch_size or trcfg.get("batch_size", 256))
+    num_workers = int(trcfg.get("num_workers", 2) if num_workers is None else num_workers)
+    data_format = data_format or trcfg.get("data_format", "files")
+    if method == "weighted" and not fit:
+        raise ValueError("method=weighted : poids ajustés sur val, incompatible avec --no-fit")
+
+    if members == "all":
+        # membres = modèles de configs/models.yaml dont le checkpoint existe (cf. train_many)
+        members = [m for m in parse_members(cfg["models"]["available"], img_size)
+                   if os.path.exists(artifact_path(m.weights, runtime))]
+    else:
+        members = parse_members(members, img_size)
+    if not members:
+        raise FileNotFoundError("Aucun checkpoint best_<model>.pt trouvé : lancer `python -m src.train_many`")
+
+    device = torch.device(trcfg["device"] if torch.cuda.is_available() and runtime not in CPU_ONLY_RUNTIMES else "cpu")
+    engine = EnsembleEngine(members, method, runtime=runtime, device=device, workers=workers, tta=tta)
+    tile = max(m.img_size for m in members)
+    names = [f"{m.name}@{m.img_size}" for m in members]
+    logger.info(f"[ENSEMBLE] {len(members)} membres ({', '.join(names)}), groupes img_size={sorted(engine.groups)}, "
+                f"méthode={method}, runtime={runtime}, device={device}")
+
+    report = {"members": [{"name": m.name, "img_size": m.img_size, "checkpoint": m.weights} for m in members],
+              "method": method, "runtime": runtime, "tta": tta}
+    try:
+        if fit:
+            ds, y = val_dataset(paths, data_format)
+            probs, _, img_s = collect(engine, _loader(ds, batch_size, num_workers, tile), logger, "val")
+            y = y[:probs.shape[1]]
+            digests = member_digests(members)
+            for m, entry, p in zip(members, report["members"], probs):
+                entry.update({"digest": digests.get(m.name), "val_auc": roc_auc(y, p)})
+            weights, in_sample = fit_weights(probs, y)
+            report["val"] = {"mean": roc_auc(y, combine(probs, "mean")), "rank": roc_auc(y, combine(probs, "rank")),
+                             "weighted_in_sample": in_sample, "weighted_oof": cross_fit_auc(probs, y),
+                             "img_s": img_s}
+            report["weights"] = weights
+            report["refs"] = [reference_quantiles(p) for p in probs]
+            engine.weights, engine.refs = weights, report["refs"]
+            # points de fonctionnement de l'ensemble servi (seuils best_f1 / target_recall de l'API)
+            scfg = cfg.get("metrics", {}).get("sweep", {})
+            sweep = threshold_sweep(y, combine(probs, method, weights, report["refs"]),
+                                    target_recall=scfg.get("target_recall", 0.95))
+            report.update({"threshold_best_f1": sweep["best_f1"]["threshold"],
+                           "threshold_target_recall": sweep["target_recall"]["threshold"],
+                           "target_recall": sweep["target_recall"]["target"]})
+            for name, entry in zip(names, report["members"]):
+                logger.info(f"[ENSEMBLE] {name:<22} AUC val={entry['val_auc']:.4f}")
+            logger.info(f"[ENSEMBLE] seuils {method} : best F1 @ {report['threshold_best_f1']:.4f}, "
+                        f"recall>={report['target_recall']:.2f} @ {report['threshold_target_recall']:.4f}")
+            logger.info(f"[ENSEMBLE] AUC val mean={report['val']['mean']:.4f}  rank={report['val']['rank']:.4f}  "
+                        f"weighted={report['val']['weighted_oof']:.4f} hors pli "
+                        f"({report['val']['weighted_in_sample']:.4f} sur les données d'ajustement)  ({img_s:.1f} img/s)  "
+                        f"poids={[round(w, 3) for w in weights]}")
+
+        if predict:
+            ds = test_dataset(paths, data_format, batch_size)
+            probs, ids, img_s = collect(engine, _loader(ds, batch_size, num_workers, tile), logger, "test")
+            # rank : percentiles dans les distributions val (mêmes scores que l'API), sinon dans le test lui-même
+            scores = combine(probs, method, engine.weights, engine.refs)
+            os.makedirs(out_dir, exist_ok=True)
+            out_path = write_submission(os.path.join(out_dir, "submission_ensemble.csv"), ids, scores)
+            report["test"] = {"n": len(ids), "img_s": img_s, "submission": out_path}
+            logger.info(f"submission saved -> {out_path} ({len(ids)} ids, {img_s:.1f} img/s)")
+    finally:
+        engine.close()
+
+    # --------- MLflow + rapport JSON ---------
+    os.makedirs(paths["mlruns_dir"], exist_ok=True)
+    mlflow.set_tracking_uri(paths["mlruns_dir"])
+    mlflow.set_experiment("cancer-detection-ai")
+    with mlflow.start_run(run_name="ensemble"):
+        mlflow.log_params({"members": ",".join(names), "method": method, "runtime": runtime, "tta": tta})
+        for name, entry in zip(names, report["members"]):
+            if "val_auc" in entry:
+                mlflow.log_metric(f"val_auc_{name.replace('@', '_')}", entry["val_auc"])
+        for k, v in report.get("val", {}).items():
+            mlflow.log_metric(f"val_{k}" if k == "img_s" else f"val_auc_{k}", v)
+        if report.get("weights"):
+            mlflow.log_dict({"weights": dict(zip(names, report["weights"]))}, "ensemble_weights.json")
+
+    if out_json and fit:
+        out = os.path.dirname(out_json)
+        if out:
+            os.makedirs(out, exist_ok=True)
+        with open(out_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Ensemble report written to: {out_json}")
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--members", default="all",
+                    help="Membres séparés par des virgules, model ou model@img_size (défaut: all = checkpoints présents)")
+    ap.add_argument("--method", default="weighted", choices=METHODS, help="Combinaison des probas des membres")
+    ap.add_argument("--runtime", default="eager", choices=RUNTIMES, help="Runtime d'inférence des membres")
+    ap.add_argument("--img-size", type=int, default=None, help="img_size des membres sans @ (sinon config)")
+    ap.add_argument("--batch-size", type=int, default=None)
+    ap.add_argument("--num-workers", type=int, default=None, help="Workers DataLoader (décodage)")
+    ap.add_argument("--workers", type=int, default=None, help="Threads de forward des membres (défaut: nb de membres)")
+    ap.add_argument("--tta", type=int, default=1, choices=TTA_VIEWS, help="Vues dihédrales par image, 1 = off")
+    ap.add_argument("--data-format", default=None, choices=["files", "shards"], help="Override data_format (sinon config)")
+    ap.add_argument("--no-fit", dest="fit", action="store_false", help="Pas de passe val (mean / rank seulement)")
+    ap.add_argument("--no-predict", dest="predict", action="store_false", help="Pas de submission (ajustement seul)")
+    ap.add_argument("--out-json", default="reports/ensemble.json", help="Rapport (membres, poids, AUC val)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    cfg = load_all_configs()
+    run_ensemble(cfg, logger, members=args.members, method=args.method, runtime=args.runtime,
+                 img_size=args.img_size, batch_size=args.batch_size, num_workers=args.num_workers,
+                 workers=args.workers, tta=args.tta, data_format=args.data_format, out_json=args.out_json,
+                 fit=args.fit, predict=args.predict)
+
+
+if __name__ == "__main__":
+    main()
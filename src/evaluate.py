@@ -3,36 +3,45 @@
 # Évaluation sur le split validation :
 # - charge le modèle + poids
 # - calcule proba, métriques (AUC, acc, precision, recall, f1)
+# - balayage de seuils (ROC/PR, seuil best-F1, seuil à sensibilité cible)
+# - TTA dihédrale (--tta) + comparatif AUC / débit par nombre de vues (--tta-sweep 1,2,4,8)
 # - log dans MLflow (run séparé "eval-<model>")
-# - écrit un JSON de métriques si --out-json est fourni (compatible DVC)
+# - écrit un JSON de métriques si --out-json est fourni (compatible DVC), avec modèle / empreinte / runtime / TTA
 # ------------------------------------------------------------
 
 import argparse
 import os
 import platform
 import json
+import time
 import torch
 import numpy as np
 
 from src.utils.logger import setup_logging
 from src.utils.config import load_all_configs
-from src.utils.metrics import binary_metrics
-from src.data.dataset import get_loaders
-from src.models.models import build_model
+from src.utils.checkpoint import file_digest
+from src.utils.metrics import StreamingBinaryMetrics, binary_metrics, roc_auc, threshold_sweep
+from src.data.shards import get_shard_loaders
+from src.models.runtime import CPU_ONLY_RUNTIMES, RUNTIMES, artifact_path, load_predictor
+from src.models.tta import TTA_VIEWS, check_views, tta_forward
 import mlflow
 
 
 @torch.no_grad()
-def run_eval(cfg, logger, model_name, weights_path, img_size=None, out_json=None):
+def run_eval(cfg, logger, model_name, weights_path, img_size=None, out_json=None, runtime="eager",
+             streaming=False, tta=1, tta_sweep=None):
     # --------- Config effective ---------
     paths = cfg["paths"]
     trcfg = cfg["train"].copy()
     trcfg["model_name"] = model_name
     if img_size is not None:
         trcfg["img_size"] = img_size
+    # nombres de vues évalués sur les mêmes batchs ; les métriques principales sont celles de `tta`
+    tta = check_views(tta)
+    settings = sorted({tta, *(check_views(v) for v in tta_sweep or ())})
 
     # --------- Device ---------
-    device = torch.device(trcfg["device"] if torch.cuda.is_available() else "cpu")
+    device = torch.device(trcfg["device"] if torch.cuda.is_available() and runtime not in CPU_ONLY_RUNTIMES else "cpu")
     if device.type == "cpu":
         logger.info("No CUDA detected -> using CPU")
 
@@ -42,32 +51,102 @@ def run_eval(cfg, logger, model_name, weights_path, img_size=None, out_json=None
     if platform.system().lower().startswith("win") and workers > 0:
         workers = 0
 
-    _, val_loader = get_loaders(
+    if trcfg.get("data_format", "files") == "shards":
+        load = get_shard_loaders
+    else:
+        from src.data.dataset import get_loaders  # importé ici : src.evaluate reste importable sans le module
+        load = get_loaders
+    kwargs = {"shards_dir": paths["shards_dir"]} if load is get_shard_loaders else {}
+    _, val_loader = load(
         batch_size=int(trcfg.get("batch_size", 64)),
         img_size=int(trcfg.get("img_size", 96)),
-        num_workers=workers
+        num_workers=workers,
+        **kwargs
     )
 
-    # --------- Modèle + poids ---------
-    model = build_model(model_name, num_classes=1, pretrained=False).to(device)
-    model.load_state_dict(torch.load(weights_path, map_location=device))
-    model.eval()
+    # --------- Modèle + poids (eager ou artefact exporté) ---------
+    model = load_predictor(model_name, weights_path, runtime, device)
 
     # --------- Inférence & métriques ---------
-    ys, ps = [], []
-    for xb, yb in val_loader:
-        xb = xb.to(device)
-        prob = torch.sigmoid(model(xb)).squeeze(1).cpu().numpy()  # [B]
-        ys.extend(yb.numpy().tolist())
-        ps.extend(prob.tolist())
-
-    m = binary_metrics(ys, ps, thresh=0.5)
+    forward_s = dict.fromkeys(settings, 0.0)  # temps de forward seul (TTA comprise), par nb de vues
+
+    def _timed_probs(xb, views, out=None):
+        t0 = time.perf_counter()
+        p = torch.sigmoid(tta_forward(model, xb, views).float().squeeze(1), out=out)  # [B]
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        forward_s[views] += time.perf_counter() - t0
+        return p
+
+    if streaming:
+        # mémoire constante (histogrammes) : AUC approchée, borne d'erreur dans auc_err_bound
+        accs = {v: StreamingBinaryMetrics(thresholds=(0.5,)) for v in settings}
+        i = 0
+        for xb, yb in val_loader:
+            xb = xb.to(device)
+            for v in settings:
+                accs[v].update(yb.numpy(), _timed_probs(xb, v).cpu().numpy())
+            i += xb.size(0)
+        m = accs[tta].compute(0.5)
+        aucs = {v: accs[v].auc()[0] for v in settings}
+    else:
+        # buffers préalloués à la taille du split, remplis en place (une seule copie hôte à la fin)
+        n = len(val_loader.dataset)
+        ps = {v: torch.empty(n, dtype=torch.float32, device=device) for v in settings}
+        ys = np.empty(n, dtype=np.int64)
+        i = 0
+        for xb, yb in val_loader:
+            xb = xb.to(device)
+            b = xb.size(0)
+            for v in settings:
+                _timed_probs(xb, v, out=ps[v][i:i + b])
+            ys[i:i + b] = yb.numpy()
+            i += b
+        ys, all_ps = ys[:i], {v: p[:i].cpu().numpy() for v, p in ps.items()}
+        ps = all_ps[tta]
+        m = binary_metrics(ys, ps, thresh=0.5)
+        aucs = {v: roc_auc(ys, p) for v, p in all_ps.items()}
+    if tta > 1:
+        m["tta_views"] = tta
+
+    # --------- Compromis AUC / débit de la TTA ---------
+    tta_report = None
+    if len(settings) > 1:
+        base = forward_s[settings[0]]
+        tta_report = [{
+            "views": v,
+            "auc": aucs[v],
+            "throughput_img_s": i / forward_s[v] if forward_s[v] > 0 else 0.0,
+            "cost_x": forward_s[v] / base if base > 0 else 0.0,
+            "auc_delta": aucs[v] - aucs[settings[0]],
+        } for v in settings]
+        for r in tta_report:
+            logger.info(f"[EVAL {model_name}] TTA {r['views']} vues : AUC={r['auc']:.4f} ({r['auc_delta']:+.4f})  "
+                        f"{r['throughput_img_s']:.1f} img/s (x{r['cost_x']:.2f})")
     logger.info(
         f"[EVAL {model_name}] "
         f"AUC={m['auc']:.4f}  ACC={m['accuracy']:.4f}  "
         f"P={m['precision']:.4f}  R={m['recall']:.4f}  F1={m['f1']:.4f}"
     )
 
+    # --------- Points de fonctionnement (un seul tri des scores) ---------
+    sweep = None
+    if not streaming:
+        scfg = cfg.get("metrics", {}).get("sweep", {})
+        sweep = threshold_sweep(ys, ps, target_recall=scfg.get("target_recall", 0.95),
+                                curve_points=scfg.get("curve_points", 200))
+        best, op = sweep["best_f1"], sweep["target_recall"]
+        m.update({
+            "threshold_best_f1": best["threshold"], "f1_best": best["f1"],
+            "threshold_target_recall": op["threshold"], "target_recall": op["target"],
+            "precision_at_target_recall": op["precision"], "specificity_at_target_recall": op["specificity"],
+        })
+        logger.info(
+            f"[EVAL {model_name}] best F1={best['f1']:.4f} @ {best['threshold']:.4f}  |  "
+            f"recall>={op['target']:.2f} @ {op['threshold']:.4f} (P={op['precision']:.4f}, "
+            f"spécificité={op['specificity']:.4f})"
+        )
+
     # --------- MLflow logging ---------
     os.makedirs(paths["mlruns_dir"], exist_ok=True)
     mlflow.set_tracking_uri(paths["mlruns_dir"])
@@ -76,17 +155,39 @@ def run_eval(cfg, logger, model_name, weights_path, img_size=None, out_json=None
         mlflow.log_param("eval_model", model_name)
         mlflow.log_param("weights", weights_path)
         mlflow.log_param("img_size", trcfg["img_size"])
+        mlflow.log_param("runtime", runtime)
+        mlflow.log_param("tta", tta)
         for k, v in m.items():
             mlflow.log_metric(f"eval_{k}", v)
+        for r in tta_report or ():
+            mlflow.log_metrics({f"tta{r['views']}_auc": r["auc"], f"tta{r['views']}_img_s": r["throughput_img_s"]})
+        if tta_report is not None:
+            mlflow.log_dict({"tta": tta_report}, "eval_tta.json")
+        if sweep is not None:
+            mlflow.log_dict(sweep, "eval_threshold_sweep.json")
 
     # --------- Export JSON (pour DVC) ---------
     if out_json:
         out_dir = os.path.dirname(out_json)
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
+        # ce que les seuils décrivent : l'API refuse un seuil nommé calculé pour un autre modèle servi
+        served = {"model_name": model_name, "weights_digest": file_digest(artifact_path(weights_path, runtime)),
+                  "runtime": runtime, "tta": tta, "img_size": int(trcfg["img_size"])}
         with open(out_json, "w", encoding="utf-8") as f:
-            json.dump(m, f, indent=2)
+            json.dump({**m, **served}, f, indent=2)
         logger.info(f"Metrics JSON written to: {out_json}")
+        if sweep is not None:
+            # courbes ROC / PR complètes à côté du JSON de métriques (scalaires seulement pour DVC)
+            curves_json = os.path.splitext(out_json)[0] + "_curves.json"
+            with open(curves_json, "w", encoding="utf-8") as f:
+                json.dump(sweep, f, indent=2)
+            logger.info(f"Threshold sweep written to: {curves_json}")
+        if tta_report is not None:
+            tta_json = os.path.splitext(out_json)[0] + "_tta.json"
+            with open(tta_json, "w", encoding="utf-8") as f:
+                json.dump({"runtime": runtime, "img_size": trcfg["img_size"], "tta": tta_report}, f, indent=2)
+            logger.info(f"TTA report written to: {tta_json}")
 
     return m
 
@@ -97,6 +198,13 @@ def main():
     ap.add_argument("--weights", required=True, help="Chemin des poids .pt")
     ap.add_argument("--img-size", type=int, default=None, help="Override img_size (sinon config)")
     ap.add_argument("--out-json", default=None, help="Chemin du JSON de métriques (ex: reports/metrics.json)")
+    ap.add_argument("--runtime", default="eager", choices=RUNTIMES, help="Runtime d'inférence (artefacts via src.export / src.quantize)")
+    ap.add_argument("--streaming", action="store_true",
+                    help="Métriques incrémentales en mémoire constante (AUC approchée par histogramme)")
+    ap.add_argument("--tta", type=int, default=1, choices=TTA_VIEWS,
+                    help="Vues dihédrales par image (flips + rot90) pour les métriques, 1 = off")
+    ap.add_argument("--tta-sweep", default=None,
+                    help="Nombres de vues comparés sur les mêmes batchs (ex: 1,2,4,8) : AUC vs débit")
     args = ap.parse_args()
 
     logger = setup_logging()
@@ -108,7 +216,11 @@ def main():
         model_name=args.model,
         weights_path=args.weights,
         img_size=args.img_size,
-        out_json=args.out_json
+        out_json=args.out_json,
+        runtime=args.runtime,
+        streaming=args.streaming,
+        tta=args.tta,
+        tta_sweep=[int(v) for v in args.tta_sweep.split(",")] if args.tta_sweep else None
     )
 
 
@@ -0,0 +1,91 @@
+# src/export.py
+# ------------------------------------------------------------
+# Export d'un checkpoint eager vers des artefacts d'inférence :
+# - TorchScript (trace + freeze)   -> checkpoints/best_<model>.ts
+# - ONNX (batch dynamique)         -> checkpoints/best_<model>.onnx
+# - contrôle de parité vs eager (écart max des logits <= atol)
+# Les artefacts sont ensuite servis via --runtime torchscript|onnxruntime
+# (predict_test, evaluate) ou `runtime:` dans configs/api.yaml.
+# ------------------------------------------------------------
+
+import argparse
+
+import torch
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.models.runtime import artifact_path, check_parity, load_eager, load_predictor
+
+FORMATS = {"torchscript": "torchscript", "onnx": "onnxruntime"}
+
+
+@torch.no_grad()
+def export_torchscript(model, img_size: int, out_path: str):
+    example = torch.randn(2, 3, img_size, img_size)
+    traced = torch.jit.trace(model, example)
+    traced = torch.jit.freeze(traced)  # poids en constantes + fusions conv/bn
+    traced.save(out_path)
+    return out_path
+
+
+def export_onnx(model, img_size: int, out_path: str, opset: int = 17):
+    example = torch.randn(2, 3, img_size, img_size)
+    torch.onnx.export(
+        model, example, out_path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+    return out_path
+
+
+def run_export(cfg, logger, model_name, weights_path=None, img_size=None, formats=("torchscript", "onnx"), atol=1e-4):
+    img_size = int(img_size or cfg["train"]["img_size"])
+    weights_path = weights_path or f"checkpoints/best_{model_name}.pt"
+
+    # Export sur CPU : les artefacts sont destinés aux nœuds de service CPU
+    model = load_eager(model_name, weights_path, torch.device("cpu"))
+
+    results = {}
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Format inconnu: {fmt} ({'|'.join(FORMATS)})")
+        runtime = FORMATS[fmt]
+        out_path = artifact_path(weights_path, runtime)
+        if fmt == "torchscript":
+            export_torchscript(model, img_size, out_path)
+        else:
+            export_onnx(model, img_size, out_path)
+
+        diff = check_parity(model, load_predictor(model_name, weights_path, runtime), img_size, atol=atol)
+        logger.info(f"[EXPORT {model_name}] {fmt} -> {out_path}  (parité: écart max {diff:.2e} <= {atol:.0e})")
+        results[fmt] = {"path": out_path, "max_abs_diff": diff}
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", required=True, help="Nom du modèle (ex: resnet18)")
+    ap.add_argument("--weights", default=None, help="Chemin du .pt (défaut: checkpoints/best_<model>.pt)")
+    ap.add_argument("--img-size", type=int, default=None, help="Override img_size (sinon config)")
+    ap.add_argument("--format", default="torchscript,onnx", help="torchscript,onnx (séparés par des virgules)")
+    ap.add_argument("--atol", type=float, default=1e-4, help="Tolérance de parité sur les logits")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    cfg = load_all_configs()
+
+    run_export(
+        cfg=cfg,
+        logger=logger,
+        model_name=args.model,
+        weights_path=args.weights,
+        img_size=args.img_size,
+        formats=[f.strip() for f in args.format.split(",") if f.strip()],
+        atol=args.atol
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# src/features.py
+# ------------------------------------------------------------
+# Feature store pour backbones gelés (linear probe / expériences rapides) :
+# - chaque backbone de build_model passe UNE fois sur les splits (shards pré-décodés, sans augmentation)
+# - features poolées (entrée de la dernière nn.Linear) stockées en memmap :
+#   <features_dir>/<model>_<img_size>_<imagenet|ckpt-xxxx|scratch>/<split>/{meta.json, features.bin, labels.npy}
+# - tête seule (Dropout + Linear, comme _replace_fc) entraînée sur ces features : quelques secondes / époque
+# - la tête est recollée dans le modèle complet -> checkpoints/head_<model>.pt (utilisable par --weights)
+# Usage : python -m src.features --model resnet18 --pretrained --epochs 20
+# ------------------------------------------------------------
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.optim import AdamW
+from torch.utils.data import DataLoader
+import mlflow
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.utils.checkpoint import file_digest
+from src.utils.metrics import binary_metrics
+from src.utils.seed import set_seed
+from src.data.preprocess import BatchPreprocessor, PreprocessCollate
+from src.data.shards import ShardDataset
+from src.models.models import build_model
+
+
+def _last_linear(model: nn.Module):
+    """(module parent, nom) de la dernière nn.Linear : la tête de classification pour tous les modèles."""
+    name = [n for n, m in model.named_modules() if isinstance(m, nn.Linear)][-1]
+    parent, _, attr = name.rpartition(".")
+    return model.get_submodule(parent), attr
+
+
+def split_head(model: nn.Module):
+    """Retire la dernière Linear (remplacée par Identity) : le modèle renvoie alors les features poolées."""
+    parent, attr = _last_linear(model)
+    fc = getattr(parent, attr)
+    setattr(parent, attr, nn.Identity())
+    return model, fc.in_features
+
+
+def make_head(in_features: int, num_classes: int = 1, dropout: float = 0.2) -> nn.Sequential:
+    return nn.Sequential(nn.Dropout(dropout), nn.Linear(in_features, num_classes))  # même tête que _replace_fc
+
+
+def attach_head(model: nn.Module, head: nn.Sequential) -> nn.Module:
+    """Recopie la Linear entraînée dans la tête d'un modèle complet (build_model)."""
+    parent, attr = _last_linear(model)
+    getattr(parent, attr).load_state_dict(head[-1].state_dict())
+    return model
+
+
+def build_backbone(name: str, pretrained: bool = False, weights: str | None = None):
+    model = build_model(name, num_classes=1, pretrained=pretrained and not weights)
+    if weights:
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+    return split_head(model)
+
+
+def store_key(name: str, img_size: int, pretrained: bool = False, weights: str | None = None) -> str:
+    """Clé modèle + img_size + checkpoint (empreinte du fichier, ou poids ImageNet / init aléatoire)."""
+    src = f"ckpt-{file_digest(weights)[:12]}" if weights else ("imagenet" if pretrained else "scratch")
+    return f"{name}_{img_size}_{src}"
+
+
+class FeatureStore:
+    """Un split du store : features [N, D] en memmap (lecture seule) + labels."""
+    def __init__(self, root: str, split: str):
+        self.dir = os.path.join(root, split)
+        meta_path = os.path.join(self.dir, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"{meta_path} absent : features non extraites")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.features = np.memmap(os.path.join(self.dir, "features.bin"), dtype=self.meta["dtype"], mode="r",
+                                  shape=(self.meta["n"], self.meta["dim"]))
+        self.labels = np.load(os.path.join(self.dir, "labels.npy"))
+
+    def __len__(self):
+        return int(self.meta["n"])
+
+    @staticmethod
+    def exists(root: str, split: str) -> bool:
+        return os.path.exists(os.path.join(root, split, "meta.json"))
+
+
+@torch.no_grad()
+def extract_split(backbone, dim, shards_dir, split, out_dir, img_size=96, batch_size=128, num_workers=2,
+                  dtype="float32", device="cpu", logger=None):
+    """Une passe du backbone (eval, sans augmentation) sur un split packé -> memmap [N, dim]."""
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # meta.json écrit en dernier = extraction complète
+
+    ds = ShardDataset(shards_dir, split)
+    loader = DataLoader(ds, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                        collate_fn=PreprocessCollate(BatchPreprocessor(img_size)))
+    n = len(ds)
+    mm = np.memmap(os.path.join(out_dir, "features.bin"), dtype=dtype, mode="w+", shape=(n, dim))
+    backbone.eval().to(device)
+    i, t0 = 0, time.perf_counter()
+    for xb, _ in loader:
+        feats = backbone(xb.to(device)).flatten(1)
+        mm[i:i + feats.size(0)] = feats.cpu().numpy().astype(dtype, copy=False)
+        i += feats.size(0)
+    mm.flush()
+    del mm
+    np.save(os.path.join(out_dir, "labels.npy"), ds.labels)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"n": n, "dim": dim, "dtype": dtype, "img_size": img_size, "split": split}, f, indent=2)
+    if logger:
+        logger.info(f"[FEATURES] {split}: {n} x {dim} en {time.perf_counter() - t0:.1f}s -> {out_dir}")
+    return out_dir
+
+
+def ensure_features(name, cfg, splits=("train", "val"), pretrained=False, weights=None, dtype="float32",
+                    force=False, logger=None):
+    """Extrait les splits manquants du store (cache : rien n'est recalculé si la clé existe déjà)."""
+    paths, trcfg = cfg["paths"], cfg["train"]
+    root = os.path.join(paths["features_dir"], store_key(name, trcfg["img_size"], pretrained, weights))
+    todo = [s for s in splits if force or not FeatureStore.exists(root, s)]
+    if todo:
+        if not pretrained and not weights and logger:
+            logger.warning(f"[FEATURES] {name}: backbone non pré-entraîné (init aléatoire)")
+        backbone, dim = build_backbone(name, pretrained, weights)
+        device = trcfg["device"] if torch.cuda.is_available() else "cpu"
+        for split in todo:
+            extract_split(backbone, dim, paths["shards_dir"], split, os.path.join(root, split),
+                          trcfg["img_size"], trcfg["batch_size"], trcfg["num_workers"], dtype, device, logger)
+    elif logger:
+        logger.info(f"[FEATURES] cache {root} ({', '.join(splits)})")
+    return root
+
+
+def _batches(store, batch_size, shuffle, rng=None):
+    idx = rng.permutation(len(store)) if shuffle else np.arange(len(store))
+    for s in range(0, idx.size, batch_size):
+        b = np.sort(idx[s:s + batch_size])  # lecture memmap plus séquentielle
+        yield (torch.from_numpy(np.asarray(store.features[b], dtype=np.float32)),
+               torch.from_numpy(store.labels[b].astype(np.float32)))
+
+
+def train_head(root, cfg, logger, epochs=None, batch_size=256, lr=None, dropout=0.2):
+    """Entraîne la tête seule sur les features en cache ; renvoie (tête, meilleure val AUC)."""
+    trcfg = cfg["train"]
+    train, val = FeatureStore(root, "train"), FeatureStore(root, "val")
+    set_seed(1337)
+    rng = np.random.default_rng(1337)
+    head = make_head(train.meta["dim"], 1, dropout)
+    optim = AdamW(head.parameters(), lr=lr or trcfg["lr"], weight_decay=trcfg["weight_decay"])
+    criterion = nn.BCEWithLogitsLoss()
+    patience = int(trcfg.get("early_stopping", 0))
+    best_auc, best_state, bad_epochs = -1.0, None, 0
+
+    for epoch in range(1, (epochs or trcfg["epochs"]) + 1):
+        t0 = time.perf_counter()
+        head.train()
+        total = 0.0
+        for xb, yb in _batches(train, batch_size, True, rng):
+            optim.zero_grad(set_to_none=True)
+            loss = criterion(head(xb).squeeze(1), yb)
+            loss.backward()
+            optim.step()
+            total += loss.item() * xb.size(0)
+
+        head.eval()
+        with torch.no_grad():
+            ps = np.concatenate([torch.sigmoid(head(xb).squeeze(1)).numpy()
+                                 for xb, _ in _batches(val, batch_size, False)])
+        m = binary_metrics(val.labels, ps, thresh=0.5)
+        dt = time.perf_counter() - t0
+        logger.info(f"[HEAD] epoch {epoch}: train_loss={total / len(train):.4f}  val_auc={m['auc']:.4f}  "
+                    f"f1={m['f1']:.4f}  ({dt:.1f}s)")
+        if mlflow.active_run() is not None:
+            mlflow.log_metric("train_loss", total / len(train), step=epoch)
+            mlflow.log_metric("epoch_s", dt, step=epoch)
+            for k, v in m.items():
+                mlflow.log_metric(f"val_{k}", v, step=epoch)
+
+        if m["auc"] > best_auc:
+            best_auc, best_state, bad_epochs = m["auc"], {k: v.clone() for k, v in head.state_dict().items()}, 0
+        else:
+            bad_epochs += 1
+            if patience > 0 and bad_epochs >= patience:
+                logger.info(f"[HEAD] early stopping après {epoch} époques")
+                break
+
+    head.load_state_dict(best_state)
+    return head, best_auc
+
+
+def run_head(cfg, logger, name, pretrained=False, weights=None, epochs=None, batch_size=256, lr=None,
+             dtype="float32", force=False, out_path=None):
+    """Extraction (si absente du store) + tête seule + checkpoint complet head_<model>.pt."""
+    root = ensure_features(name, cfg, ("train", "val"), pretrained, weights, dtype, force, logger)
+    out_path = out_path or f"checkpoints/head_{name}.pt"
+
+    paths = cfg["paths"]
+    os.makedirs(paths["mlruns_dir"], exist_ok=True)
+    mlflow.set_tracking_uri(paths["mlruns_dir"])
+    mlflow.set_experiment("cancer-detection-ai")
+    with mlflow.start_run(run_name=f"{name}-head"):
+        mlflow.log_params({"model_name": name, "mode": "head", "feature_store": os.path.basename(root),
+                           "img_size": cfg["train"]["img_size"], "batch_size": batch_size,
+                           "lr": lr or cfg["train"]["lr"], "epochs": epochs or cfg["train"]["epochs"]})
+        head, best_auc = train_head(root, cfg, logger, epochs, batch_size, lr)
+
+        model = build_model(name, num_classes=1, pretrained=pretrained and not weights)
+        if weights:
+            model.load_state_dict(torch.load(weights, map_location="cpu"))
+        attach_head(model, head)
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        torch.save(model.state_dict(), out_path)
+        mlflow.log_metric("best_val_auc", best_auc)
+        mlflow.log_artifact(out_path)
+    logger.info(f"[HEAD] {name}: best AUC {best_auc:.4f} -> {out_path}")
+    return best_auc
+
+
+def main():
+    cfg = load_all_configs()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=cfg["train"]["model_name"], choices=cfg["models"]["available"])
+    ap.add_argument("--pretrained", action="store_true", help="Backbone ImageNet (torchvision)")
+    ap.add_argument("--weights", default=None, help="Backbone issu d'un checkpoint (ex: checkpoints/best_resnet18.pt)")
+    ap.add_argument("--img-size", type=int, default=None)
+    ap.add_argument("--epochs", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=256, help="Batch de la tête (features)")
+    ap.add_argument("--lr", type=float, default=None)
+    ap.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="Stockage des features")
+    ap.add_argument("--splits", default="train,val", help="Splits à extraire (avec --extract-only)")
+    ap.add_argument("--extract-only", action="store_true", help="Remplit le store sans entraîner de tête")
+    ap.add_argument("--force", action="store_true", help="Ré-extrait même si la clé existe")
+    ap.add_argument("--out", default=None, help="Checkpoint complet (défaut: checkpoints/head_<model>.pt)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    if args.img_size is not None:
+        cfg["train"]["img_size"] = args.img_size
+    if args.extract_only:
+        ensure_features(args.model, cfg, [s.strip() for s in args.splits.split(",") if s.strip()],
+                        args.pretrained, args.weights, args.dtype, args.force, logger)
+        return
+    run_head(cfg, logger, args.model, args.pretrained, args.weights, args.epochs, args.batch_size, args.lr,
+             args.dtype, args.force, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 # src/menu.py
 import os, sys, platform, subprocess
 from src.utils.logger import setup_logging
-from src.utils.config import load_all_configs
+from src.utils.config import load_all_configs, load_yaml
 from src.data.prepare_splits import main as prepare_splits_main
 from src.train import run_train
 from src.evaluate import run_eval
 from src.predict_test import run_predict
+from src.search import run_search
 
 def clear():
     os.system("cls" if platform.system().lower().startswith("win") else "clear")
@@ -37,6 +38,7 @@ def main():
         print("3) Évaluer un modèle (validation)")
         print("4) Générer submission.csv (test)")
         print("5) Ouvrir MLflow UI")
+        print("6) Recherche d'hyperparamètres (configs/search.yaml)")
         print("0) Quitter")
         choice = input("Sélection: ").strip()
 
@@ -77,6 +79,14 @@ def main():
             print(f"mlflow ui --backend-store-uri {uri}")
             press_enter()
 
+        elif choice == "6":
+            scfg = load_yaml("configs/search.yaml")
+            trials = input(f"Nb de trials (enter = {scfg['trials']}): ").strip()
+            if trials:
+                scfg["trials"] = int(trials)
+            run_search(cfg, logger, scfg)
+            press_enter()
+
         elif choice == "0":
             print("Bye!")
             break
@@ -0,0 +1,195 @@
+# src/models/ensemble.py
+# ------------------------------------------------------------
+# Moteur d'ensemble sur des checkpoints entraînés (best_<model>.pt, cf. src.train_many) :
+# - membres "model" ou "model@img_size" ; batch uint8 [B,H,W,C] décodé une seule fois
+# - prétraitement une fois par img_size (membres groupés par taille), tenseur partagé dans le groupe
+# - forwards des membres en parallèle sur un pool de threads (torch relâche le GIL)
+# - combinaison : mean | rank | weighted (poids ajustés sur le split val, cf. fit_weights)
+# - rank : percentile de chaque proba dans une distribution de référence (val) par membre,
+#   utilisable image par image (API) ; sans référence, rangs calculés sur le lot lui-même
+# ------------------------------------------------------------
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
+import torch
+
+from src.data.preprocess import BatchPreprocessor
+from src.models.runtime import load_predictor
+from src.models.tta import check_views, tta_forward
+from src.utils.checkpoint import file_digest
+from src.utils.metrics import roc_auc
+
+METHODS = ("mean", "rank", "weighted")
+
+
+@dataclass
+class Member:
+    name: str
+    img_size: int
+    weights: str  # checkpoint eager (best_<model>.pt) ; artefact du runtime déduit par load_predictor
+
+
+def parse_members(spec, img_size: int, checkpoint_fmt: str = "checkpoints/best_{name}.pt") -> list:
+    """"resnet18,ibracancermodel@96" (ou liste) -> [Member] ; img_size par défaut pour les membres sans @."""
+    items = spec.split(",") if isinstance(spec, str) else spec
+    members = []
+    for item in (s.strip() for s in items):
+        if not item:
+            continue
+        name, _, size = item.partition("@")
+        members.append(Member(name, int(size) if size else int(img_size), checkpoint_fmt.format(name=name)))
+    if len({(m.name, m.img_size) for m in members}) != len(members):
+        raise ValueError(f"Membres en double: {spec}")
+    return members
+
+
+def reference_quantiles(probs, points: int = 1001) -> list:
+    """Distribution de référence (val) d'un membre, résumée en `points` quantiles pour le mode rank."""
+    return np.quantile(np.asarray(probs, dtype=np.float64), np.linspace(0, 1, points)).tolist()
+
+
+def to_ranks(probs, refs=None) -> np.ndarray:
+    """[M,N] probas -> percentiles dans [0,1] (rang moyen des ex-aequo) ; refs[m] trié, sinon le lot lui-même."""
+    probs = np.asarray(probs, dtype=np.float64)
+    out = np.empty_like(probs)
+    for k, p in enumerate(probs):
+        ref = np.sort(p) if refs is None else np.asarray(refs[k], dtype=np.float64)
+        lo, hi = np.searchsorted(ref, p, side="left"), np.searchsorted(ref, p, side="right")
+        out[k] = (lo + hi) / (2.0 * len(ref))
+    return out
+
+
+def combine(probs, method: str = "mean", weights=None, refs=None) -> np.ndarray:
+    """[M,N] probas des membres -> [N] scores de l'ensemble. `weights` n'est utilisé qu'en mode weighted."""
+    if method not in METHODS:
+        raise ValueError(f"Méthode inconnue: {method} ({'|'.join(METHODS)})")
+    probs = np.asarray(probs, dtype=np.float64)
+    if method == "rank":
+        probs = to_ranks(probs, refs)
+    if method != "weighted" or weights is None:
+        return probs.mean(0)
+    w = np.asarray(weights, dtype=np.float64)
+    return (w[:, None] * probs).sum(0) / w.sum()
+
+
+def fit_weights(probs, y, steps=(0.5, 0.2, 0.1, 0.05, 0.02), max_rounds: int = 20) -> tuple:
+    """
+    Poids >= 0 (somme 1) maximisant l'AUC val de la moyenne pondérée : montée par coordonnées
+    depuis les poids uniformes, pas décroissants. Renvoie (poids, AUC).
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    w = np.full(len(probs), 1.0 / len(probs))
+    best = roc_auc(y, combine(probs, "weighted", w))
+    for step in steps:
+        for _ in range(max_rounds):
+            improved = False
+            for k in range(len(w)):
+                for delta in (step, -step):
+                    cand = w.copy()
+                    cand[k] = max(0.0, cand[k] + delta)
+                    if cand.sum() <= 0:
+                        continue
+                    cand /= cand.sum()
+                    auc = roc_auc(y, combine(probs, "weighted", cand))
+                    if auc > best + 1e-9:
+                        w, best, improved = cand, auc, True
+            if not improved:
+                break
+    return w.tolist(), best
+
+
+def cross_fit_auc(probs, y, folds: int = 2, seed: int = 0) -> float:
+    """
+    AUC hors échantillon de la moyenne pondérée : poids ajustés sur k-1 plis, scores du pli restant,
+    AUC sur l'ensemble des scores hors pli (l'AUC sur les données d'ajustement est optimiste).
+    """
+    probs, y = np.asarray(probs, dtype=np.float64), np.asarray(y)
+    fold = np.random.default_rng(seed).permutation(len(y)) % folds
+    scores = np.empty(len(y))
+    for k in range(folds):
+        fit = fold != k
+        weights, _ = fit_weights(probs[:, fit], y[fit])
+        scores[~fit] = combine(probs[:, ~fit], "weighted", weights)
+    return roc_auc(y, scores)
+
+
+class EnsembleEngine:
+    """
+    `engine(xb)` : probas [B] de l'ensemble depuis des tuiles uint8 [B,H,W,C] ;
+    `member_probs(xb)` : probas [M,B] des membres. `predictor_fn(name)` fournit le modèle courant
+    d'un membre (ex: registre de l'API, rechargement à chaud) ; sinon les checkpoints sont chargés ici.
+    """
+    def __init__(self, members, method: str = "mean", weights=None, refs=None, runtime: str = "eager",
+                 device=None, channels_last: bool = False, workers: int | None = None, tta: int = 1,
+                 predictor_fn=None):
+        if method not in METHODS:
+            raise ValueError(f"Méthode inconnue: {method} ({'|'.join(METHODS)})")
+        if not members:
+            raise ValueError("Ensemble vide")
+        self.members = list(members)
+        self.method, self.weights, self.refs = method, weights, refs
+        self.device = device or torch.device("cpu")
+        self.channels_last = channels_last and runtime == "eager"
+        self.tta = check_views(tta)
+        if predictor_fn is None:
+            predictors = {}
+            for m in self.members:
+                p = load_predictor(m.name, m.weights, runtime, self.device)
+                predictors[m.name] = p.to(memory_format=torch.channels_last) if self.channels_last else p
+            predictor_fn = predictors.__getitem__
+        self.predictor_fn = predictor_fn
+        self.groups = {}  # img_size -> [(indice, membre)]
+        for k, m in enumerate(self.members):
+            self.groups.setdefault(m.img_size, []).append((k, m))
+        self.preps = {s: BatchPreprocessor(s, channels_last=self.channels_last) for s in self.groups}
+        self.pool = ThreadPoolExecutor(max_workers=workers or len(self.members), thread_name_prefix="ensemble")
+        self.fitted_digests = {}  # checkpoints sur lesquels les poids ont été ajustés (from_report)
+        self.report = {}  # rapport d'ajustement chargé (runtime, seuils), cf. from_report
+
+    @classmethod
+    def from_report(cls, path: str, **kwargs) -> "EnsembleEngine":
+        """Ensemble ajusté par `python -m src.ensemble` (membres, méthode, poids, références rank)."""
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        members = [Member(m["name"], m["img_size"], m["checkpoint"]) for m in report["members"]]
+        kwargs.setdefault("method", report["method"])
+        kwargs.setdefault("tta", report.get("tta", 1))
+        engine = cls(members, weights=report.get("weights"), refs=report.get("refs"), **kwargs)
+        engine.fitted_digests = {m["name"]: m.get("digest") for m in report["members"]}
+        engine.report = report
+        return engine
+
+    def _forward(self, name: str, x: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():  # état par thread : activé dans le worker
+            return torch.sigmoid(tta_forward(self.predictor_fn(name), x, self.tta)).squeeze(1).float().cpu()
+
+    def member_probs(self, xb: torch.Tensor) -> torch.Tensor:
+        futures = []
+        for size, group in self.groups.items():
+            with torch.inference_mode():
+                x = self.preps[size](xb, self.device)  # un seul resize + normalisation par taille
+            futures += [(k, self.pool.submit(self._forward, m.name, x)) for k, m in group]
+        out = torch.empty(len(self.members), xb.shape[0])
+        for k, fut in futures:
+            out[k] = fut.result()
+        return out
+
+    def __call__(self, xb: torch.Tensor) -> torch.Tensor:
+        probs = self.member_probs(xb).numpy()
+        return torch.from_numpy(combine(probs, self.method, self.weights, self.refs)).float()
+
+    def parameters(self):
+        return chain.from_iterable(self.predictor_fn(m.name).parameters() for m in self.members)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def member_digests(members) -> dict:
+    """Empreinte du checkpoint de chaque membre (poids ajustés pour ces checkpoints-là)."""
+    return {m.name: file_digest(m.weights) for m in members if os.path.exists(m.weights)}
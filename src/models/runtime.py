@@ -0,0 +1,95 @@
+# src/models/runtime.py
+# ------------------------------------------------------------
+# Sélection du runtime d'inférence : eager | torchscript | onnxruntime | int8
+# - eager       : build_model() + load_state_dict (graph torchvision reconstruit)
+# - torchscript : best_<model>.ts   (traced + freeze, pas de build_model au démarrage)
+# - onnxruntime : best_<model>.onnx (batch dynamique, CPU)
+# - int8        : best_<model>.int8.ts (TorchScript quantifié INT8, CPU)
+# Les artefacts sont produits par `python -m src.export` et `python -m src.quantize`.
+# ------------------------------------------------------------
+
+import os
+
+import numpy as np
+import torch
+
+from src.models.models import build_model
+
+RUNTIMES = ("eager", "torchscript", "onnxruntime", "int8")
+CPU_ONLY_RUNTIMES = ("onnxruntime", "int8")
+_EXTS = {"torchscript": ".ts", "onnxruntime": ".onnx", "int8": ".int8.ts"}
+
+
+def artifact_path(weights_path: str, runtime: str = "eager") -> str:
+    """checkpoints/best_resnet18.pt -> checkpoints/best_resnet18.ts / .onnx selon le runtime."""
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Runtime inconnu: {runtime} ({'|'.join(RUNTIMES)})")
+    if runtime == "eager":
+        return weights_path
+    return os.path.splitext(weights_path)[0] + _EXTS[runtime]
+
+
+def load_eager(model_name: str, weights_path: str, device) -> torch.nn.Module:
+    model = build_model(model_name, num_classes=1, pretrained=False).to(device)
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    return model.eval()
+
+
+class OnnxPredictor:
+    """Session onnxruntime avec la même interface qu'un nn.Module en inférence : tensor -> logits."""
+    def __init__(self, path: str, num_threads: int | None = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("runtime 'onnxruntime' demandé mais le paquet onnxruntime n'est pas installé") from e
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = int(num_threads or torch.get_num_threads())
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        x = np.ascontiguousarray(x.detach().cpu().float().numpy())
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return iter(())
+
+
+def load_predictor(model_name: str, weights_path: str, runtime: str = "eager", device=None):
+    """
+    Charge le modèle pour l'inférence selon le runtime ; `weights_path` est le checkpoint eager
+    (best_<model>.pt), l'artefact exporté est déduit par artifact_path().
+    """
+    device = device or torch.device("cpu")
+    path = artifact_path(weights_path, runtime)
+    if runtime == "eager":
+        return load_eager(model_name, path, device)
+    if not os.path.exists(path):
+        tool = "src.quantize" if runtime == "int8" else "src.export"
+        raise FileNotFoundError(f"{path} introuvable : lancer `python -m {tool} --model {model_name}`")
+    if runtime in CPU_ONLY_RUNTIMES and device.type != "cpu":
+        raise ValueError(f"runtime '{runtime}' : CPU uniquement")
+    if runtime in ("torchscript", "int8"):
+        return torch.jit.load(path, map_location=device).eval()
+    return OnnxPredictor(path)
+
+
+@torch.no_grad()
+def check_parity(reference, candidate, img_size: int, batch_sizes=(1, 4), atol: float = 1e-4, device=None) -> float:
+    """Écart max |logits| entre le modèle eager et un runtime exporté sur des entrées aléatoires."""
+    device = device or torch.device("cpu")
+    g = torch.Generator().manual_seed(0)
+    worst = 0.0
+    for bs in batch_sizes:
+        x = torch.randn(bs, 3, img_size, img_size, generator=g).to(device)
+        ref = reference(x).float().cpu()
+        out = candidate(x).float().cpu()
+        if out.shape != ref.shape:
+            raise AssertionError(f"Forme différente: {tuple(out.shape)} vs {tuple(ref.shape)} (batch={bs})")
+        worst = max(worst, (out - ref).abs().max().item())
+    if worst > atol:
+        raise AssertionError(f"Parité non respectée: écart max {worst:.2e} > atol {atol:.0e}")
+    return worst
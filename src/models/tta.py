@@ -0,0 +1,56 @@
+# src/models/tta.py
+# ------------------------------------------------------------
+# TTA dihédrale (flips + rotations de 90°) vectorisée, sur tenseur :
+# - le batch prétraité [B,C,H,W] est dupliqué en n vues (flip / rot90 sur les axes H,W, pas de PIL)
+# - un seul forward sur [n*B,C,H,W], puis moyenne des logits par échantillon
+# - n = 1 (off), 2 (+ flip H), 4 (+ flip V, rot180), 8 (groupe diédral complet, images carrées)
+# ------------------------------------------------------------
+
+import torch
+
+TTA_VIEWS = (1, 2, 4, 8)
+
+# ordre des vues : les 4 premières gardent H,W (valables aussi pour des images non carrées)
+_DIHEDRAL = (
+    lambda x: x,
+    lambda x: x.flip(-1),
+    lambda x: x.flip(-2),
+    lambda x: x.flip(-2, -1),               # rot180
+    lambda x: x.rot90(1, (-2, -1)),
+    lambda x: x.rot90(-1, (-2, -1)),
+    lambda x: x.transpose(-2, -1),
+    lambda x: x.flip(-2, -1).transpose(-2, -1),  # anti-transposée
+)
+
+
+def check_views(views: int) -> int:
+    views = int(views)
+    if views not in TTA_VIEWS:
+        raise ValueError(f"TTA: {views} vues non supporté ({'|'.join(map(str, TTA_VIEWS))})")
+    return views
+
+
+def expand_views(x: torch.Tensor, views: int) -> torch.Tensor:
+    """[B,C,H,W] -> [views*B,C,H,W], vue par vue (bloc k = vue k de tout le batch)."""
+    views = check_views(views)
+    if views == 1:
+        return x
+    if views == 8 and x.shape[-1] != x.shape[-2]:
+        raise ValueError(f"TTA 8 vues : images carrées requises (reçu {tuple(x.shape[-2:])})")
+    fmt = torch.channels_last if x.dim() == 4 and x.is_contiguous(memory_format=torch.channels_last) \
+        and not x.is_contiguous() else torch.contiguous_format
+    return torch.cat([f(x) for f in _DIHEDRAL[:views]]).contiguous(memory_format=fmt)
+
+
+def reduce_views(logits: torch.Tensor, views: int) -> torch.Tensor:
+    """[views*B, ...] -> [B, ...] : moyenne des logits de chaque échantillon sur ses vues."""
+    if views == 1:
+        return logits
+    return logits.reshape(views, -1, *logits.shape[1:]).mean(0)
+
+
+def tta_forward(model, x: torch.Tensor, views: int = 1) -> torch.Tensor:
+    """Logits [B,1] moyennés sur `views` vues dihédrales, en un seul forward agrandi."""
+    if views == 1:
+        return model(x)
+    return reduce_views(model(expand_views(x, views)).float(), views)
@@ -2,24 +2,33 @@
 # ------------------------------------------------------------
 # Prédiction batched sur le jeu de test pour générer submission_<model>.csv
 # - DataLoader (batchs, num_workers, prefetch, pin_memory)
+# - Prétraitement vectorisé par batch (src/data/preprocess.py), channels_last optionnel
 # - Support GPU (CUDA) si disponible + AMP (mi-précision)
 # - Chemins/paramètres lus depuis les YAML (configs/)
+# - Streaming + reprise : ids lus au fil de l'eau, CSV .partial flushé + checkpoint
+#   périodiques (--resume repart du dernier id validé)
+# - Découpage en N parts (--shard i/N, une plage contiguë d'ids par process)
+#   puis fusion ordonnée (--merge N)
+# - TTA dihédrale optionnelle (--tta 2|4|8) : vues générées sur le batch, un seul forward agrandi
 # ------------------------------------------------------------
 
 import os
 import csv
+import json
 import argparse
+import itertools
 import platform
 from contextlib import nullcontext
-from PIL import Image
 
 import torch
-from torch.utils.data import Dataset, DataLoader
-import torchvision.transforms as T
+from torch.utils.data import Dataset, DataLoader, IterableDataset, Subset, get_worker_info
 
 from src.utils.logger import setup_logging
 from src.utils.config import load_all_configs
-from src.models.models import build_model
+from src.models.runtime import CPU_ONLY_RUNTIMES, RUNTIMES, load_predictor
+from src.models.tta import TTA_VIEWS, check_views, tta_forward
+from src.data.preprocess import BatchPreprocessor, PreprocessCollate, decode_tile
+from src.data.shards import ShardDataset, index_images
 
 # Prioriser les formats rapides (PNG/JPG) ; TIF en dernier car plus lent
 EXTS = (".png", ".jpg", ".jpeg", ".tif")
@@ -35,25 +44,121 @@ def find_image(root: str, img_id: str) -> str:
 
 
 class TestCSV(Dataset):
-    """Dataset pour le test set (ids -> images) avec les mêmes prétraitements que la validation."""
-    def __init__(self, ids, img_root: str, img_size: int = 96):
+    """Dataset pour le test set (ids -> tuiles uint8 brutes) ; le prétraitement se fait par batch."""
+    def __init__(self, ids, img_root: str):
         self.ids = ids
         self.img_root = img_root
-        self.tfm = T.Compose([
-            T.Resize((img_size, img_size)),
-            T.ToTensor(),
-            T.Normalize([0.485, 0.456, 0.406],
-                        [0.229, 0.224, 0.225]),
-        ])
+        self.paths = index_images(img_root)  # un seul scandir au lieu de stat() par id
 
     def __len__(self):
         return len(self.ids)
 
     def __getitem__(self, idx):
         _id = self.ids[idx]
-        path = find_image(self.img_root, _id)
-        img = Image.open(path).convert("RGB")
-        return self.tfm(img), _id
+        path = self.paths.get(_id) or find_image(self.img_root, _id)
+        return decode_tile(path), _id
+
+
+def iter_ids(csv_path: str, start: int = 0, stop: int | None = None):
+    """Ids de sample_submission.csv dans l'ordre, lignes [start, stop), sans tout charger."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in itertools.islice(csv.DictReader(f), start, stop):
+            yield row["id"]
+
+
+def count_ids(csv_path: str) -> int:
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def shard_range(n: int, index: int, num_shards: int) -> tuple[int, int]:
+    """Plage contiguë [start, stop) de la part `index` sur `num_shards` (fusion = concaténation)."""
+    if not 0 <= index < num_shards:
+        raise ValueError(f"shard {index}/{num_shards} invalide")
+    return n * index // num_shards, n * (index + 1) // num_shards
+
+
+class TestStream(IterableDataset):
+    """
+    Version streaming de TestCSV : ids lus au fil de l'eau dans le CSV.
+    Avec k workers, le worker w prend les blocs de `block_size` ids d'indice b % k == w :
+    le DataLoader (round-robin, batch_size = block_size) rend alors les batchs dans l'ordre du CSV.
+    """
+    def __init__(self, csv_path: str, img_root: str, start: int = 0, stop: int | None = None,
+                 block_size: int = 256):
+        self.csv_path = csv_path
+        self.img_root = img_root
+        self.start, self.stop = start, stop
+        self.block_size = block_size
+        self.paths = None  # index construit dans chaque worker
+
+    def __iter__(self):
+        info = get_worker_info()
+        wid, nw = (0, 1) if info is None else (info.id, info.num_workers)
+        if self.paths is None:
+            self.paths = index_images(self.img_root)
+        for k, _id in enumerate(iter_ids(self.csv_path, self.start, self.stop)):
+            if (k // self.block_size) % nw == wid:
+                path = self.paths.get(_id) or find_image(self.img_root, _id)
+                yield decode_tile(path), _id
+
+
+def part_path(out_dir: str, model_name: str, index: int = 0, num_shards: int = 1) -> str:
+    if num_shards == 1:
+        return os.path.join(out_dir, f"submission_{model_name}.csv")
+    return os.path.join(out_dir, f"submission_{model_name}.part-{index}-of-{num_shards}.csv")
+
+
+def _save_checkpoint(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)  # atomique : jamais de checkpoint à moitié écrit
+
+
+def open_partial(out_path: str, run_key: dict, resume: bool, logger=None):
+    """
+    Ouvre <out_path>.partial en écriture. Avec `resume` et un checkpoint compatible, le fichier
+    est tronqué au dernier flush validé et on renvoie le nb d'ids déjà écrits ; sinon on repart de zéro.
+    Renvoie (fichier, nb d'ids déjà faits, chemin du checkpoint).
+    """
+    partial, ckpt_path = out_path + ".partial", out_path + ".ckpt.json"
+    if resume and os.path.exists(ckpt_path) and os.path.exists(partial):
+        with open(ckpt_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if {k: state.get(k) for k in run_key} != run_key:
+            raise ValueError(f"{ckpt_path} ne correspond pas à ce run ({state} vs {run_key}) : relancer sans --resume")
+        out = open(partial, "r+", newline="", encoding="utf-8")
+        out.truncate(state["offset"])  # lignes écrites après le dernier checkpoint = rejouées
+        out.seek(state["offset"])
+        if logger:
+            logger.info(f"Reprise {partial} : {state['done']} ids déjà prédits")
+        return out, int(state["done"]), ckpt_path
+    if resume and logger:
+        logger.warning(f"--resume : pas de checkpoint pour {out_path} → départ à zéro")
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)  # checkpoint d'un run précédent : ne doit pas survivre au nouveau .partial
+    out = open(partial, "w", newline="", encoding="utf-8")
+    csv.writer(out).writerow(["id", "label"])
+    return out, 0, ckpt_path
+
+
+def merge_parts(out_dir: str, model_name: str, num_shards: int) -> str:
+    """Concatène les N parts (plages contiguës) dans l'ordre de sample_submission.csv."""
+    parts = [part_path(out_dir, model_name, i, num_shards) for i in range(num_shards)]
+    missing = [p for p in parts if not os.path.exists(p)]
+    if missing:
+        raise FileNotFoundError(f"Parts manquantes/incomplètes : {missing}")
+    out_path = part_path(out_dir, model_name)
+    with open(out_path + ".partial", "w", newline="", encoding="utf-8") as out:
+        out.write("id,label\n")
+        for p in parts:
+            with open(p, "r", newline="", encoding="utf-8") as f:
+                next(f)  # en-tête
+                for line in f:
+                    out.write(line)
+    os.replace(out_path + ".partial", out_path)
+    return out_path
 
 
 @torch.inference_mode()  # plus rapide que no_grad pour l'inférence
@@ -67,9 +172,16 @@ def run_predict(
     batch_size: int | None = None,
     num_workers: int | None = None,
     device_arg: str | None = None,  # "cuda" | "cpu" | None (auto)
-    amp: bool = True
+    amp: bool = True,
+    runtime: str = "eager",  # "eager" | "torchscript" | "onnxruntime" | "int8"
+    data_format: str | None = None,  # "files" | "shards" | None (config)
+    channels_last: bool = False,
+    shard: tuple[int, int] = (0, 1),  # (i, N) : part i sur N
+    resume: bool = False,
+    flush_every: int = 20,  # batchs entre deux flush + checkpoint
+    tta: int = 1  # vues dihédrales par image (1 = pas de TTA)
 ):
-    """Prédit tout le test set en batchs et écrit un CSV de soumission Kaggle."""
+    """Prédit le test set (ou sa part i/N) en batchs, en streaming, et écrit un CSV de soumission Kaggle."""
 
     paths = cfg["paths"]
     trcfg = cfg["train"].copy()
@@ -101,22 +213,40 @@ def run_predict(
     if platform.system().lower().startswith("win") and num_workers > 2:
         num_workers = 2
 
-    # --- lire l'ordre des ids depuis sample_submission.csv ---
-    ids = []
-    with open(paths["sample_sub_csv"], newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            ids.append(row["id"])
-    logger.info(f"{len(ids)} images test à prédire")
+    shard_index, num_shards = shard
+    tta = check_views(tta)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = part_path(out_dir, model_name, shard_index, num_shards)
+    run_key = {"model": model_name, "weights": os.path.abspath(weights_path), "runtime": runtime,
+               "shard": [shard_index, num_shards]}
+    if tta > 1:
+        run_key["tta"] = tta  # reprise impossible avec un autre nombre de vues
+    out, done, ckpt_path = open_partial(out_path, run_key, resume, logger)
+
+    data_format = data_format or trcfg.get("data_format", "files")
+    collate = PreprocessCollate(BatchPreprocessor(trcfg["img_size"], channels_last=channels_last))
+    if data_format == "shards":
+        # --- shards pré-décodés : ids.txt suit déjà l'ordre de sample_submission.csv ---
+        full = ShardDataset(paths["shards_dir"], "test", return_ids=True)
+        start, stop = shard_range(len(full), shard_index, num_shards)
+        ds = Subset(full, range(start + done, stop))
+        shuffle = False
+    else:
+        # --- ids lus en streaming depuis sample_submission.csv (comptage seulement si N > 1) ---
+        start, stop = (0, None) if num_shards == 1 else shard_range(count_ids(paths["sample_sub_csv"]), shard_index, num_shards)
+        ds = TestStream(paths["sample_sub_csv"], paths["test_images"], start + done, stop, block_size=batch_size)
+        shuffle = None  # interdit avec un IterableDataset
+    todo = stop - start - done if stop is not None else "?"
+    logger.info(f"Part {shard_index}/{num_shards} : {todo} images test à prédire ({data_format}, déjà faites: {done})")
 
-    # --- dataset & dataloader ---
-    ds = TestCSV(ids, paths["test_images"], img_size=trcfg["img_size"])
+    # --- dataloader ---
     pin = (device.type == "cuda")
     dl_kwargs = dict(
         batch_size=batch_size,
-        shuffle=False,
+        shuffle=shuffle,
         num_workers=num_workers,
-        pin_memory=pin
+        pin_memory=pin,
+        collate_fn=collate
     )
     # persistent_workers & prefetch_factor seulement si num_workers > 0
     if num_workers and num_workers > 0:
@@ -126,13 +256,19 @@ def run_predict(
         ))
     dl = DataLoader(ds, **dl_kwargs)
 
-    # --- modèle ---
-    model = build_model(model_name, num_classes=1, pretrained=False).to(device)
-    model.load_state_dict(torch.load(weights_path, map_location=device))
-    model.eval()
+    # --- modèle (eager ou artefact exporté) ---
+    if runtime in CPU_ONLY_RUNTIMES and device.type != "cpu":
+        logger.warning(f"{runtime} : CPU uniquement → fallback CPU")
+        device = torch.device("cpu")
+    model = load_predictor(model_name, weights_path, runtime, device)
+    if channels_last and runtime == "eager":
+        model = model.to(memory_format=torch.channels_last)
+    logger.info(f"Runtime: {runtime}" + (f" | TTA {tta} vues" if tta > 1 else ""))
 
-    # --- AMP moderne (CUDA ou CPU) ---
-    if amp and device.type == "cuda":
+    # --- AMP moderne (CUDA ou CPU) ; sans objet pour onnxruntime / int8 ---
+    if runtime in CPU_ONLY_RUNTIMES:
+        autocast_ctx = nullcontext
+    elif amp and device.type == "cuda":
         autocast_ctx = torch.cuda.amp.autocast
     elif amp and device.type == "cpu":
         # Nouvelle API : torch.amp.autocast('cpu')
@@ -140,23 +276,28 @@ def run_predict(
     else:
         autocast_ctx = nullcontext
 
-    # --- prédiction batched ---
-    os.makedirs(out_dir, exist_ok=True)
-    out_path = os.path.join(out_dir, f"submission_{model_name}.csv")
-    with open(out_path, "w", newline="", encoding="utf-8") as out:
-        w = csv.writer(out)
-        w.writerow(["id", "label"])
-
-        for xb, id_batch in dl:
+    # --- prédiction batched, écrite au fil de l'eau ---
+    w = csv.writer(out)
+    with out:
+        for b, (xb, id_batch) in enumerate(dl, start=1):
             xb = xb.to(device, non_blocking=True)
             with autocast_ctx():
                 # logits -> sigmoid -> proba ; squeeze(1) pour [B,1] -> [B]
-                prob = torch.sigmoid(model(xb)).squeeze(1).detach().cpu().numpy()
+                prob = torch.sigmoid(tta_forward(model, xb, tta)).squeeze(1).detach().cpu().numpy()
 
             # écrire en gardant l'ordre
-            for _id, p in zip(id_batch, prob):
-                w.writerow([_id, float(p)])
+            w.writerows(zip(id_batch, prob.tolist()))
+            done += len(id_batch)
+
+            if b % flush_every == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                _save_checkpoint(ckpt_path, {**run_key, "done": done, "offset": out.tell()})
+                logger.info(f"[{os.path.basename(out_path)}] {done} ids écrits")
 
+    os.replace(out_path + ".partial", out_path)
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
     logger.info(f"submission saved -> {out_path}")
     return out_path
 
@@ -164,17 +305,33 @@ def run_predict(
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--model", required=True, help="Nom du modèle (ex: resnet18)")
-    ap.add_argument("--weights", required=True, help="Chemin du .pt (ex: checkpoints/best_resnet18.pt)")
+    ap.add_argument("--weights", default=None, help="Chemin du .pt (ex: checkpoints/best_resnet18.pt)")
     ap.add_argument("--img-size", type=int, default=None, help="Override img_size (sinon config)")
     ap.add_argument("--batch-size", type=int, default=None, help="Taille de lot pour l'inférence")
     ap.add_argument("--num-workers", type=int, default=None, help="Workers DataLoader")
     ap.add_argument("--device", default=None, help="cuda|cpu (auto si non spécifié)")
     ap.add_argument("--no-amp", action="store_true", help="Désactiver AMP (mi-précision)")
+    ap.add_argument("--data-format", default=None, choices=["files", "shards"], help="Override data_format (sinon config)")
+    ap.add_argument("--channels-last", action="store_true", help="Entrées / modèle en mémoire channels_last")
+    ap.add_argument("--runtime", default="eager", choices=RUNTIMES, help="Runtime d'inférence (artefacts via src.export / src.quantize)")
+    ap.add_argument("--shard", default="0/1", help="Part i/N des ids à prédire (ex: 0/4) ; fusion via --merge N")
+    ap.add_argument("--resume", action="store_true", help="Reprendre au dernier checkpoint (.partial + .ckpt.json)")
+    ap.add_argument("--flush-every", type=int, default=20, help="Batchs entre deux flush/checkpoint")
+    ap.add_argument("--tta", type=int, default=1, choices=TTA_VIEWS, help="Vues dihédrales par image (flips + rot90), 1 = off")
+    ap.add_argument("--merge", type=int, default=None, metavar="N", help="Fusionner les N parts dans submission_<model>.csv et quitter")
     args = ap.parse_args()
 
     logger = setup_logging()
     cfg = load_all_configs()
 
+    if args.merge:
+        out_path = merge_parts("submissions", args.model, args.merge)
+        logger.info(f"{args.merge} parts fusionnées -> {out_path}")
+        return
+    if not args.weights:
+        ap.error("--weights est requis (sauf avec --merge)")
+    shard_index, num_shards = (int(x) for x in args.shard.split("/"))
+
     run_predict(
         cfg=cfg,
         logger=logger,
@@ -184,7 +341,14 @@ def main():
         batch_size=args.batch_size,
         num_workers=args.num_workers,
         device_arg=args.device,
-        amp=not args.no_amp
+        amp=not args.no_amp,
+        runtime=args.runtime,
+        data_format=args.data_format,
+        channels_last=args.channels_last,
+        shard=(shard_index, num_shards),
+        resume=args.resume,
+        flush_every=args.flush_every,
+        tta=args.tta
     )
 
 
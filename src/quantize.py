@@ -0,0 +1,210 @@
+# src/quantize.py
+# ------------------------------------------------------------
+# Quantification INT8 post-entraînement pour le service CPU :
+# - dynamic : nn.Linear (têtes de classification) en INT8, activations fp32
+# - static  : PTQ FX graph mode (convs + linéaires), calibrée sur le split validation
+# - écrit checkpoints/best_<model>.int8.ts (TorchScript, chargeable via --runtime int8)
+# - compare fp32 vs INT8 : delta d'AUC (binary_metrics) + latence / débit
+# - log dans MLflow (run "quantize-<model>") et JSON optionnel
+# ------------------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import mlflow
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs
+from src.utils.metrics import binary_metrics
+from src.data.shards import get_shard_loaders
+from src.models.runtime import artifact_path, load_eager
+
+
+def _engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    for e in ("x86", "fbgemm", "qnnpack"):
+        if e in engines:
+            return e
+    raise RuntimeError(f"Aucun moteur de quantification disponible ({engines})")
+
+
+def quantize_dynamic_linear(model: nn.Module) -> nn.Module:
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+@torch.no_grad()
+def quantize_static(model: nn.Module, calib_loader, calib_batches: int = 32) -> nn.Module:
+    """PTQ statique : observateurs insérés par FX, calibration, puis conversion en kernels INT8."""
+    engine = _engine()
+    torch.backends.quantized.engine = engine
+    example = next(iter(calib_loader))[0]
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs=(example,))
+    for i, (xb, _) in enumerate(calib_loader):
+        if i >= calib_batches:
+            break
+        prepared(xb)
+    return convert_fx(prepared)
+
+
+@torch.no_grad()
+def save_int8(qmodel: nn.Module, img_size: int, out_path: str):
+    example = torch.randn(2, 3, img_size, img_size)
+    traced = torch.jit.freeze(torch.jit.trace(qmodel, example))
+    traced.save(out_path)
+    return out_path
+
+
+@torch.no_grad()
+def _score(model, loader, max_batches=None):
+    """Probas + labels sur le loader, et temps passé dans le forward seul."""
+    ys, ps, forward_s, n = [], [], 0.0, 0
+    for i, (xb, yb) in enumerate(loader):
+        if max_batches is not None and i >= max_batches:
+            break
+        t0 = time.perf_counter()
+        logits = model(xb)
+        forward_s += time.perf_counter() - t0
+        ps.append(torch.sigmoid(logits.float()).squeeze(1))
+        ys.append(yb)
+        n += xb.size(0)
+    return torch.cat(ys).numpy(), torch.cat(ps).numpy(), forward_s, n
+
+
+@torch.no_grad()
+def _latency_ms(model, img_size: int, batch_size: int, repeats: int = 20) -> float:
+    x = torch.randn(batch_size, 3, img_size, img_size)
+    model(x)  # warm-up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model(x)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(times))
+
+
+def run_quantize(cfg, logger, model_name, weights_path=None, mode="static", img_size=None,
+                 calib_batches=32, eval_batches=None, out_json=None):
+    paths = cfg["paths"]
+    trcfg = cfg["train"].copy()
+    if img_size is not None:
+        trcfg["img_size"] = img_size
+    img_size = int(trcfg["img_size"])
+    weights_path = weights_path or f"checkpoints/best_{model_name}.pt"
+
+    workers = int(trcfg.get("num_workers", 2))
+    if platform.system().lower().startswith("win") and workers > 0:
+        workers = 0
+    if trcfg.get("data_format", "files") == "shards":
+        load = get_shard_loaders
+    else:
+        from src.data.dataset import get_loaders  # importé ici : src.quantize reste importable sans le module
+        load = get_loaders
+    kwargs = {"shards_dir": paths["shards_dir"]} if load is get_shard_loaders else {}
+    _, val_loader = load(
+        batch_size=int(trcfg.get("batch_size", 64)),
+        img_size=img_size,
+        num_workers=workers,
+        **kwargs
+    )
+
+    # Quantification = CPU uniquement
+    device = torch.device("cpu")
+    fp32 = load_eager(model_name, weights_path, device)
+    if mode == "dynamic":
+        qmodel = quantize_dynamic_linear(load_eager(model_name, weights_path, device))
+    elif mode == "static":
+        qmodel = quantize_static(load_eager(model_name, weights_path, device), val_loader, calib_batches)
+    else:
+        raise ValueError(f"Mode inconnu: {mode} (dynamic|static)")
+
+    out_path = save_int8(qmodel, img_size, artifact_path(weights_path, "int8"))
+    logger.info(f"[QUANT {model_name}] {mode} -> {out_path}")
+    int8 = torch.jit.load(out_path).eval()
+
+    # --------- Qualité : AUC fp32 vs INT8 ---------
+    report = {"mode": mode, "engine": torch.backends.quantized.engine, "img_size": img_size}
+    for tag, m in (("fp32", fp32), ("int8", int8)):
+        ys, ps, forward_s, n = _score(m, val_loader, eval_batches)
+        metrics = binary_metrics(ys, ps, thresh=0.5)
+        report[tag] = {
+            **metrics,
+            "throughput_img_s": n / forward_s if forward_s > 0 else 0.0,
+            "latency_ms_bs1": _latency_ms(m, img_size, 1),
+            "latency_ms_bs32": _latency_ms(m, img_size, 32),
+            "size_mb": os.path.getsize(weights_path if tag == "fp32" else out_path) / 1024 / 1024,
+        }
+    report["auc_delta"] = report["int8"]["auc"] - report["fp32"]["auc"]
+    report["speedup"] = report["int8"]["throughput_img_s"] / max(report["fp32"]["throughput_img_s"], 1e-9)
+
+    logger.info(
+        f"[QUANT {model_name}] AUC fp32={report['fp32']['auc']:.4f} int8={report['int8']['auc']:.4f} "
+        f"(Δ={report['auc_delta']:+.4f})  débit x{report['speedup']:.2f}  "
+        f"latence bs1 {report['fp32']['latency_ms_bs1']:.1f}ms -> {report['int8']['latency_ms_bs1']:.1f}ms"
+    )
+
+    # --------- MLflow logging ---------
+    os.makedirs(paths["mlruns_dir"], exist_ok=True)
+    mlflow.set_tracking_uri(paths["mlruns_dir"])
+    mlflow.set_experiment("cancer-detection-ai")
+    with mlflow.start_run(run_name=f"quantize-{model_name}"):
+        mlflow.log_param("quant_model", model_name)
+        mlflow.log_param("quant_mode", mode)
+        mlflow.log_param("weights", weights_path)
+        mlflow.log_param("img_size", img_size)
+        mlflow.log_param("calib_batches", calib_batches)
+        for tag in ("fp32", "int8"):
+            for k, v in report[tag].items():
+                mlflow.log_metric(f"{tag}_{k}", v)
+        mlflow.log_metric("auc_delta", report["auc_delta"])
+        mlflow.log_metric("speedup", report["speedup"])
+        mlflow.log_artifact(out_path)
+
+    if out_json:
+        out_dir = os.path.dirname(out_json)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(out_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Quantization report written to: {out_json}")
+
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", required=True, help="Nom du modèle (ex: resnet18)")
+    ap.add_argument("--weights", default=None, help="Chemin du .pt fp32 (défaut: checkpoints/best_<model>.pt)")
+    ap.add_argument("--mode", default="static", choices=["static", "dynamic"],
+                    help="static = PTQ calibrée (convs+linéaires), dynamic = têtes Linear seulement")
+    ap.add_argument("--img-size", type=int, default=None, help="Override img_size (sinon config)")
+    ap.add_argument("--calib-batches", type=int, default=32, help="Nb de batchs de validation pour la calibration")
+    ap.add_argument("--eval-batches", type=int, default=None, help="Limiter la comparaison fp32/INT8 à N batchs")
+    ap.add_argument("--out-json", default=None, help="Rapport JSON (ex: reports/quantization.json)")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    cfg = load_all_configs()
+
+    run_quantize(
+        cfg=cfg,
+        logger=logger,
+        model_name=args.model,
+        weights_path=args.weights,
+        mode=args.mode,
+        img_size=args.img_size,
+        calib_batches=args.calib_batches,
+        eval_batches=args.eval_batches,
+        out_json=args.out_json
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# src/search.py
+# ------------------------------------------------------------
+# Recherche d'hyperparamètres au-dessus de run_train (configs/search.yaml) :
+# - espace : lr, weight_decay, batch_size, img_size, model_name (choice / uniform / loguniform)
+# - random : chaque trial va jusqu'à max_epochs
+# - asha   : successive halving asynchrone ; à chaque palier (min_epochs * eta^k époques),
+#            un trial ne continue que s'il est dans le meilleur 1/eta des val AUC vues à ce palier
+# - trials en parallèle (process spawn, cœurs / jobs threads chacun), paliers partagés via un Manager
+# - MLflow : run parent "search-<strategy>" + un run imbriqué par trial (tag mlflow.parentRunId)
+# - meilleure config écrite dans configs/train.best.yaml (candidate pour configs/train.yaml)
+# Usage : python -m src.search --trials 16 --jobs 4
+# ------------------------------------------------------------
+
+import argparse
+import copy
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import torch
+import yaml
+import mlflow
+
+from src.utils.logger import setup_logging
+from src.utils.config import load_all_configs, load_yaml
+
+
+def sample_space(space: dict, n: int, seed: int = 1337) -> list:
+    """Tire n configurations au hasard dans l'espace de recherche."""
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(n):
+        params = {}
+        for name, spec in space.items():
+            kind = spec["type"]
+            if kind == "choice":
+                params[name] = spec["values"][int(rng.integers(len(spec["values"])))]
+            elif kind == "uniform":
+                params[name] = float(rng.uniform(spec["low"], spec["high"]))
+            elif kind == "loguniform":
+                params[name] = float(math.exp(rng.uniform(math.log(spec["low"]), math.log(spec["high"]))))
+            else:
+                raise ValueError(f"Type de distribution inconnu pour {name}: {kind}")
+        trials.append(params)
+    return trials
+
+
+def asha_rungs(min_epochs: int, eta: int, max_epochs: int) -> list:
+    rungs, r = [], int(min_epochs)
+    while r < max_epochs:
+        rungs.append(r)
+        r *= int(eta)
+    return rungs
+
+
+def asha_continue(scores: list, score: float, eta: int) -> bool:
+    """Règle ASHA (variante arrêt) : continuer si `score` est dans le top 1/eta des scores du palier."""
+    k = len(scores) // int(eta)
+    if k == 0:
+        return True  # pas encore assez de trials à ce palier : optimiste
+    return score >= sorted(scores, reverse=True)[k - 1]
+
+
+class _AshaCallback:
+    """epoch_callback de run_train : enregistre la val AUC aux paliers et décide de l'arrêt."""
+    def __init__(self, rungs, eta, table, lock):
+        self.rungs, self.eta = set(rungs), eta
+        self.table, self.lock = table, lock
+        self.history, self.pruned_at = [], None
+
+    def __call__(self, epoch, metrics):
+        auc = float(metrics["auc"])
+        self.history.append(auc)
+        if epoch not in self.rungs:
+            return True
+        best = max(self.history)  # meilleure AUC jusqu'ici (le checkpoint gardé)
+        with self.lock:
+            scores = list(self.table.get(epoch, [])) + [best]
+            self.table[epoch] = scores
+        if asha_continue(scores, best, self.eta):
+            return True
+        self.pruned_at = epoch
+        return False
+
+
+def _run_trial(trial_id, params, scfg, parent_run_id, threads, table, lock):
+    """Un trial dans un process dédié : run_train avec les overrides du trial (+ élagage ASHA)."""
+    from src.train import run_train  # import dans le process enfant (spawn)
+
+    torch.set_num_threads(threads)
+    logger = setup_logging()
+    cfg = load_all_configs()
+    overrides = {**scfg.get("overrides", {}), **params, "epochs": int(scfg["max_epochs"])}
+
+    callback = None
+    if scfg["strategy"] == "asha":
+        acfg = scfg.get("asha", {})
+        eta = int(acfg.get("reduction_factor", 3))
+        callback = _AshaCallback(asha_rungs(acfg.get("min_epochs", 1), eta, scfg["max_epochs"]), eta, table, lock)
+
+    best_auc = run_train(
+        cfg, logger, overrides,
+        epoch_callback=callback,
+        best_path=f"checkpoints/search/trial{trial_id:03d}_{params.get('model_name', cfg['train']['model_name'])}.pt",
+        run_name=f"trial-{trial_id:03d}",
+        mlflow_tags={"mlflow.parentRunId": parent_run_id, "search_trial": str(trial_id)},
+    )
+    return {
+        "trial": trial_id,
+        "params": params,
+        "best_auc": best_auc,
+        "epochs": len(callback.history) if callback else int(scfg["max_epochs"]),
+        "pruned_at": callback.pruned_at if callback else None,
+    }
+
+
+def write_best_config(params: dict, out_path: str = "configs/train.best.yaml", base: str = "configs/train.yaml"):
+    train = load_yaml(base)
+    train.update(params)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(f"# {out_path} — meilleure config trouvée par src.search (candidate pour {base})\n")
+        yaml.safe_dump(train, f, sort_keys=False, allow_unicode=True)
+    return out_path
+
+
+def run_search(cfg, logger, scfg: dict, out_config: str = "configs/train.best.yaml"):
+    scfg = copy.deepcopy(scfg)
+    if scfg["strategy"] not in ("random", "asha"):
+        raise ValueError(f"Stratégie inconnue: {scfg['strategy']} (random|asha)")
+    trials = sample_space(scfg["space"], int(scfg["trials"]), int(scfg.get("seed", 1337)))
+    jobs = max(1, min(int(scfg.get("jobs", 1)), len(trials)))
+    threads = int(scfg.get("threads") or max(1, (os.cpu_count() or 1) // jobs))
+
+    paths = cfg["paths"]
+    os.makedirs(paths["mlruns_dir"], exist_ok=True)
+    mlflow.set_tracking_uri(paths["mlruns_dir"])
+    mlflow.set_experiment("cancer-detection-ai")
+
+    results = []
+    with mlflow.start_run(run_name=f"search-{scfg['strategy']}") as parent, mp.get_context("spawn").Manager() as manager:
+        for k in ("strategy", "trials", "max_epochs", "seed"):
+            mlflow.log_param(f"search_{k}", scfg.get(k))
+        mlflow.log_dict(scfg, "search_config.json")
+        logger.info(f"[SEARCH] {len(trials)} trials ({scfg['strategy']}), {jobs} en parallèle x {threads} threads")
+
+        table, lock = manager.dict(), manager.Lock()
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn")) as pool:
+            futures = {pool.submit(_run_trial, i, p, scfg, parent.info.run_id, threads, table, lock): i
+                       for i, p in enumerate(trials)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    r = fut.result()
+                except Exception as e:  # un trial en échec n'arrête pas la recherche
+                    logger.exception(f"[SEARCH] trial {i} en échec: {e}")
+                    r = {"trial": i, "params": trials[i], "best_auc": None, "epochs": 0, "pruned_at": None}
+                results.append(r)
+                state = f"élagué à {r['pruned_at']} ép." if r["pruned_at"] else f"{r['epochs']} ép."
+                logger.info(f"[SEARCH] trial {i}: AUC={r['best_auc']} ({state}) {r['params']}")
+
+        results.sort(key=lambda r: r["trial"])
+        done = [r for r in results if r["best_auc"] is not None]
+        if not done:
+            raise RuntimeError("Aucun trial n'a abouti")
+        best = max(done, key=lambda r: r["best_auc"])
+        mlflow.log_metric("best_val_auc", best["best_auc"])
+        mlflow.log_metric("trials_pruned", sum(1 for r in results if r["pruned_at"]))
+        mlflow.log_metric("epochs_total", sum(r["epochs"] for r in results))
+        for k, v in best["params"].items():
+            mlflow.log_param(f"best_{k}", v)
+        out = write_best_config(best["params"], out_config)
+        mlflow.log_artifact(out)
+        mlflow.log_dict(results, "search_results.json")
+
+    logger.info(f"[SEARCH] meilleur trial {best['trial']}: AUC={best['best_auc']:.4f} {best['params']} -> {out}")
+    return best, results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="configs/search.yaml", help="Espace et stratégie de recherche")
+    ap.add_argument("--strategy", choices=["random", "asha"], default=None)
+    ap.add_argument("--trials", type=int, default=None)
+    ap.add_argument("--jobs", type=int, default=None, help="Trials simultanés")
+    ap.add_argument("--max-epochs", type=int, default=None)
+    ap.add_argument("--out-config", default="configs/train.best.yaml")
+    args = ap.parse_args()
+
+    logger = setup_logging()
+    cfg = load_all_configs()
+    scfg = load_yaml(args.config)
+    if args.strategy is not None:   scfg["strategy"] = args.strategy
+    if args.trials is not None:     scfg["trials"] = args.trials
+    if args.jobs is not None:       scfg["jobs"] = args.jobs
+    if args.max_epochs is not None: scfg["max_epochs"] = args.max_epochs
+
+    run_search(cfg, logger, scfg, args.out_config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# src/serving/archive.py
+# Extraction des patches d'une archive zip/tar envoyée à /predict/batch
+import io
+import os
+import tarfile
+import zipfile
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+
+def is_archive(filename: str | None) -> bool:
+    return bool(filename) and filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def extract_images(data: bytes, filename: str, max_total_bytes: int) -> list[tuple[str, bytes]]:
+    """
+    Retourne [(nom, octets)] des images de l'archive, dans l'ordre de l'archive.
+    La taille décompressée cumulée est bornée (ValueError au-delà) pour éviter les zip bombs.
+    """
+    items, total = [], 0
+
+    def _add(name, size, read):
+        nonlocal total
+        if os.path.basename(name).startswith(".") or not name.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        total += size
+        if total > max_total_bytes:
+            raise ValueError(f"Archive trop volumineuse une fois décompressée (max {max_total_bytes // (1024 * 1024)}MB)")
+        items.append((name, read()))
+
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    _add(info.filename, info.file_size, lambda info=info: zf.read(info))
+    else:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tf:
+            for member in tf:
+                if member.isfile():
+                    _add(member.name, member.size, lambda member=member: tf.extractfile(member).read())
+    return items
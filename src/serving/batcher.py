@@ -0,0 +1,129 @@
+# src/serving/batcher.py
+# ------------------------------------------------------------
+# Micro-batching dynamique pour l'inférence :
+# - les requêtes concurrentes déposent leur tenseur [C,H,W] dans une file
+# - une tâche de fond regroupe jusqu'à max_batch_size éléments ou attend
+#   au plus max_wait_ms après le premier, puis lance UN seul forward
+# - chaque appelant reçoit sa propre probabilité via un Future
+# ------------------------------------------------------------
+
+import asyncio
+import time
+
+import torch
+
+from src.serving.executor import ExecutorStage, Overloaded
+from src.serving.telemetry import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+class MicroBatcher:
+    """Coalesce les appels à `submit()` en batchs pour `forward_fn` ([B,C,H,W] -> probas [B])."""
+    def __init__(self, forward_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 executor=None, max_queue: int = 0):
+        self.forward_fn = forward_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor  # ExecutorStage, Executor, ou None (pool par défaut asyncio)
+        self.max_queue = max(0, int(max_queue))  # 0 = file non bornée
+        self.rejected = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self._queue = None
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Les requêtes encore en file ne seront jamais servies
+        while self._queue is not None and not self._queue.empty():
+            _, fut, _ = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Batcher arrêté"))
+
+    async def submit(self, x: torch.Tensor) -> float:
+        """Dépose une image prétraitée [C,H,W] et attend sa probabilité."""
+        if self._task is None:
+            raise RuntimeError("Batcher non démarré")
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("batcher")
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((x, fut, time.perf_counter()))
+        self._wakeup.set()
+        return await fut
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Les appelants partis (timeout/cancel) ne consomment pas de calcul
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            for _, _, t0 in batch:
+                self.queue_wait_ms.observe((now - t0) * 1000.0)
+            self.batch_sizes.observe(len(batch))
+
+            xb = torch.stack([item[0] for item in batch])
+            try:
+                if isinstance(self.executor, ExecutorStage):
+                    probs = await self.executor.run(self.forward_fn, xb)
+                else:
+                    probs = await loop.run_in_executor(self.executor, self.forward_fn, xb)
+                probs = probs.reshape(-1).tolist()
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut, _), p in zip(batch, probs):
+                if not fut.done():
+                    fut.set_result(float(p))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
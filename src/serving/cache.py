@@ -0,0 +1,138 @@
+# src/serving/cache.py
+# ------------------------------------------------------------
+# Cache de prédictions indexé par contenu :
+# - clé = hash des octets de l'image, dans un "namespace" modèle+checkpoint+img_size
+# - niveau 1 : LRU en mémoire, borné en nombre d'entrées, avec TTL
+# - niveau 2 optionnel : backend partagé (ex: disque) entre workers uvicorn
+# - changement de namespace (nouveau checkpoint) => invalidation automatique
+# ------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class DiskBackend:
+    """Stockage partagé : un petit fichier JSON par entrée, sous <root>/<namespace>/."""
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.root, namespace, key[:2], key + ".json")
+
+    def get(self, namespace: str, key: str):
+        try:
+            with open(self._path(namespace, key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry["value"], entry["stored_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, namespace: str, key: str, value, stored_at: float):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "stored_at": stored_at}, f)
+        os.replace(tmp, path)  # atomique : un autre worker ne lit jamais un fichier partiel
+
+    def delete(self, namespace: str, key: str):
+        try:
+            os.remove(self._path(namespace, key))
+        except OSError:
+            pass
+
+    def drop_namespace(self, namespace: str):
+        shutil.rmtree(os.path.join(self.root, namespace), ignore_errors=True)
+
+
+def make_backend(name: str | None, **kwargs):
+    if not name or name == "memory":
+        return None
+    if name == "disk":
+        return DiskBackend(kwargs.get("disk_dir", ".cache/predictions"))
+    raise ValueError(f"Backend de cache inconnu: {name} (memory|disk)")
+
+
+class PredictionCache:
+    """LRU + TTL en mémoire, avec backend partagé optionnel et compteurs hit/miss/éviction."""
+    def __init__(self, max_entries: int = 50000, ttl_s: float = 3600, backend=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s) if ttl_s else 0.0  # 0 = pas d'expiration
+        self.backend = backend
+        self.namespace = None
+        self._lru = OrderedDict()  # key -> (value, stored_at)
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def set_namespace(self, model_name: str, checkpoint_digest: str, img_size: int, tta: int = 1):
+        """À appeler à chaque (re)chargement de modèle : un nouveau checkpoint vide le cache."""
+        namespace = f"{model_name}-{checkpoint_digest[:16]}-{img_size}" + (f"-tta{tta}" if tta > 1 else "")
+        if self.namespace is not None and namespace != self.namespace:
+            self.invalidations += 1
+            self._lru.clear()
+            if self.backend is not None:
+                self.backend.drop_namespace(self.namespace)
+        self.namespace = namespace
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl_s) and time.time() - stored_at > self.ttl_s
+
+    def get(self, key: str):
+        entry = self._lru.get(key)
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(self.namespace, key)
+            if entry is not None:
+                self._store(key, *entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, stored_at = entry
+        if self._expired(stored_at):
+            self.expirations += 1
+            self.misses += 1
+            self._lru.pop(key, None)
+            if self.backend is not None:
+                self.backend.delete(self.namespace, key)
+            return None
+        self._lru.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+        if self.backend is not None:
+            self.backend.put(self.namespace, key, value, stored_at)
+
+    def _store(self, key: str, value, stored_at: float):
+        self._lru[key] = (value, stored_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": type(self.backend).__name__ if self.backend is not None else "memory",
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,33 @@
+# src/serving/decode.py
+# Fonctions de décodage exécutées dans le pool (threads ou processus) : top-level => picklables
+import time
+
+import torch
+
+from src.data.preprocess import decode_tile
+
+
+def decode_image(data: bytes, img_size: int) -> torch.Tensor:
+    """
+    Octets d'image -> tuile uint8 [H,W,C] à img_size (resize seulement si besoin).
+    Conversion float + normalisation faites ensuite sur tout le batch (BatchPreprocessor).
+    """
+    return torch.from_numpy(decode_tile(data, img_size))
+
+
+def decode_many(datas: list[bytes], img_size: int) -> list:
+    """Décode une liste d'images ; un échec n'interrompt pas les autres (message d'erreur à la place)."""
+    out = []
+    for data in datas:
+        try:
+            out.append(decode_image(data, img_size))
+        except Exception as e:
+            out.append(f"Image illisible: {e}")
+    return out
+
+
+def timed(fn, *args):
+    """(fn(*args), durée en s) mesurée dans le worker : temps de décodage sans l'attente du pool."""
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
@@ -0,0 +1,82 @@
+# src/serving/executor.py
+# ------------------------------------------------------------
+# Étages d'exécution hors boucle asyncio :
+# - pool de décodage (threads, ou processus pour contourner le GIL)
+# - pool d'inférence (threads, torch libère le GIL pendant les ops)
+# - files bornées : au-delà de max_pending -> Overloaded (503/429 côté API)
+# ------------------------------------------------------------
+
+import asyncio
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import torch
+
+
+class Overloaded(Exception):
+    """Levée quand un étage (ou la file du batcher) est plein : on refuse plutôt que d'empiler."""
+    def __init__(self, stage: str):
+        super().__init__(f"Étage '{stage}' saturé")
+        self.stage = stage
+
+
+def configure_torch_threads(intra_op: int | None = None, inter_op: int | None = None):
+    """Applique torch.set_num_threads / set_num_interop_threads (ce dernier une seule fois par process)."""
+    if intra_op:
+        torch.set_num_threads(int(intra_op))
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(int(inter_op))
+        except RuntimeError:
+            pass  # déjà fixé (ou travail parallèle déjà lancé)
+
+
+def _process_worker_init():
+    # Un seul thread torch par processus de décodage -> pas de sur-souscription CPU
+    torch.set_num_threads(1)
+
+
+def make_pool(kind: str, workers: int, name: str):
+    workers = max(1, int(workers))
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                   initializer=_process_worker_init)
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+    raise ValueError(f"Type de pool inconnu: {kind} (thread|process)")
+
+
+class ExecutorStage:
+    """Pool de workers (cf. make_pool) + nombre borné de tâches en vol (en cours + en attente)."""
+    def __init__(self, name: str, kind: str, workers: int, max_pending: int = 64):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.pool = make_pool(kind, self.workers, name)
+        self.max_pending = max(1, int(max_pending))
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.name)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "pool": type(self.pool).__name__,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,293 @@
+# src/serving/registry.py
+# ------------------------------------------------------------
+# Registre de modèles en mémoire pour l'API :
+# - plusieurs checkpoints pré-chargés (configs/models.yaml), un modèle par défaut
+# - chaque modèle est "chauffé" au chargement (forward à blanc) : pas de cold start sur la 1re requête
+# - surveillance des checkpoints (mtime + taille) : un fichier modifié et stable est rechargé
+#   à côté de l'ancien, puis remplacé d'un coup ; les forwards en cours finissent sur l'ancien
+# - par modèle : empreinte du checkpoint, mémoire des poids, temps de chargement / warmup
+# - histogrammes optionnels des temps de prétraitement / forward par batch (/metrics)
+# - TTA dihédrale optionnelle (`tta` vues par image, un seul forward agrandi par batch)
+# - ensembles (src/models/ensemble.py) servis comme des modèles, sur les modèles chargés du registre
+# - seuils nommés (best_f1 / target_recall) par modèle servi, vérifiés contre le rapport qui les a calculés
+# ------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import torch
+
+from src.models.ensemble import EnsembleEngine
+from src.models.runtime import artifact_path, load_predictor
+from src.models.tta import check_views, tta_forward
+from src.utils.checkpoint import file_digest
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    predictor: object
+    path: str             # artefact effectivement chargé (.pt / .ts / .onnx)
+    digest: str
+    stamp: tuple          # (mtime_ns, taille) du fichier au chargement
+    memory_mb: float
+    load_ms: float
+    warmup_ms: float
+    loaded_at: float = field(default_factory=time.time)
+    version: int = 1
+
+    def info(self) -> dict:
+        params = sum(p.numel() for p in self.predictor.parameters())
+        return {
+            "model_name": self.name,
+            "checkpoint": self.path,
+            "digest": self.digest[:16],
+            "total_parameters": params,
+            "memory_mb": round(self.memory_mb, 2),
+            "load_ms": round(self.load_ms, 1),
+            "warmup_ms": round(self.warmup_ms, 1),
+            "loaded_at": self.loaded_at,
+            "version": self.version,
+        }
+
+
+def _stamp(path: str):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _memory_mb(predictor, path: str) -> float:
+    """Octets des poids + buffers (eager / TorchScript) ; taille de l'artefact pour onnxruntime."""
+    tensors = list(predictor.parameters())
+    if hasattr(predictor, "buffers"):
+        tensors += list(predictor.buffers())
+    if not tensors:
+        return os.path.getsize(path) / 1e6
+    return sum(t.numel() * t.element_size() for t in tensors) / 1e6
+
+
+class ModelRegistry:
+    """
+    `forward(name, xb)` : probas [B] depuis des tuiles uint8 [B,H,W,C] avec le modèle courant `name`.
+    `prep(xb, device)` est le prétraitement batch (BatchPreprocessor) commun à tous les modèles.
+    `preprocess_s` / `forward_s` (telemetry.Histogram) : durées par batch observées dans forward().
+    `tta` : vues dihédrales par image (1 = off), générées sur le batch prétraité.
+    """
+    def __init__(self, prep, img_size: int, runtime: str = "eager", device=None, channels_last: bool = False,
+                 checkpoint_fmt: str = "checkpoints/best_{name}.pt", default: str | None = None,
+                 preprocess_s=None, forward_s=None, tta: int = 1):
+        self.prep = prep
+        self.img_size = int(img_size)
+        self.runtime = runtime
+        self.device = device or torch.device("cpu")
+        self.channels_last = channels_last and runtime == "eager"
+        self.checkpoint_fmt = checkpoint_fmt
+        self.default = default
+        self.swaps = 0
+        self._models = {}
+        self._ensembles = {}  # name -> LoadedModel dont le predictor est un EnsembleEngine
+        self._pending = {}  # name -> stamp vu modifié au dernier poll (attend qu'il soit stable)
+        self._lock = threading.Lock()
+        self.preprocess_s = preprocess_s
+        self.forward_s = forward_s
+        self.tta = check_views(tta)
+
+    def checkpoint(self, name: str) -> str:
+        return artifact_path(self.checkpoint_fmt.format(name=name), self.runtime)
+
+    def _forward_with(self, predictor, xb: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            logits = tta_forward(predictor, self.prep(xb, self.device), self.tta)
+            return torch.sigmoid(logits).squeeze(1).float().cpu()
+
+    def _build(self, name: str, version: int = 1) -> LoadedModel:
+        """Charge + chauffe un modèle (bloquant, hors boucle asyncio) sans toucher au registre."""
+        path = self.checkpoint(name)
+        stamp = _stamp(path)
+        t0 = time.perf_counter()
+        predictor = load_predictor(name, self.checkpoint_fmt.format(name=name), self.runtime, self.device)
+        if self.channels_last:
+            predictor = predictor.to(memory_format=torch.channels_last)
+        load_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        try:
+            self._forward_with(predictor, torch.zeros(1, self.img_size, self.img_size, 3, dtype=torch.uint8))
+        except Exception as e:
+            raise RuntimeError(f"{name}: modèle incompatible avec img_size={self.img_size} "
+                               f"(runtime={self.runtime}): {e}") from e
+        warmup_ms = (time.perf_counter() - t0) * 1000
+        return LoadedModel(name, predictor, path, file_digest(path), stamp, _memory_mb(predictor, path),
+                           load_ms, warmup_ms, version=version)
+
+    def load(self, name: str) -> LoadedModel:
+        entry = self._build(name)
+        with self._lock:
+            self._models[name] = entry
+            if self.default is None:
+                self.default = name
+        return entry
+
+    def _ensemble_digest(self, engine: EnsembleEngine) -> str:
+        """Empreinte d'un ensemble = empreintes des checkpoints membres + combinaison (invalide le cache au swap)."""
+        parts = [f"{m.name}@{m.img_size}:{self.get(m.name).digest}" for m in engine.members]
+        parts.append(f"{engine.method}:{engine.weights}:tta{engine.tta}")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def add_ensemble(self, name: str, report_path: str, workers: int | None = None) -> LoadedModel:
+        """
+        Ensemble ajusté par `python -m src.ensemble` ; les membres absents du registre sont chargés.
+        Chaque forward prend le modèle courant des membres (rechargement à chaud compris).
+        """
+        t0 = time.perf_counter()
+        # tta du rapport : poids et références rank ont été ajustés avec ce nombre de vues
+        engine = EnsembleEngine.from_report(report_path, device=self.device,
+                                           channels_last=self.channels_last, workers=workers,
+                                           predictor_fn=lambda n: self.get(n).predictor)
+        for m in engine.members:
+            if m.name not in self.names():
+                self.load(m.name)
+        load_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        engine(torch.zeros(1, self.img_size, self.img_size, 3, dtype=torch.uint8))
+        warmup_ms = (time.perf_counter() - t0) * 1000
+        entry = LoadedModel(name, engine, report_path, self._ensemble_digest(engine), _stamp(report_path),
+                            0.0, load_ms, warmup_ms)  # mémoire : celle des membres, déjà comptée
+        with self._lock:
+            self._ensembles[name] = entry
+        return entry
+
+    def get(self, name: str | None = None) -> LoadedModel:
+        """KeyError si `name` n'est pas chargé ; None = modèle par défaut."""
+        name = name or self.default
+        with self._lock:
+            return self._ensembles[name] if name in self._ensembles else self._models[name]
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self._models) + list(self._ensembles)
+
+    def forward(self, name: str, xb: torch.Tensor) -> torch.Tensor:
+        # référence prise au début du batch : un swap concurrent ne l'affecte pas
+        predictor = self.get(name).predictor
+        if isinstance(predictor, EnsembleEngine):
+            return predictor(xb)  # prétraitement par img_size des membres, dans le moteur
+        if self.preprocess_s is None and self.forward_s is None:
+            return self._forward_with(predictor, xb)
+        with torch.no_grad():
+            t0 = time.perf_counter()
+            x = self.prep(xb, self.device)
+            t1 = time.perf_counter()
+            probs = torch.sigmoid(tta_forward(predictor, x, self.tta)).squeeze(1).float().cpu()
+            t2 = time.perf_counter()
+        if self.preprocess_s is not None:
+            self.preprocess_s.observe(t1 - t0)
+        if self.forward_s is not None:
+            self.forward_s.observe(t2 - t1)
+        return probs
+
+    def check_updates(self, logger=None) -> list:
+        """
+        Un poll : recharge les modèles dont le checkpoint a changé et n'a plus bougé depuis le poll
+        précédent (fichier en cours d'écriture ignoré). Renvoie les entrées remplacées.
+        En cas d'échec, l'ancien modèle reste servi.
+        """
+        swapped = []
+        with self._lock:
+            names = list(self._models)
+        for name in names:
+            current = self.get(name)
+            try:
+                stamp = _stamp(current.path)
+            except FileNotFoundError:
+                continue
+            if stamp == current.stamp:
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != stamp:
+                self._pending[name] = stamp
+                continue
+            self._pending.pop(name, None)
+            try:
+                entry = self._build(name, version=current.version + 1)
+            except Exception as e:
+                if logger:
+                    logger.error(f"❌ Rechargement de {name} impossible, ancien modèle conservé: {e}")
+                current.stamp = stamp  # pas de nouvelle tentative tant que le fichier ne change pas
+                continue
+            with self._lock:
+                self._models[name] = entry
+                self.swaps += 1
+            swapped.append(entry)
+            if logger:
+                logger.info(f"🔁 {name} rechargé (v{entry.version}, {entry.load_ms:.0f}ms + warmup {entry.warmup_ms:.0f}ms)")
+        if swapped:
+            # ensembles dont un membre a changé : nouvelle empreinte (cache invalidé par l'appelant)
+            names = {e.name for e in swapped}
+            with self._lock:
+                ensembles = list(self._ensembles.values())
+            for entry in ensembles:
+                if names & {m.name for m in entry.predictor.members}:
+                    entry.digest = self._ensemble_digest(entry.predictor)
+                    entry.version += 1
+                    swapped.append(entry)
+        return swapped
+
+    def stale_members(self, name: str) -> list:
+        """Membres d'un ensemble dont le checkpoint chargé n'est pas celui de l'ajustement des poids."""
+        engine = self.get(name).predictor
+        return [m.name for m in engine.members
+                if engine.fitted_digests.get(m.name) not in (None, self.get(m.name).digest)]
+
+    def operating_point(self, name: str, key: str, report_fmt: str = "reports/metrics.json") -> float:
+        """
+        Seuil threshold_<key> calculé pour le modèle servi `name` : JSON de src.evaluate (`report_fmt`,
+        {name} = nom du modèle) ou, pour un ensemble, son rapport src.ensemble. RuntimeError si le rapport
+        manque ou décrit autre chose que ce qui est servi (modèle, checkpoint, runtime, TTA, img_size).
+        """
+        entry = self.get(name)
+        if isinstance(entry.predictor, EnsembleEngine):
+            # rapport tel que chargé avec les poids servis (pas le fichier, qui a pu être réécrit depuis)
+            path, fix, report = entry.path, "python -m src.ensemble", entry.predictor.report
+            stale = self.stale_members(name)
+            mismatch = [f"checkpoints de {', '.join(stale)}"] if stale else []
+            expected = {"runtime": self.runtime}
+        else:
+            path = report_fmt.format(name=name)
+            fix = (f"python -m src.evaluate --model {name} --runtime {self.runtime} --tta {self.tta} "
+                   f"--img-size {self.img_size} --out-json {path}")
+            if not os.path.exists(path):
+                raise RuntimeError(f"{name}: seuil {key} demandé mais {path} introuvable ({fix})")
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            mismatch = []
+            expected = {"model_name": name, "weights_digest": entry.digest, "runtime": self.runtime,
+                        "tta": self.tta, "img_size": self.img_size}
+        mismatch += [k for k, v in expected.items() if report.get(k) != v]
+        if mismatch:
+            raise RuntimeError(f"{name}: {path} calculé pour un autre modèle servi ({', '.join(mismatch)}) : {fix}")
+        if f"threshold_{key}" not in report:
+            raise RuntimeError(f"{name}: clé threshold_{key} absente de {path} (best_f1 | target_recall)")
+        return float(report[f"threshold_{key}"])
+
+    def close(self):
+        with self._lock:
+            ensembles = list(self._ensembles.values())
+        for entry in ensembles:
+            entry.predictor.close()
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = list(self._models.values()) + list(self._ensembles.values())
+        return {
+            "default": self.default,
+            "runtime": self.runtime,
+            "device": str(self.device),
+            "tta": self.tta,
+            "swaps": self.swaps,
+            "total_memory_mb": round(sum(e.memory_mb for e in entries), 2),
+            "models": {e.name: e.info() for e in entries},
+        }
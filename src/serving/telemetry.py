@@ -0,0 +1,131 @@
+# src/serving/telemetry.py
+# Compteurs / histogrammes légers (sans dépendance) + export au format texte Prometheus (/metrics)
+import threading
+
+
+class Histogram:
+    """Histogramme à buckets fixes (bornes supérieures, façon Prometheus) + quantiles approchés."""
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)  # dernier = +Inf
+            self.count = 0
+            self.sum = 0.0
+
+    def observe(self, value: float):
+        value = float(value)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Quantile estimé par interpolation linéaire dans le bucket concerné."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        labels = [f"{b:g}" for b in self.buckets] + ["+Inf"]
+        return {
+            "count": count,
+            "sum": round(total, 4),
+            "mean": round(total / count, 4) if count else 0.0,
+            "p50": round(self.quantile(0.50), 4),
+            "p90": round(self.quantile(0.90), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class Counter:
+    """Compteur monotone, éventuellement étiqueté (labelnames), thread-safe."""
+    def __init__(self, labelnames=()):
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[k]) for k in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            items = list(self.values.items())
+        return [(dict(zip(self.labelnames, k)), v) for k, v in items]
+
+
+def _labels(labels: dict, **extra) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v == v else "NaN"
+
+
+class MetricsRegistry:
+    """
+    Collecteurs exposés au format texte Prometheus (version 0.0.4).
+    - counter() / histogram() : métriques possédées par le registre
+    - register() : métrique lue à la demande, fn() -> [(labels, valeur | Histogram)]
+      (ex: histogrammes des micro-batchers, compteurs du cache) ; `scale` convertit l'unité (ms -> s)
+    """
+    def __init__(self):
+        self._collectors = []  # (nom, aide, type, fn, scale)
+
+    def register(self, name: str, help: str, kind: str, fn, scale: float = 1.0):
+        self._collectors.append((name, help, kind, fn, scale))
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        c = Counter(labelnames)
+        self.register(name, help, "counter", c.samples)
+        return c
+
+    def histogram(self, name: str, help: str, buckets) -> Histogram:
+        h = Histogram(buckets)
+        self.register(name, help, "histogram", lambda: [({}, h)])
+        return h
+
+    def render(self) -> str:
+        lines = []
+        for name, help, kind, fn, scale in self._collectors:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in fn():
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_num(value * scale)}")
+                    continue
+                with value._lock:
+                    counts, count, total = list(value.counts), value.count, value.sum
+                cumulative = 0
+                for bound, c in zip(list(value.buckets) + [None], counts):
+                    cumulative += c
+                    le = "+Inf" if bound is None else f"{bound * scale:g}"
+                    lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_num(total * scale)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
@@ -1,52 +1,137 @@
 # src/train.py
-import os, time, argparse, platform
+import os, time, json, argparse, platform
+from contextlib import nullcontext
 import torch, torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.optim import AdamW
 from tqdm import tqdm
 import mlflow
 
 from src.utils.logger import setup_logging
 from src.utils.config import load_all_configs
-from src.utils.seed import set_seed
+from src.utils.seed import set_seed, get_rng_state, set_rng_state
+from src.utils.checkpoint import AsyncCheckpointer, load_checkpoint, save_atomic
 from src.utils.metrics import binary_metrics
-from src.data.dataset import get_loaders
+from src.utils import distributed as ddp
+from src.utils.profiling import StepProfiler, trace_window
+from src.data.shards import get_shard_loaders
 from src.models.models import build_model
 
 
-def train_one_epoch(model, loader, device, optim, criterion, logger):
+def autocast_ctx(device, amp=False, amp_dtype="bfloat16"):
+    """bf16 autocast sur CPU (fp16 possible sur CUDA) ; no-op si amp désactivé."""
+    if not amp:
+        return nullcontext()
+    return torch.autocast(device_type=device.type, dtype=getattr(torch, amp_dtype))
+
+
+def train_one_epoch(model, loader, device, optim, criterion, logger,
+                    amp=False, amp_dtype="bfloat16", channels_last=False, accum_steps=1, scaler=None,
+                    prof=None, trace=None):
+    """
+    Une époque d'entraînement ; renvoie (loss moyenne, images/s).
+    accum_steps > 1 : gradients accumulés sur plusieurs micro-batchs avant optim.step()
+    (batch effectif = batch_size x accum_steps x world_size).
+    prof (StepProfiler) : temps par phase data / h2d / forward / backward / optim ;
+    trace : fenêtre torch.profiler (trace_window), avancée d'un step par batch.
+    """
     model.train()
-    total = 0.0
-    for xb, yb in tqdm(loader, desc="Train", leave=False):
-        xb = xb.to(device)
+    prof = prof or StepProfiler("train", log_every=0, device=device)
+    trace = trace or trace_window(False)
+    fmt = torch.channels_last if channels_last else torch.contiguous_format
+    total, n = 0.0, 0
+    steps = len(loader)
+    optim.zero_grad(set_to_none=True)
+    t0 = time.perf_counter()
+    prof.start()
+    for i, (xb, yb) in enumerate(tqdm(loader, desc="Train", leave=False, disable=not ddp.is_main()), start=1):
+        prof.split("data")
+        xb = xb.to(device, memory_format=fmt)
         yb = yb.float().unsqueeze(1).to(device)
+        prof.split("h2d")
+        boundary = i % accum_steps == 0 or i == steps
+        # taille réelle du groupe : le dernier peut être incomplet si steps % accum_steps != 0
+        group = min(accum_steps, steps - ((i - 1) // accum_steps) * accum_steps)
 
-        optim.zero_grad()
-        logits = model(xb)
-        loss = criterion(logits, yb)
-        loss.backward()
-        optim.step()
+        # DDP : pas d'all-reduce des gradients sur les micro-batchs intermédiaires
+        sync = model.no_sync() if isinstance(model, DDP) and not boundary else nullcontext()
+        with sync:
+            with autocast_ctx(device, amp, amp_dtype):
+                logits = model(xb)
+            loss = criterion(logits.float(), yb)
+            prof.split("forward")
+            if scaler is not None:
+                scaler.scale(loss / group).backward()
+            else:
+                (loss / group).backward()
+        prof.split("backward")  # inclut l'all-reduce DDP
+
+        if boundary:
+            if scaler is not None:
+                scaler.step(optim)
+                scaler.update()
+            else:
+                optim.step()
+            optim.zero_grad(set_to_none=True)
 
         total += loss.item() * xb.size(0)
-    avg = total / len(loader.dataset)
-    logger.info(f"train_loss={avg:.4f}")
-    return avg
+        n += xb.size(0)
+        prof.split("optim")
+        prof.end_step(xb.size(0))
+        trace.step()
+    elapsed = time.perf_counter() - t0
+    total, n = ddp.all_reduce_sum(total, n)  # moyenne sur tous les ranks
+    avg = total / max(n, 1)
+    img_s = n / max(elapsed, 1e-9)
+    if ddp.is_main():
+        logger.info(f"train_loss={avg:.4f}  ({img_s:.1f} img/s)  [{prof.summary()}]")
+    return avg, img_s
 
 @torch.no_grad()
-def validate(model, loader, device, logger):
+def validate(model, loader, device, logger, amp=False, amp_dtype="bfloat16", channels_last=False, prof=None):
     model.eval()
-    ys, ps = [], []
-    for xb, yb in tqdm(loader, desc="Val", leave=False):
-        xb = xb.to(device)
-        logits = model(xb)
-        prob = torch.sigmoid(logits).squeeze(1).cpu().numpy().tolist()
-        ys.extend(yb.numpy().tolist())
-        ps.extend(prob)
+    prof = prof or StepProfiler("val", log_every=0, device=device)
+    fmt = torch.channels_last if channels_last else torch.contiguous_format
+    # buffers préalloués remplis en place : pas de sync hôte ni de listes Python par batch
+    n_local = len(loader.sampler)
+    ps = torch.empty(n_local, dtype=torch.float32, device=device)
+    ys = torch.empty(n_local, dtype=torch.int64)
+    i = 0
+    prof.start()
+    for xb, yb in tqdm(loader, desc="Val", leave=False, disable=not ddp.is_main()):
+        prof.split("data")
+        xb = xb.to(device, memory_format=fmt)
+        prof.split("h2d")
+        b = xb.size(0)
+        with autocast_ctx(device, amp, amp_dtype):
+            logits = model(xb)
+        torch.sigmoid(logits.float().squeeze(1), out=ps[i:i + b])
+        ys[i:i + b] = yb
+        i += b
+        prof.split("forward")
+        prof.end_step(b)
+    # DDP : chaque rank a prédit 1/world du split -> AUC calculée sur le split complet
+    n = len(loader.dataset)
+    ys = ddp.all_gather_ordered(ys[:i], n).numpy()
+    ps = ddp.all_gather_ordered(ps[:i].cpu(), n).numpy()
     metrics = binary_metrics(ys, ps, thresh=0.5)
-    logger.info(f"val_auc={metrics['auc']:.4f}  acc={metrics['accuracy']:.4f}  "
-                f"prec={metrics['precision']:.4f}  rec={metrics['recall']:.4f}  f1={metrics['f1']:.4f}")
+    if ddp.is_main():
+        logger.info(f"val_auc={metrics['auc']:.4f}  acc={metrics['accuracy']:.4f}  "
+                    f"prec={metrics['precision']:.4f}  rec={metrics['recall']:.4f}  f1={metrics['f1']:.4f}  "
+                    f"[{prof.summary()}]")
     return metrics
 
-def run_train(cfg, logger, overrides=None):
+def run_train(cfg, logger, overrides=None, epoch_callback=None, best_path=None, run_name=None, mlflow_tags=None,
+              resume=False, last_path=None, threads_per_proc=None):
+    """
+    Entraîne trcfg["model_name"] et renvoie la meilleure val AUC.
+    epoch_callback(epoch, val_metrics) -> bool : appelé après chaque validation, False = arrêter le run
+    (élagage par src.search) ; best_path / run_name / mlflow_tags : checkpoint, nom et tags MLflow
+    (ex: mlflow.parentRunId pour un run imbriqué) dédiés.
+    Toutes les `checkpoint_every` époques, état complet (modèle, AdamW, époque, RNG, early stopping,
+    run MLflow) écrit en arrière-plan dans last_path ; resume=True repart de ce checkpoint.
+    threads_per_proc : threads torch de chaque rank DDP (défaut : cœurs disponibles / world).
+    """
     # --- merge overrides ---
     if overrides:
         for k,v in overrides.items():
@@ -56,22 +141,43 @@ def run_train(cfg, logger, overrides=None):
     paths = cfg["paths"]
     trcfg = cfg["train"]
 
+    # --- DDP (torchrun ou spawner intégré) : gloo, CPU ---
+    distributed = ddp.init_distributed(trcfg.get("dist_backend", "gloo"), threads_per_proc)
+    main_proc = ddp.is_main()
+
     # --- device & seed ---
     set_seed(1337)
-    device = torch.device(trcfg["device"] if torch.cuda.is_available() else "cpu")
-    if device.type == "cpu":
-        logger.info("No CUDA detected -> using CPU")
+    device = torch.device(trcfg["device"] if torch.cuda.is_available() and not distributed else "cpu")
+    if device.type == "cpu" and main_proc:
+        logger.info("No CUDA detected -> using CPU" if not distributed else
+                    f"DDP gloo: {ddp.world_size()} process x {torch.get_num_threads()} threads (CPU)")
 
     # --- data loaders ---
     # Windows: si multiprocess bug, num_workers=0
     workers = trcfg["num_workers"]
     if platform.system().lower().startswith("win") and workers > 0:
         workers = min(workers, 0)  # force 0 si souci, ajuste si ok chez toi
-    train_loader, val_loader = get_loaders(
+    amp = bool(trcfg.get("amp", False))
+    amp_dtype = trcfg.get("amp_dtype", "bfloat16")
+    channels_last = bool(trcfg.get("channels_last", False))
+    accum_steps = max(1, int(trcfg.get("accum_steps", 1)))
+
+    if trcfg.get("data_format", "files") == "shards":
+        load = get_shard_loaders
+    else:
+        from src.data.dataset import get_loaders  # importé ici : src.train reste importable sans le module
+        load = get_loaders
+    kwargs = ({"shards_dir": paths["shards_dir"], "channels_last": channels_last}
+              if load is get_shard_loaders else {})
+    train_loader, val_loader = load(
         batch_size=trcfg["batch_size"],
         img_size=trcfg["img_size"],
-        num_workers=workers
+        num_workers=workers,
+        **kwargs
     )
+    if distributed:
+        train_loader = ddp.distribute_loader(train_loader, shuffle=True)
+        val_loader = ddp.distribute_loader(val_loader, shuffle=False)
 
     # --- model ---
     model = build_model(
@@ -80,54 +186,166 @@ def run_train(cfg, logger, overrides=None):
         pretrained=trcfg["pretrained"],
         dropout=0.2
     ).to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if distributed:
+        model = DDP(model)  # all-reduce des gradients entre ranks
+    raw_model = model.module if distributed else model
 
     # --- optim & loss ---
     optim = AdamW(model.parameters(), lr=trcfg["lr"], weight_decay=trcfg["weight_decay"])
     criterion = nn.BCEWithLogitsLoss()
+    # GradScaler seulement pour fp16 CUDA ; bf16 a la plage dynamique de fp32
+    scaler = (torch.amp.GradScaler("cuda")
+              if amp and amp_dtype == "float16" and device.type == "cuda" else None)
 
-    # --- mlflow tracking ---
-    os.makedirs(paths["mlruns_dir"], exist_ok=True)
-    mlflow.set_tracking_uri(paths["mlruns_dir"])
-    mlflow.set_experiment("cancer-detection-ai")
+    # --- mlflow tracking (rank 0 uniquement) ---
+    if main_proc:
+        os.makedirs(paths["mlruns_dir"], exist_ok=True)
+        mlflow.set_tracking_uri(paths["mlruns_dir"])
+        mlflow.set_experiment("cancer-detection-ai")
 
     best_auc = -1.0
-    best_path = f"checkpoints/best_{trcfg['model_name']}.pt"
-    os.makedirs("checkpoints", exist_ok=True)
+    last_path = last_path or (f"{os.path.splitext(best_path)[0]}_last.pt" if best_path
+                              else f"checkpoints/last_{trcfg['model_name']}.pt")
+    best_path = best_path or f"checkpoints/best_{trcfg['model_name']}.pt"
+    os.makedirs(os.path.dirname(best_path) or ".", exist_ok=True)
 
     patience = int(trcfg.get("early_stopping", 0))
     bad_epochs = 0
 
-    with mlflow.start_run(run_name=trcfg["model_name"]):
+    # --- instrumentation : timers par phase (MLflow tous les N steps) + trace torch.profiler ---
+    log_every = int(trcfg.get("profile_log_every", 50))
+    train_prof = StepProfiler("train", log_every, device, log_mlflow=main_proc)
+    val_prof = StepProfiler("val", log_every, device, log_mlflow=main_proc)
+    trace_steps = trcfg.get("profile_trace_steps", [5, 2, 5])
+
+    # --- reprise : tous les ranks relisent le même checkpoint complet ---
+    ckpt_every = int(trcfg.get("checkpoint_every", 1))
+    start_epoch, run_id = 1, None
+    if resume and os.path.exists(last_path):
+        state = load_checkpoint(last_path)
+        raw_model.load_state_dict(state["model"])
+        optim.load_state_dict(state["optim"])
+        if scaler is not None and state.get("scaler"):
+            scaler.load_state_dict(state["scaler"])
+        best_auc, bad_epochs = state["best_auc"], state["bad_epochs"]
+        start_epoch = trcfg["epochs"] + 1 if state.get("stopped") else state["epoch"] + 1
+        train_prof.global_step, val_prof.global_step = state.get("profile_steps", (0, 0))
+        run_id = state.get("mlflow_run_id")
+        set_rng_state(state["rng"])  # en dernier : rien ne consomme d'aléa avant la boucle
+        if main_proc:
+            logger.info(f"Reprise depuis {last_path} : époque {state['epoch']} faite, best AUC {best_auc:.4f}")
+    elif resume and main_proc:
+        logger.warning(f"--resume : pas de checkpoint {last_path}, démarrage à zéro")
+    checkpointer = AsyncCheckpointer(last_path) if main_proc and ckpt_every > 0 else None
+
+    if not main_proc:
+        run_ctx = nullcontext()
+    elif run_id:
+        run_ctx = mlflow.start_run(run_id=run_id)  # même run MLflow : courbes continues
+    else:
+        run_ctx = mlflow.start_run(run_name=run_name or trcfg["model_name"], tags=mlflow_tags)
+    with run_ctx as run:
         # log params
-        for k,v in trcfg.items(): mlflow.log_param(k, v)
-
-        for epoch in range(1, trcfg["epochs"]+1):
-            logger.info(f"Epoch {epoch}/{trcfg['epochs']}")
-            train_loss = train_one_epoch(model, train_loader, device, optim, criterion, logger)
-            val_metrics = validate(model, val_loader, device, logger)
-
-            # log metrics
-            mlflow.log_metric("train_loss", train_loss, step=epoch)
-            for mk, mv in val_metrics.items():
-                mlflow.log_metric(f"val_{mk}", mv, step=epoch)
-
-            # save best
-            if val_metrics["auc"] > best_auc:
-                best_auc = val_metrics["auc"]
-                torch.save(model.state_dict(), best_path)
-                mlflow.log_artifact(best_path)
-                logger.info(f"→ new best AUC {best_auc:.4f}, saved {best_path}")
-                bad_epochs = 0
-            else:
-                bad_epochs += 1
+        if main_proc and run_id:
+            mlflow.set_tag("resumed_at_epoch", start_epoch)
+        elif main_proc:
+            for k,v in trcfg.items(): mlflow.log_param(k, v)
+            mlflow.log_param("world_size", ddp.world_size())
+            mlflow.log_param("effective_batch_size", trcfg["batch_size"] * accum_steps * ddp.world_size())
 
-            # early stopping
-            if patience > 0 and bad_epochs >= patience:
-                logger.info(f"Early stopping after {epoch} epochs (no improvement)")
-                break
+        try:
+            for epoch in range(start_epoch, trcfg["epochs"]+1):
+                if main_proc:
+                    logger.info(f"Epoch {epoch}/{trcfg['epochs']}")
+                if distributed:
+                    train_loader.sampler.set_epoch(epoch)  # shuffle différent à chaque époque
+                # trace Chrome sur la 1re époque seulement (rank 0)
+                with trace_window(main_proc and epoch == 1 and bool(trcfg.get("profile_trace", False)), trace_steps,
+                                  name=trcfg["model_name"], device=device) as trace:
+                    train_loss, train_img_s = train_one_epoch(model, train_loader, device, optim, criterion, logger,
+                                                              amp, amp_dtype, channels_last, accum_steps, scaler,
+                                                              train_prof, trace)
+                # métriques identiques sur tous les ranks (all-gather) -> early stopping cohérent
+                val_metrics = validate(model, val_loader, device, logger, amp, amp_dtype, channels_last, val_prof)
+
+                # log metrics
+                if main_proc:
+                    mlflow.log_metric("train_loss", train_loss, step=epoch)
+                    mlflow.log_metric("train_img_s", train_img_s, step=epoch)
+                    for mk, mv in val_metrics.items():
+                        mlflow.log_metric(f"val_{mk}", mv, step=epoch)
+
+                # save best
+                if val_metrics["auc"] > best_auc:
+                    best_auc = val_metrics["auc"]
+                    if main_proc:
+                        save_atomic(raw_model.state_dict(), best_path)  # l'API peut le recharger à chaud
+                        mlflow.log_artifact(best_path)
+                        logger.info(f"→ new best AUC {best_auc:.4f}, saved {best_path}")
+                    bad_epochs = 0
+                else:
+                    bad_epochs += 1
+
+                stop = False
+                # arrêt demandé de l'extérieur (ex: trial élagué par ASHA)
+                if epoch_callback is not None and not epoch_callback(epoch, val_metrics):
+                    if main_proc:
+                        logger.info(f"Run arrêté après {epoch} époques (epoch_callback)")
+                        mlflow.set_tag("stopped_by_callback", epoch)
+                    stop = True
+                # early stopping
+                elif patience > 0 and bad_epochs >= patience:
+                    if main_proc:
+                        logger.info(f"Early stopping after {epoch} epochs (no improvement)")
+                    stop = True
+
+                # checkpoint complet (thread de fond) : seule la copie CPU bloque la boucle
+                if checkpointer is not None and (epoch % ckpt_every == 0 or stop or epoch == trcfg["epochs"]):
+                    checkpointer.save({
+                        "epoch": epoch,
+                        "model": raw_model.state_dict(),
+                        "optim": optim.state_dict(),
+                        "scaler": scaler.state_dict() if scaler is not None else None,
+                        "best_auc": best_auc,
+                        "bad_epochs": bad_epochs,
+                        "stopped": stop,
+                        "rng": get_rng_state(),
+                        "profile_steps": (train_prof.global_step, val_prof.global_step),
+                        "mlflow_run_id": run.info.run_id,
+                        "config": dict(trcfg),
+                    })
+                if stop:
+                    break
+        finally:
+            if checkpointer is not None:
+                checkpointer.close()  # dernier checkpoint écrit, y compris sur Ctrl+C
+
+        if main_proc:
+            logger.info(f"Best AUC: {best_auc:.4f}")
+            mlflow.log_metric("best_val_auc", best_auc)
+    ddp.cleanup()
+    return best_auc
+
+
+def _write_result(path, model_name, best_auc, t0):
+    """Résultat machine-lisible d'un run (lu par le scheduler de train_many)."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "best_auc": best_auc, "wall_s": time.perf_counter() - t0}, f)
+
+
+def _ddp_worker(overrides, result_json=None, resume=False, threads_per_proc=None):
+    """Point d'entrée d'un process du spawner intégré (--nproc N)."""
+    t0 = time.perf_counter()
+    cfg = load_all_configs()
+    best_auc = run_train(cfg, setup_logging(), overrides, resume=resume, threads_per_proc=threads_per_proc)
+    if result_json and ddp.dist_env()[0] == 0:
+        _write_result(result_json, cfg["train"]["model_name"], best_auc, t0)
 
-        logger.info(f"Best AUC: {best_auc:.4f}")
-        mlflow.log_metric("best_val_auc", best_auc)
 
 def main():
     # CLI minimal si tu veux lancer sans menu
@@ -138,10 +356,26 @@ def main():
     parser.add_argument("--batch-size", type=int, default=None)
     parser.add_argument("--lr", type=float, default=None)
     parser.add_argument("--pretrained", action="store_true")
+    parser.add_argument("--data-format", choices=["files", "shards"], default=None)
+    parser.add_argument("--amp", action="store_true", help="Autocast bf16 (CPU) / amp_dtype de la config")
+    parser.add_argument("--channels-last", action="store_true", help="Modèle + entrées en channels_last")
+    parser.add_argument("--accum-steps", type=int, default=None, help="Micro-batchs accumulés par optim.step()")
+    parser.add_argument("--profile", action="store_true",
+                        help="Trace torch.profiler (profile_trace_steps) en artefact MLflow")
+    parser.add_argument("--nproc", type=int, default=None,
+                        help="DDP CPU (gloo) sur N process locaux ; inutile sous torchrun")
+    parser.add_argument("--device", default=None, help="cuda|cpu (sinon config)")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads (budget CPU du run)")
+    parser.add_argument("--result-json", default=None, help="Écrit {model, best_auc, wall_s} en fin de run")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reprend depuis checkpoints/last_<model>.pt (modèle, optim, RNG, run MLflow)")
     args = parser.parse_args()
 
+    t0 = time.perf_counter()
     logger = setup_logging()
     cfg = load_all_configs()
+    if args.threads:
+        torch.set_num_threads(args.threads)
 
     overrides = {}
     if args.model is not None:      overrides["model_name"] = args.model
@@ -150,8 +384,26 @@ def main():
     if args.batch_size is not None: overrides["batch_size"] = args.batch_size
     if args.lr is not None:         overrides["lr"] = args.lr
     if args.pretrained:             overrides["pretrained"] = True
+    if args.data_format is not None: overrides["data_format"] = args.data_format
+    if args.amp:                    overrides["amp"] = True
+    if args.channels_last:          overrides["channels_last"] = True
+    if args.accum_steps is not None: overrides["accum_steps"] = args.accum_steps
+    if args.profile:                overrides["profile_trace"] = True
+    if args.device is not None:     overrides["device"] = args.device
 
-    run_train(cfg, logger, overrides)
+    nproc = args.nproc if args.nproc is not None else int(cfg["train"].get("nproc", 1))
+    spawn = nproc > 1 and ddp.dist_env()[1] == 1
+    # --threads = budget du run entier (cf. train_many), partagé entre ses ranks DDP
+    world = nproc if spawn else ddp.dist_env()[1]
+    threads_per_proc = max(1, args.threads // world) if args.threads else None
+    if spawn:
+        logger.info(f"DDP: lancement de {nproc} process (gloo)"
+                    + (f", {threads_per_proc} thread(s) chacun" if threads_per_proc else ""))
+        ddp.spawn(_ddp_worker, nproc, overrides, args.result_json, args.resume, threads_per_proc)
+    else:
+        best_auc = run_train(cfg, logger, overrides, resume=args.resume, threads_per_proc=threads_per_proc)
+        if args.result_json:
+            _write_result(args.result_json, cfg["train"]["model_name"], best_auc, t0)
 
 if __name__ == "__main__":
     main()
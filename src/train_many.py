@@ -1,11 +1,116 @@
 # src/train_many.py
+# ------------------------------------------------------------
+# Entraînement de plusieurs modèles, en parallèle :
+# - chaque modèle = un sous-process `python -m src.train` (échec isolé, run MLflow propre)
+# - au plus --jobs runs simultanés, budget CPU par run (--threads, OMP/MKL, affinité Linux)
+# - logs par modèle dans logs/train_many/<model>.log
+# - tableau récapitulatif final : statut, best AUC, temps mur
+#   (+ coût de service CPU img/s et cold start si --cost-json, cf. src.benchmarks.models)
+# ------------------------------------------------------------
+
 import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+
 from src.utils.logger import setup_logging
 from src.utils.config import load_all_configs
-from src.train import run_train
+from src.benchmarks.models import serving_cost
 
 ALL = ["resnet18","resnet50","vgg16","efficientnet_b0","densenet121","ibracancermodel"]
 
+
+def build_cmd(model, args, threads, result_json):
+    cmd = [sys.executable, "-m", "src.train", "--model", model,
+           "--threads", str(threads), "--result-json", result_json]
+    if args.epochs is not None:     cmd += ["--epochs", str(args.epochs)]
+    if args.batch_size is not None: cmd += ["--batch-size", str(args.batch_size)]
+    if args.img_size is not None:   cmd += ["--img-size", str(args.img_size)]
+    if args.lr is not None:         cmd += ["--lr", str(args.lr)]
+    if args.pretrained:             cmd += ["--pretrained"]
+    if args.device is not None:     cmd += ["--device", args.device]  # pris en compte par run_train
+    return cmd
+
+
+def _cores(slot, threads, cpu):
+    return {(slot * threads + k) % cpu for k in range(threads)}
+
+
+def run_jobs(models, args, log, log_dir="logs/train_many"):
+    """Lance les runs en sous-process (au plus args.jobs à la fois) ; renvoie un résultat par modèle."""
+    cpu = os.cpu_count() or 1
+    jobs = max(1, min(args.jobs, len(models)))
+    threads = args.threads or max(1, cpu // jobs)
+    if jobs * threads > cpu:
+        # sinon les plages de cœurs épinglées (_cores) se recouvrent entre runs
+        clamped = max(1, cpu // jobs)
+        log.warning(f"{jobs} runs x {threads} threads > {cpu} cœurs : {clamped} thread(s) par run"
+                    + (" (cœurs partagés entre runs)" if jobs > cpu else ""))
+        threads = clamped
+    os.makedirs(log_dir, exist_ok=True)
+    log.info(f"Scheduler: {len(models)} modèles, {jobs} runs simultanés x {threads} threads ({cpu} cœurs)")
+
+    queue, free_slots = deque(models), list(range(jobs))
+    running, results = {}, {}
+    while queue or running:
+        while queue and free_slots:
+            m, slot = queue.popleft(), free_slots.pop(0)
+            result_json = os.path.join(log_dir, f"{m}.result.json")
+            if os.path.exists(result_json):
+                os.remove(result_json)
+            env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads))
+            preexec = None
+            if args.affinity and hasattr(os, "sched_setaffinity"):
+                cores = _cores(slot, threads, cpu)
+                preexec = lambda cores=cores: os.sched_setaffinity(0, cores)  # noqa: E731
+            logf = open(os.path.join(log_dir, f"{m}.log"), "w", encoding="utf-8")
+            proc = subprocess.Popen(build_cmd(m, args, threads, result_json), stdout=logf,
+                                    stderr=subprocess.STDOUT, env=env, preexec_fn=preexec)
+            running[proc] = (m, slot, time.perf_counter(), logf, result_json)
+            log.info(f"=== TRAIN {m} === (slot {slot}, pid {proc.pid}, log {logf.name})")
+
+        time.sleep(0.5)
+        for proc in [p for p in running if p.poll() is not None]:
+            m, slot, t0, logf, result_json = running.pop(proc)
+            logf.close()
+            free_slots.append(slot)
+            res = {"model": m, "status": "ok" if proc.returncode == 0 else f"failed ({proc.returncode})",
+                   "best_auc": None, "wall_s": time.perf_counter() - t0, "log": logf.name}
+            if proc.returncode == 0 and os.path.exists(result_json):
+                with open(result_json, "r", encoding="utf-8") as f:
+                    res["best_auc"] = json.load(f).get("best_auc")
+            if proc.returncode != 0:
+                log.error(f"Echec sur {m} (code {proc.returncode}, voir {logf.name}) — je continue avec les autres")
+            else:
+                log.info(f"{m} terminé en {res['wall_s']:.0f}s (best AUC {res['best_auc']})")
+            results[m] = res
+    return [results[m] for m in models]
+
+
+def add_serving_cost(results, report: dict, img_size: int | None = None):
+    """Ajoute à chaque résultat le coût de service mesuré par src.benchmarks.models (None si absent)."""
+    for r in results:
+        r["serving"] = serving_cost(report, r["model"], img_size)
+    return results
+
+
+def summary_table(results) -> str:
+    cost = any("serving" in r for r in results)
+    header = f"{'model':<18} {'status':<12} {'best_auc':>8} {'wall':>8}"
+    lines = [header + (f" {'img/s':>9} {'cold':>7}" if cost else "")]
+    for r in results:
+        auc = f"{r['best_auc']:.4f}" if r["best_auc"] is not None else "-"
+        line = f"{r['model']:<18} {r['status']:<12} {auc:>8} {r['wall_s']:>7.0f}s"
+        if cost:
+            s = r.get("serving")
+            line += f" {s['img_s']:>9.1f} {s['cold_start_s']:>6.2f}s" if s else f" {'-':>9} {'-':>7}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--models", default="resnet18",
@@ -16,27 +121,31 @@ def main():
     p.add_argument("--lr", type=float, default=None)
     p.add_argument("--pretrained", action="store_true")
     p.add_argument("--device", default=None)  # cuda|cpu (optionnel, sinon prend la config)
+    p.add_argument("--jobs", type=int, default=1, help="Nb de runs simultanés")
+    p.add_argument("--threads", type=int, default=None, help="Threads torch par run (défaut: cœurs / jobs)")
+    p.add_argument("--no-affinity", dest="affinity", action="store_false",
+                   help="Ne pas épingler chaque run sur ses cœurs (Linux)")
+    p.add_argument("--summary-json", default=None, help="Récapitulatif JSON (ex: reports/train_many.json)")
+    p.add_argument("--cost-json", default=None,
+                   help="Rapport de src.benchmarks.models : ajoute img/s CPU et cold start au récapitulatif")
     args = p.parse_args()
 
     log = setup_logging()
-    cfg = load_all_configs()
+    cfg = load_all_configs()  # échoue tôt si la config est invalide
 
     models = ALL if args.models.lower()=="all" else [m.strip() for m in args.models.split(",")]
+    results = run_jobs(models, args, log)
+    if args.cost_json:
+        with open(args.cost_json, "r", encoding="utf-8") as f:
+            add_serving_cost(results, json.load(f), args.img_size or cfg["train"]["img_size"])
 
-    for m in models:
-        log.info(f"=== TRAIN {m} ===")
-        overrides = {"model_name": m}
-        if args.epochs is not None:     overrides["epochs"] = args.epochs
-        if args.batch_size is not None: overrides["batch_size"] = args.batch_size
-        if args.img_size is not None:   overrides["img_size"] = args.img_size
-        if args.lr is not None:         overrides["lr"] = args.lr
-        if args.pretrained:             overrides["pretrained"] = True
-        if args.device is not None:     overrides["device"] = args.device  # pris en compte par run_train
-
-        try:
-            run_train(cfg, log, overrides)
-        except Exception as e:
-            log.exception(f"Echec sur {m}: {e} (je continue avec le modèle suivant)")
+    log.info("Récapitulatif :\n" + summary_table(results))
+    if args.summary_json:
+        out_dir = os.path.dirname(args.summary_json)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
 
 if __name__ == "__main__":
     main()
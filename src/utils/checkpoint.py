@@ -0,0 +1,87 @@
+# src/utils/checkpoint.py
+# ------------------------------------------------------------
+# - file_digest     : empreinte d'un checkpoint (namespace du cache API)
+# - snapshot        : copie CPU détachée d'un état (state_dicts modèle / optim ...)
+# - AsyncCheckpointer : écriture en thread de fond, atomique (fichier .tmp + os.replace)
+# - load_checkpoint : relecture d'un checkpoint complet (reprise de run_train)
+# ------------------------------------------------------------
+import hashlib
+import os
+import threading
+
+import torch
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 d'un fichier (checkpoint) lu par blocs."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def snapshot(obj):
+    """
+    Copie profonde où chaque tenseur est cloné sur CPU : l'état capturé ne bouge plus
+    quand l'entraînement continue (optim.step() modifie exp_avg / exp_avg_sq en place).
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+
+def save_atomic(state, path):
+    """torch.save dans <path>.tmp puis os.replace : le fichier est soit l'ancien, soit le nouveau complet."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class AsyncCheckpointer:
+    """
+    Sauvegardes en arrière-plan : save() copie l'état sur CPU (seule partie bloquante),
+    puis la sérialisation + écriture disque se font dans un thread.
+    Une seule écriture en vol : un save() attend la précédente (ordre des checkpoints garanti).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._thread = None
+        self._error = None
+
+    def save(self, state: dict):
+        self.wait()
+        state = snapshot(state)
+        self._thread = threading.Thread(target=self._write, args=(state,), daemon=True)
+        self._thread.start()
+
+    def _write(self, state):
+        try:
+            save_atomic(state, self.path)
+        except Exception as e:  # remonté au prochain wait() (thread de fond)
+            self._error = e
+
+    def wait(self):
+        """Attend l'écriture en cours ; relance l'erreur éventuelle du thread."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def close(self):
+        self.wait()
+
+
+def load_checkpoint(path, map_location="cpu") -> dict:
+    # états RNG numpy / python : pas uniquement des tenseurs -> weights_only=False (fichier local de confiance)
+    return torch.load(path, map_location=map_location, weights_only=False)
@@ -46,4 +46,5 @@ def load_all_configs():
     train   = load_yaml("configs/train.yaml")
     metrics = load_yaml("configs/metrics.yaml")
     models  = load_yaml("configs/models.yaml")
-    return {"paths": paths, "train": train, "metrics": metrics, "models": models}
+    api     = load_yaml("configs/api.yaml")
+    return {"paths": paths, "train": train, "metrics": metrics, "models": models, "api": api}
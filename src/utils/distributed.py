@@ -0,0 +1,110 @@
+# src/utils/distributed.py
+# ------------------------------------------------------------
+# Data-parallel CPU (DistributedDataParallel, backend gloo) :
+# - détection torchrun (RANK / WORLD_SIZE / LOCAL_RANK) ou spawner intégré (spawn)
+# - loaders redistribués via DistributedSampler (mêmes datasets / collate que get_loaders)
+# - all_gather des prédictions de validation dans l'ordre du dataset
+# ------------------------------------------------------------
+
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader, DistributedSampler
+
+
+def dist_env():
+    """(rank, world_size, local_rank) d'après l'environnement torchrun ; (0, 1, 0) sinon."""
+    return (int(os.environ.get("RANK", 0)), int(os.environ.get("WORLD_SIZE", 1)),
+            int(os.environ.get("LOCAL_RANK", 0)))
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main() -> bool:
+    return rank() == 0
+
+
+def available_cores() -> int:
+    """Cœurs utilisables par ce process (affinité CPU comprise, ex: runs épinglés par train_many)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def init_distributed(backend: str = "gloo", threads_per_proc: int | None = None) -> bool:
+    """Initialise le process group si WORLD_SIZE > 1 ; répartit les cœurs disponibles entre les process."""
+    _, world, _ = dist_env()
+    if world <= 1 or is_distributed():
+        return is_distributed()
+    dist.init_process_group(backend=backend)
+    torch.set_num_threads(threads_per_proc or max(1, available_cores() // world))
+    return True
+
+
+def cleanup():
+    if is_distributed():
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _entry(local_rank, world, fn, args):
+    os.environ.update({"RANK": str(local_rank), "LOCAL_RANK": str(local_rank), "WORLD_SIZE": str(world)})
+    fn(*args)
+
+
+def spawn(fn, nprocs: int, *args):
+    """Équivalent mono-machine de `torchrun --nproc-per-node N` : fn(*args) dans N process."""
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", str(_free_port()))
+    mp.spawn(_entry, args=(nprocs, fn, args), nprocs=nprocs, join=True)
+
+
+def distribute_loader(loader: DataLoader, shuffle: bool, seed: int = 1337) -> DataLoader:
+    """Reconstruit un DataLoader avec un DistributedSampler : chaque rank voit 1/world du split."""
+    sampler = DistributedSampler(loader.dataset, num_replicas=world_size(), rank=rank(),
+                                 shuffle=shuffle, seed=seed, drop_last=False)
+    kwargs = dict(batch_size=loader.batch_size, sampler=sampler, num_workers=loader.num_workers,
+                  collate_fn=loader.collate_fn, pin_memory=loader.pin_memory, drop_last=loader.drop_last)
+    if loader.num_workers > 0:
+        kwargs.update(dict(persistent_workers=loader.persistent_workers, prefetch_factor=loader.prefetch_factor))
+    return DataLoader(loader.dataset, **kwargs)
+
+
+def all_gather_ordered(t: torch.Tensor, n: int) -> torch.Tensor:
+    """
+    Rassemble un tenseur 1-D produit par chaque rank avec un DistributedSampler(shuffle=False) :
+    le rank r a vu les indices r, r+W, r+2W... (complétés par répétition) -> on entrelace
+    et on tronque aux n échantillons réels, dans l'ordre du dataset.
+    """
+    if not is_distributed():
+        return t[:n]
+    parts = [torch.empty_like(t) for _ in range(world_size())]
+    dist.all_gather(parts, t.contiguous())
+    return torch.stack(parts, dim=1).reshape(-1)[:n]
+
+
+def all_reduce_sum(*values: float) -> list:
+    if not is_distributed():
+        return list(values)
+    t = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
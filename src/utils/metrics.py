@@ -1,18 +1,165 @@
 # src/utils/metrics.py
+# Métriques binaires en une passe numpy vectorisée (remplace sklearn, qui revalide
+# ses entrées à chaque appel) : AUC par les rangs (Mann-Whitney, ex-aequo moyennés)
+# + comptes de la matrice de confusion au seuil donné.
+# StreamingBinaryMetrics : même chose en mémoire constante (update / merge / compute).
 import numpy as np
-from sklearn.metrics import roc_auc_score, precision_recall_fscore_support, accuracy_score
+
+
+def roc_auc(y_true, y_prob) -> float:
+    """AUC ROC exacte, ex-aequo gérés par rangs moyens ; 0.5 si une seule classe présente."""
+    y_true = np.asarray(y_true).astype(bool, copy=False).ravel()
+    y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+    n_pos = int(y_true.sum())
+    n_neg = y_true.size - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return 0.5
+
+    order = np.argsort(y_prob, kind="mergesort")
+    p = y_prob[order]
+    # bornes des groupes d'ex-aequo dans le tableau trié -> rang moyen (1-based) par groupe
+    starts = np.flatnonzero(np.r_[True, p[1:] != p[:-1]])
+    ends = np.r_[starts[1:], p.size]
+    group_rank = (starts + ends + 1) / 2.0
+    ranks = np.repeat(group_rank, ends - starts)
+    rank_pos = ranks[y_true[order]].sum()
+    return float((rank_pos - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
 
 def binary_metrics(y_true, y_prob, thresh=0.5):
-    y_true = np.asarray(y_true).astype(int)
-    y_prob = np.asarray(y_prob).astype(float)
-    y_pred = (y_prob >= thresh).astype(int)
-
-    # AUC (protégé si labels tous identiques)
-    try:
-        auc = float(roc_auc_score(y_true, y_prob))
-    except Exception:
-        auc = 0.5
-
-    acc = float(accuracy_score(y_true, y_pred))
-    p, r, f1, _ = precision_recall_fscore_support(y_true, y_pred, average="binary", zero_division=0)
-    return {"auc": auc, "accuracy": acc, "precision": float(p), "recall": float(r), "f1": float(f1)}
+    y_true = np.asarray(y_true).astype(bool, copy=False).ravel()
+    y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+    y_pred = y_prob >= thresh
+
+    tp = int(np.count_nonzero(y_pred & y_true))
+    fp = int(np.count_nonzero(y_pred)) - tp
+    fn = int(np.count_nonzero(y_true)) - tp
+    tn = y_true.size - tp - fp - fn
+    return {"auc": roc_auc(y_true, y_prob), **_from_counts(tp, fp, fn, tn)}
+
+
+def _from_counts(tp, fp, fn, tn) -> dict:
+    # zero_division=0 comme sklearn
+    n = tp + fp + fn + tn
+    acc = (tp + tn) / n if n else 0.0
+    p = tp / (tp + fp) if tp + fp else 0.0
+    r = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+    return {"accuracy": float(acc), "precision": float(p), "recall": float(r), "f1": float(f1)}
+
+
+class StreamingBinaryMetrics:
+    """
+    Accumulateur incrémental en mémoire constante (O(bins + nb de seuils)) :
+    - comptes de confusion exacts à chaque seuil de `thresholds` (même règle p >= seuil que binary_metrics)
+    - histogrammes à `bins` classes des probas positives / négatives -> AUC approchée
+    Mergeable (process, shards) : il suffit d'additionner les compteurs (merge / state_dict).
+
+    Tolérance : accuracy / precision / recall / f1 sont exacts. L'AUC ne diffère de l'AUC exacte que
+    par les paires (positif, négatif) tombant dans la même classe, comptées comme ex-aequo :
+    |auc - auc_exacte| <= auc_err_bound = 0.5 * sum_b pos_b * neg_b / (n_pos * n_neg),
+    borne renvoyée par compute() (typiquement < 1e-3 avec 1024 classes).
+    """
+    def __init__(self, thresholds=(0.5,), bins: int = 1024):
+        self.thresholds = np.asarray(sorted(thresholds), dtype=np.float64)
+        self.bins = int(bins)
+        self.pos_hist = np.zeros(self.bins, dtype=np.int64)
+        self.neg_hist = np.zeros(self.bins, dtype=np.int64)
+        self.tp = np.zeros(self.thresholds.size, dtype=np.int64)
+        self.fp = np.zeros(self.thresholds.size, dtype=np.int64)
+
+    def update(self, y_true, y_prob):
+        """Ajoute un batch (numpy, listes ou tenseurs CPU)."""
+        y_true = np.asarray(y_true).astype(bool, copy=False).ravel()
+        y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+        idx = np.clip((y_prob * self.bins).astype(np.int64), 0, self.bins - 1)
+        self.pos_hist += np.bincount(idx[y_true], minlength=self.bins)
+        self.neg_hist += np.bincount(idx[~y_true], minlength=self.bins)
+        pred = y_prob[:, None] >= self.thresholds[None, :]  # [B, nb seuils]
+        self.tp += np.count_nonzero(pred & y_true[:, None], axis=0)
+        self.fp += np.count_nonzero(pred & ~y_true[:, None], axis=0)
+        return self
+
+    def merge(self, other: "StreamingBinaryMetrics"):
+        if self.bins != other.bins or not np.array_equal(self.thresholds, other.thresholds):
+            raise ValueError("StreamingBinaryMetrics incompatibles (bins / thresholds différents)")
+        for k in ("pos_hist", "neg_hist", "tp", "fp"):
+            acc = getattr(self, k)
+            acc += getattr(other, k)
+        return self
+
+    def state_dict(self) -> dict:
+        return {"thresholds": self.thresholds.tolist(), "bins": self.bins,
+                **{k: getattr(self, k).copy() for k in ("pos_hist", "neg_hist", "tp", "fp")}}
+
+    @classmethod
+    def from_state_dict(cls, state: dict) -> "StreamingBinaryMetrics":
+        m = cls(state["thresholds"], state["bins"])
+        for k in ("pos_hist", "neg_hist", "tp", "fp"):
+            getattr(m, k)[:] = state[k]
+        return m
+
+    def auc(self):
+        """(AUC approchée, borne d'erreur) à partir des histogrammes."""
+        n_pos, n_neg = int(self.pos_hist.sum()), int(self.neg_hist.sum())
+        if n_pos == 0 or n_neg == 0:
+            return 0.5, 0.0
+        pos, neg = self.pos_hist.astype(np.float64), self.neg_hist.astype(np.float64)
+        neg_below = np.cumsum(neg) - neg
+        same_bin = float((pos * neg).sum())
+        auc = ((pos * neg_below).sum() + 0.5 * same_bin) / (n_pos * n_neg)
+        return float(auc), 0.5 * same_bin / (n_pos * n_neg)
+
+    def compute(self, thresh: float = 0.5) -> dict:
+        """Mêmes clés que binary_metrics (+ auc_err_bound) ; `thresh` doit faire partie des seuils suivis."""
+        k = np.flatnonzero(np.isclose(self.thresholds, thresh))
+        if k.size == 0:
+            raise ValueError(f"Seuil {thresh} non suivi (thresholds={self.thresholds.tolist()})")
+        k = int(k[0])
+        n_pos, n_neg = int(self.pos_hist.sum()), int(self.neg_hist.sum())
+        tp, fp = int(self.tp[k]), int(self.fp[k])
+        auc, err = self.auc()
+        return {"auc": auc, **_from_counts(tp, fp, n_pos - tp, n_neg - fp), "auc_err_bound": err}
+
+
+def threshold_sweep(y_true, y_prob, target_recall: float | None = None, curve_points: int | None = 200) -> dict:
+    """
+    Balayage de tous les seuils en un seul tri décroissant des scores (règle p >= seuil) :
+    - courbes ROC (fpr, tpr) et PR (recall, precision), sous-échantillonnées à `curve_points`
+    - seuil de meilleur F1, et seuil le plus haut atteignant `target_recall` (point de fonctionnement clinique)
+    """
+    y_true = np.asarray(y_true).astype(bool, copy=False).ravel()
+    y_prob = np.asarray(y_prob, dtype=np.float64).ravel()
+    n_pos = int(y_true.sum())
+    n_neg = y_true.size - n_pos
+
+    order = np.argsort(-y_prob, kind="mergesort")
+    p, y = y_prob[order], y_true[order]
+    # dernier indice de chaque groupe d'ex-aequo : tous les scores >= seuil sont prédits positifs
+    last = np.r_[np.flatnonzero(p[1:] != p[:-1]), p.size - 1]
+    thresholds = p[last]
+    tp = np.cumsum(y)[last].astype(np.float64)
+    fp = (last + 1) - tp
+    recall = tp / n_pos if n_pos else np.zeros_like(tp)
+    fpr = fp / n_neg if n_neg else np.zeros_like(fp)
+    precision = tp / (tp + fp)
+    f1 = 2 * tp / np.maximum(tp + fp + n_pos, 1)
+
+    def _point(k):
+        return {"threshold": float(thresholds[k]), "precision": float(precision[k]), "recall": float(recall[k]),
+                "f1": float(f1[k]), "specificity": float(1.0 - fpr[k])}
+
+    out = {"n_thresholds": int(thresholds.size), "best_f1": _point(int(np.argmax(f1)))}
+    if target_recall is not None:
+        k = np.searchsorted(recall, target_recall, side="left")  # recall croissant quand le seuil baisse
+        out["target_recall"] = {"target": float(target_recall), **_point(int(min(k, recall.size - 1)))}
+
+    keep = np.arange(thresholds.size)
+    if curve_points and thresholds.size > curve_points:
+        keep = np.unique(np.linspace(0, thresholds.size - 1, curve_points).round().astype(int))
+    out["curves"] = {
+        "thresholds": thresholds[keep].tolist(),
+        "roc": {"fpr": [0.0] + fpr[keep].tolist(), "tpr": [0.0] + recall[keep].tolist()},
+        "pr": {"recall": recall[keep].tolist(), "precision": precision[keep].tolist()},
+    }
+    return out
@@ -0,0 +1,142 @@
+# src/utils/profiling.py
+# ------------------------------------------------------------
+# Instrumentation légère des boucles train / val :
+# - PhaseTimer   : chronos "au tour" (data, h2d, forward, backward, optim) sans coût notable
+# - StepProfiler : agrège les timers, samples/s et RSS pic, log MLflow tous les N steps
+# - trace_window : fenêtre torch.profiler optionnelle -> trace Chrome en artefact MLflow
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import torch
+import mlflow
+
+try:
+    import resource  # absent sous Windows
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb() -> float:
+    """RSS pic du process (Mo) ; 0 si indisponible."""
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # octets (macOS) / Ko (Linux)
+
+
+class PhaseTimer:
+    """
+    Chrono au tour : split(phase) attribue à `phase` le temps écoulé depuis le split précédent.
+    Avec sync=True (CUDA), synchronise avant chaque mesure pour ne pas sous-compter les kernels async.
+    """
+    def __init__(self, sync: bool = False):
+        self.sync = sync
+        self.totals = {}
+        self.last = time.perf_counter()
+
+    def split(self, phase: str):
+        if self.sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def reset(self):
+        self.totals = {}
+        self.last = time.perf_counter()
+
+
+class StepProfiler:
+    """
+    Timers par phase d'une boucle (train/val). Tous les `log_every` steps, log dans MLflow :
+    <prefix>_<phase>_ms (moyenne par step), <prefix>_data_wait_frac, <prefix>_samples_s, peak_rss_mb.
+    Le compteur de steps est global (continue d'une époque à l'autre).
+    """
+    def __init__(self, prefix: str, log_every: int = 50, device=None, log_mlflow: bool = True):
+        self.prefix = prefix
+        self.log_every = int(log_every)
+        self.log_mlflow = log_mlflow
+        self.timer = PhaseTimer(sync=device is not None and torch.device(device).type == "cuda")
+        self.global_step = 0
+        self._window = ({}, 0, 0)  # (totaux, steps, samples) depuis le dernier log
+        self.epoch_totals, self.epoch_samples = {}, 0
+
+    def start(self):
+        """À appeler juste avant la boucle : le premier split 'data' mesure l'attente du 1er batch."""
+        self.timer.reset()
+        self.epoch_totals, self.epoch_samples = {}, 0
+
+    def split(self, phase: str):
+        self.timer.split(phase)
+
+    def end_step(self, samples: int):
+        totals, steps, n = self._window
+        for k, v in self.timer.totals.items():
+            totals[k] = totals.get(k, 0.0) + v
+            self.epoch_totals[k] = self.epoch_totals.get(k, 0.0) + v
+        self._window = (totals, steps + 1, n + samples)
+        self.epoch_samples += samples
+        self.timer.totals = {}
+        self.global_step += 1
+        if self.log_every > 0 and self.global_step % self.log_every == 0:
+            self._flush()
+
+    def _flush(self):
+        totals, steps, n = self._window
+        self._window = ({}, 0, 0)
+        if not self.log_mlflow or steps == 0 or mlflow.active_run() is None:
+            return
+        elapsed = sum(totals.values())
+        metrics = {f"{self.prefix}_{k}_ms": v * 1000.0 / steps for k, v in totals.items()}
+        metrics[f"{self.prefix}_data_wait_frac"] = totals.get("data", 0.0) / max(elapsed, 1e-9)
+        metrics[f"{self.prefix}_samples_s"] = n / max(elapsed, 1e-9)
+        metrics["peak_rss_mb"] = peak_rss_mb()
+        mlflow.log_metrics(metrics, step=self.global_step)
+
+    def summary(self) -> str:
+        """Répartition du temps de l'époque, ex: 'data 41% | h2d 1% | forward 27% | ...'."""
+        total = sum(self.epoch_totals.values())
+        parts = [f"{k} {v / max(total, 1e-9):.0%}" for k, v in self.epoch_totals.items()]
+        return " | ".join(parts) + f" | rss {peak_rss_mb():.0f}Mo"
+
+
+class _NoTrace:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def step(self):
+        pass
+
+
+def trace_window(enabled: bool, steps=(5, 2, 5), out_dir: str = "reports/profile", name: str = "train",
+                 device=None):
+    """
+    Fenêtre torch.profiler (wait, warmup, active steps) ; appeler .step() à chaque batch.
+    La trace Chrome (chrome://tracing, Perfetto) est écrite dans out_dir et loggée en artefact MLflow.
+    """
+    if not enabled:
+        return _NoTrace()
+    wait, warmup, active = (int(s) for s in steps)
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device is not None and torch.device(device).type == "cuda":
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    def _export(prof):
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"trace_{name}_{prof.step_num}.json")
+        prof.export_chrome_trace(path)
+        if mlflow.active_run() is not None:
+            mlflow.log_artifact(path, artifact_path="profile")
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+        on_trace_ready=_export,
+        record_shapes=True,
+    )
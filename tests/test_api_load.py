@@ -0,0 +1,42 @@
+import io
+import os
+import subprocess
+import sys
+import time
+from PIL import Image
+
+from src.benchmarks.api_load import compare, make_payloads, proc_usage, summarize
+
+def test_payloads_are_distinct_pcam_tiles():
+    payloads = make_payloads(4, formats=("tif", "png"))
+    assert [p[2] for p in payloads] == ["image/tiff", "image/png"] * 2
+    assert len({p[1] for p in payloads}) == 4
+    img = Image.open(io.BytesIO(payloads[0][1]))
+    assert img.size == (96, 96) and img.mode == "RGB"
+
+def test_summarize_and_compare():
+    records = [(0.010 * (i + 1), 200) for i in range(100)] + [(0.5, 503), (0.1, "exc:ReadTimeout")]
+    r = summarize("concurrency=4", records, 2.0, (1.0, 100.0), (2.5, 120.0), concurrency=4)
+    assert r["ok"] == 100 and r["errors"] == {"503": 1, "exc:ReadTimeout": 1}
+    assert r["throughput_rps"] == 50.0 and r["cpu_util"] == 0.75 and r["rss_mb"] == 120.0
+    assert 500 <= r["latency_ms"]["p50"] <= 510 and r["latency_ms"]["max"] == 1000.0
+
+    slow = dict(r, latency_ms=dict(r["latency_ms"], p95=r["latency_ms"]["p95"] * 1.5))
+    rows = compare({"results": [r]}, {"results": [slow, dict(r, scenario="rate=5")]})
+    assert len(rows) == 1 and rows[0]["regression"] and rows[0]["p95"] == 1.5
+    assert not compare({"results": [r]}, {"results": [r]})[0]["regression"]
+
+def test_proc_usage_counts_children():
+    # workers uvicorn = enfants du master : leur RSS doit être compté avec celui du parent
+    alone = proc_usage(os.getpid())[1]
+    child = subprocess.Popen([sys.executable, "-c", "import time; b = bytearray(64 << 20); time.sleep(30)"])
+    try:
+        for _ in range(100):
+            total = proc_usage(os.getpid())[1]
+            if total > alone + 50:
+                break
+            time.sleep(0.05)
+        assert total > alone + 50
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,20 @@
+import io, zipfile
+import pytest
+from src.serving.archive import extract_images, is_archive
+
+def _zip(members):
+    b = io.BytesIO()
+    with zipfile.ZipFile(b, "w") as z:
+        for name, data in members:
+            z.writestr(name, data)
+    return b.getvalue()
+
+def test_extract_images_keeps_order_and_skips_non_images():
+    data = _zip([("b.png", b"1"), ("notes.txt", b"x"), ("a.tif", b"22"), ("__MACOSX/._a.tif", b"3")])
+    assert is_archive("slide.zip") and not is_archive("tile.png")
+    assert extract_images(data, "slide.zip", 1024) == [("b.png", b"1"), ("a.tif", b"22")]
+
+def test_extract_images_enforces_uncompressed_limit():
+    data = _zip([("a.png", b"0" * 2048)])
+    with pytest.raises(ValueError):
+        extract_images(data, "slide.zip", 1024)
@@ -0,0 +1,38 @@
+import asyncio, time
+import pytest
+import torch
+from src.serving.batcher import MicroBatcher
+from src.serving.executor import ExecutorStage, Overloaded
+
+def test_batcher_coalesces_concurrent_requests():
+    calls = []
+    def forward(xb):
+        calls.append(xb.shape[0])
+        return xb.flatten(1).mean(1)
+
+    async def scenario():
+        b = MicroBatcher(forward, max_batch_size=8, max_wait_ms=50)
+        await b.start()
+        xs = [torch.full((3, 4, 4), float(i)) for i in range(5)]
+        out = await asyncio.gather(*(b.submit(x) for x in xs))
+        await b.stop()
+        return out, b.stats()
+
+    out, stats = asyncio.run(scenario())
+    assert out == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert calls == [5]
+    assert stats["batch_size"]["count"] == 1 and stats["queue_wait_ms"]["count"] == 5
+
+def test_stage_rejects_when_full():
+    async def scenario():
+        stage = ExecutorStage("decode", "thread", 1, max_pending=1)
+        slow = asyncio.ensure_future(stage.run(time.sleep, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await stage.run(time.sleep, 0)
+        await slow
+        stage.shutdown()
+        return stage.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["completed"] == 1 and stats["workers"] == 1
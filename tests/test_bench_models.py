@@ -0,0 +1,22 @@
+import torch.nn as nn
+
+from src.benchmarks.models import bench_cell, serving_cost
+from src.train_many import add_serving_cost, summary_table
+
+def test_bench_cell_modes():
+    model = nn.Sequential(nn.Conv2d(3, 4, 3), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(4, 1)).eval()
+    for mode in ("eager", "no_grad", "inference_mode"):
+        c = bench_cell(model, mode, 16, 2, 1, repeats=3, warmup=1)
+        assert c["img_s"] > 0 and c["latency_ms_p90"] >= c["latency_ms_p50"] > 0 and c["peak_rss_mb"] > 0
+
+def test_serving_cost_in_train_many_summary():
+    report = {"results": [{"model": "resnet18", "cold_start_s": 0.2, "cells": [
+        {"mode": "no_grad", "img_size": 96, "img_s": 120.0},
+        {"mode": "compile", "img_size": 96, "img_s": 180.0},
+        {"mode": "compile", "img_size": 224, "img_s": 30.0},
+        {"mode": "compile", "img_size": 96, "error": "boom"}]}]}
+    assert serving_cost(report, "resnet18", 224) == {"img_s": 30.0, "mode": "compile", "cold_start_s": 0.2}
+    assert serving_cost(report, "vgg16") is None
+    results = [{"model": m, "status": "ok", "best_auc": 0.9, "wall_s": 10.0} for m in ("resnet18", "vgg16")]
+    table = summary_table(add_serving_cost(results, report, 96))
+    assert "180.0" in table and table.splitlines()[2].split()[-1] == "-"
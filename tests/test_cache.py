@@ -0,0 +1,23 @@
+import time
+from src.serving.cache import DiskBackend, PredictionCache
+
+def test_cache_lru_ttl_and_invalidation():
+    c = PredictionCache(max_entries=2, ttl_s=0)
+    c.set_namespace("resnet18", "aaaa", 96)
+    c.put("a", 0.1); c.put("b", 0.2); c.get("a"); c.put("c", 0.3)
+    assert c.get("b") is None and c.get("a") == 0.1 and c.evictions == 1
+    c.set_namespace("resnet18", "bbbb", 96)
+    assert c.get("a") is None and c.invalidations == 1
+
+    c = PredictionCache(ttl_s=0.01)
+    c.set_namespace("resnet18", "aaaa", 96)
+    c.put("a", 0.1); time.sleep(0.02)
+    assert c.get("a") is None and c.expirations == 1
+
+def test_disk_backend_is_shared(tmp_path):
+    w1 = PredictionCache(backend=DiskBackend(str(tmp_path)))
+    w2 = PredictionCache(backend=DiskBackend(str(tmp_path)))
+    for c in (w1, w2):
+        c.set_namespace("resnet18", "aaaa", 96)
+    w1.put("k", 0.7)
+    assert w2.get("k") == 0.7 and w2.hits == 1
@@ -0,0 +1,35 @@
+import os
+import random
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.utils.checkpoint import AsyncCheckpointer, load_checkpoint, snapshot
+from src.utils.seed import set_seed, get_rng_state, set_rng_state
+
+def test_snapshot_is_detached_from_training():
+    model = nn.Linear(4, 1)
+    optim = torch.optim.AdamW(model.parameters(), lr=0.1)
+    model(torch.randn(2, 4)).sum().backward()
+    optim.step()
+    snap = snapshot({"model": model.state_dict(), "optim": optim.state_dict()})
+    before = snap["optim"]["state"][0]["exp_avg"].clone()
+    optim.step()
+    assert torch.equal(snap["optim"]["state"][0]["exp_avg"], before)
+    assert not torch.equal(snap["model"]["weight"], model.weight.detach())
+
+def test_async_checkpointer_atomic_roundtrip(tmp_path):
+    path = str(tmp_path / "last.pt")
+    ck = AsyncCheckpointer(path)
+    set_seed(7)
+    for epoch in (1, 2):
+        ck.save({"epoch": epoch, "w": torch.full((3,), float(epoch)), "rng": get_rng_state()})
+    ck.close()
+    assert os.listdir(tmp_path) == ["last.pt"]  # pas de .tmp résiduel
+    state = load_checkpoint(path)
+    assert state["epoch"] == 2 and torch.equal(state["w"], torch.full((3,), 2.0))
+
+    expected = (random.random(), np.random.rand(), torch.rand(1))
+    set_seed(0)
+    set_rng_state(state["rng"])
+    assert (random.random(), np.random.rand()) == expected[:2] and torch.equal(torch.rand(1), expected[2])
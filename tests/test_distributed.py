@@ -0,0 +1,37 @@
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from src.utils import distributed as ddp
+
+def _gather_worker(out_path):
+    ddp.init_distributed("gloo", threads_per_proc=1)
+    ds = TensorDataset(torch.arange(7) * 10, torch.arange(7))
+    dl = ddp.distribute_loader(DataLoader(ds, batch_size=2), shuffle=False)
+    seen = torch.cat([x for x, _ in dl])
+    gathered = ddp.all_gather_ordered(seen, len(ds))
+    total, n = ddp.all_reduce_sum(float(seen.sum()), len(seen))
+    if ddp.is_main():
+        torch.save((gathered, total, n), out_path)
+    ddp.cleanup()
+
+def test_all_gather_restores_dataset_order(tmp_path):
+    out = str(tmp_path / "out.pt")
+    ddp.spawn(_gather_worker, 3, out)
+    gathered, total, n = torch.load(out)
+    assert gathered.tolist() == [0, 10, 20, 30, 40, 50, 60]
+    assert n == 9 and total == 210 + 0 + 10  # 7 échantillons + 2 répétés par le sampler
+
+def test_scaling_always_measures_single_process_baseline():
+    from unittest.mock import patch
+    import json
+    from src.benchmarks import ddp_scaling
+
+    def fake_worker(model_name, img_size, batch_size, steps, warmup, out_path, n=1):
+        with open(out_path, "w") as f:
+            json.dump({"elapsed_s": 1.0 if n == 1 else 1.25, "threads_per_proc": 1}, f)  # 80% d'efficacité en DDP
+
+    with patch.object(ddp_scaling, "_bench_worker", fake_worker), \
+            patch.object(ddp_scaling.ddp, "spawn", lambda fn, n, *args: fn(*args, n=n)):
+        results = ddp_scaling.run_scaling(procs=(4, 2), steps=1, batch_size=1)
+    assert [r["procs"] for r in results] == [1, 2, 4]
+    assert results[0]["speedup"] == 1.0
+    assert abs(results[2]["speedup"] - 3.2) < 1e-9 and abs(results[1]["efficiency"] - 0.8) < 1e-9
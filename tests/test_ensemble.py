@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+
+from src.data.preprocess import BatchPreprocessor
+from src.models.ensemble import EnsembleEngine, combine, cross_fit_auc, fit_weights, parse_members, to_ranks
+from src.models.models import build_model
+from src.serving.registry import ModelRegistry
+from src.utils.metrics import roc_auc
+
+def test_combine_and_fit_weights():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 400)
+    good, noise = y + rng.normal(0, 0.5, 400), rng.random(400)
+    probs = np.stack([1 / (1 + np.exp(-good)), noise])
+    assert np.allclose(combine(probs, "mean"), probs.mean(0))
+    assert np.allclose(to_ranks(np.array([[0.1, 0.9, 0.5]])), [[1 / 6, 5 / 6, 0.5]])
+    assert np.allclose(to_ranks(np.array([[0.5]]), refs=[[0.0, 0.4, 0.6, 1.0]]), [[0.5]])
+    weights, auc = fit_weights(probs, y)
+    assert weights[0] > weights[1] and abs(sum(weights) - 1) < 1e-9
+    assert auc >= roc_auc(y, combine(probs, "mean")) and auc == roc_auc(y, combine(probs, "weighted", weights))
+    assert abs(cross_fit_auc(probs, y) - auc) < 0.05  # hors pli : poids ajustés sans le pli évalué
+
+def test_engine_groups_by_img_size_and_serves_from_registry(tmp_path):
+    torch.manual_seed(0)
+    torch.save(build_model("ibracancermodel").state_dict(), tmp_path / "best_ibracancermodel.pt")
+    fmt = str(tmp_path / "best_{name}.pt")
+    members = parse_members("ibracancermodel@32,ibracancermodel@48", 32, fmt)
+    engine = EnsembleEngine(members, "weighted", weights=[0.25, 0.75])
+    assert sorted(engine.groups) == [32, 48]
+    xb = torch.randint(0, 255, (3, 40, 40, 3), dtype=torch.uint8)
+    probs = engine.member_probs(xb)
+    ref = [torch.sigmoid(engine.predictor_fn("ibracancermodel")(BatchPreprocessor(s)(xb))).squeeze(1) for s in (32, 48)]
+    assert torch.allclose(probs, torch.stack(ref), atol=1e-5)
+    assert torch.allclose(engine(xb), (0.25 * probs[0] + 0.75 * probs[1]).float(), atol=1e-6)
+    engine.close()
+
+    report = tmp_path / "ensemble.json"
+    report.write_text(json.dumps({"method": "mean", "tta": 2, "runtime": "eager", "threshold_best_f1": 0.4,
+                                  "members": [{"name": m.name, "img_size": m.img_size, "checkpoint": m.weights,
+                                               "digest": "autre"} for m in members]}))
+    reg = ModelRegistry(BatchPreprocessor(32), 32, checkpoint_fmt=fmt)
+    entry = reg.add_ensemble("ensemble", str(report))
+    assert entry.predictor.tta == 2 and reg.tta == 1  # tta de l'ajustement, pas celle du registre
+    assert reg.names() == ["ibracancermodel", "ensemble"] and entry.warmup_ms > 0
+    assert reg.forward("ensemble", xb[:, :32, :32]).shape == (3,)
+    assert reg.stale_members("ensemble") == ["ibracancermodel", "ibracancermodel"]
+    with pytest.raises(RuntimeError, match="checkpoints de ibracancermodel"):
+        reg.operating_point("ensemble", "best_f1")  # poids et seuils ajustés sur un autre checkpoint
+    entry.predictor.fitted_digests = {"ibracancermodel": reg.get("ibracancermodel").digest}
+    assert reg.stale_members("ensemble") == [] and reg.operating_point("ensemble", "best_f1") == 0.4
+    reg.close()
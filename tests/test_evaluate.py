@@ -0,0 +1,54 @@
+import json
+import logging
+from unittest import mock
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src import evaluate
+from src.data.shards import pack_split
+from src.models.models import build_model
+from src.utils.checkpoint import file_digest
+
+def _shards(tmp_path, n=12):
+    rng = np.random.default_rng(0)
+    ids = [f"img{i}" for i in range(n)]
+    for i in ids:
+        Image.fromarray(rng.integers(0, 255, (96, 96, 3), dtype=np.uint8)).save(tmp_path / f"{i}.png")
+    for split in ("train", "val"):
+        pack_split(ids, [i % 2 for i in range(n)], str(tmp_path), str(tmp_path / "shards" / split),
+                   shard_size=5, workers=1)
+    return str(tmp_path / "shards")
+
+def _run(tmp_path, **kwargs):
+    torch.manual_seed(0)
+    weights = str(tmp_path / "best_ibracancermodel.pt")
+    torch.save(build_model("ibracancermodel").state_dict(), weights)
+    cfg = {"paths": {"shards_dir": _shards(tmp_path), "mlruns_dir": str(tmp_path / "mlruns")},
+           "train": {"img_size": 32, "batch_size": 5, "num_workers": 0, "data_format": "shards", "device": "cpu"},
+           "metrics": {"sweep": {"target_recall": 0.9, "curve_points": 20}}}
+    with mock.patch.object(evaluate, "mlflow"):
+        return evaluate.run_eval(cfg, logging.getLogger("test"), "ibracancermodel", weights, **kwargs)
+
+def test_run_eval_thresholds_and_curves(tmp_path):
+    out = tmp_path / "metrics.json"
+    m = _run(tmp_path, out_json=str(out), tta=2, tta_sweep=[1, 2])
+    assert {"auc", "f1", "threshold_best_f1", "f1_best", "threshold_target_recall", "target_recall",
+            "precision_at_target_recall", "specificity_at_target_recall"} <= set(m)
+    assert m["target_recall"] == 0.9 and m["tta_views"] == 2
+    saved = json.loads(out.read_text())
+    assert {k: saved[k] for k in m} == m
+    assert saved["model_name"] == "ibracancermodel" and saved["runtime"] == "eager"
+    assert saved["tta"] == 2 and saved["img_size"] == 32
+    assert saved["weights_digest"] == file_digest(str(tmp_path / "best_ibracancermodel.pt"))
+    curves = json.loads((tmp_path / "metrics_curves.json").read_text())
+    assert {"best_f1", "target_recall"} <= set(curves)
+    tta = json.loads((tmp_path / "metrics_tta.json").read_text())["tta"]
+    assert [r["views"] for r in tta] == [1, 2] and tta[1]["auc"] == m["auc"]
+
+def test_run_eval_streaming_matches_exact_auc(tmp_path):
+    exact = _run(tmp_path)
+    approx = _run(tmp_path, streaming=True)
+    assert abs(approx["auc"] - exact["auc"]) <= approx["auc_err_bound"] + 1e-9
+    assert "threshold_best_f1" not in approx
@@ -0,0 +1,35 @@
+import json
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.features import FeatureStore, attach_head, make_head, split_head
+from src.models.models import build_model
+
+def test_split_and_attach_head_all_models():
+    x = torch.randn(2, 3, 64, 64)
+    for name in ["ibracancermodel", "resnet18", "vgg16", "densenet121", "efficientnet_b0"]:
+        torch.manual_seed(0)
+        model = build_model(name, num_classes=1, pretrained=False).eval()
+        expected = model(x)
+        backbone, dim = split_head(model)
+        head = make_head(dim).eval()
+        nn.init.normal_(head[-1].weight)
+        with torch.no_grad():
+            feats = backbone(x)
+            assert tuple(feats.shape) == (2, dim)
+            torch.manual_seed(0)
+            full = attach_head(build_model(name, num_classes=1, pretrained=False).eval(), head)
+            assert torch.allclose(full(x), head(feats), atol=1e-5)
+            assert not torch.allclose(full(x), expected)
+
+def test_feature_store_reads_memmap(tmp_path):
+    d = tmp_path / "val"
+    d.mkdir()
+    feats = np.random.default_rng(0).standard_normal((5, 8)).astype(np.float16)
+    feats.tofile(d / "features.bin")
+    np.save(d / "labels.npy", np.array([0, 1, 1, 0, 1], dtype=np.int8))
+    (d / "meta.json").write_text(json.dumps({"n": 5, "dim": 8, "dtype": "float16"}))
+    store = FeatureStore(str(tmp_path), "val")
+    assert len(store) == 5 and np.array_equal(store.features[3], feats[3])
+    assert not FeatureStore.exists(str(tmp_path), "train")
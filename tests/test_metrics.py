@@ -0,0 +1,46 @@
+import numpy as np
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support, roc_auc_score
+from src.utils.metrics import StreamingBinaryMetrics, binary_metrics, threshold_sweep
+
+def test_binary_metrics_match_sklearn():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 5000)
+    for p in (rng.random(5000), np.round(rng.random(5000), 1)):  # continu / beaucoup d'ex-aequo
+        m = binary_metrics(y, p, thresh=0.5)
+        pred = (p >= 0.5).astype(int)
+        prec, rec, f1, _ = precision_recall_fscore_support(y, pred, average="binary", zero_division=0)
+        assert np.isclose(m["auc"], roc_auc_score(y, p))
+        assert np.isclose(m["accuracy"], accuracy_score(y, pred))
+        assert np.allclose([m["precision"], m["recall"], m["f1"]], [prec, rec, f1])
+
+def test_binary_metrics_degenerate():
+    m = binary_metrics([1, 1, 1], [0.2, 0.3, 0.4])
+    assert m["auc"] == 0.5 and m["precision"] == 0.0 and m["f1"] == 0.0 and m["accuracy"] == 0.0
+
+def test_streaming_metrics_agree_and_merge():
+    rng = np.random.default_rng(1)
+    y = rng.integers(0, 2, 20000)
+    p = np.clip(rng.normal(0.35 + 0.3 * y, 0.2), 0, 1)
+    exact = binary_metrics(y, p, thresh=0.5)
+
+    shards = [StreamingBinaryMetrics(thresholds=(0.3, 0.5)) for _ in range(3)]
+    for k, (yb, pb) in enumerate(zip(np.array_split(y, 40), np.array_split(p, 40))):
+        shards[k % 3].update(yb, pb)
+    merged = StreamingBinaryMetrics.from_state_dict(shards[0].state_dict()).merge(shards[1]).merge(shards[2])
+    m = merged.compute(0.5)
+    assert abs(m["auc"] - exact["auc"]) <= m["auc_err_bound"] < 1e-3
+    for k in ("accuracy", "precision", "recall", "f1"):
+        assert m[k] == exact[k]
+
+def test_threshold_sweep_matches_brute_force():
+    rng = np.random.default_rng(2)
+    y = rng.integers(0, 2, 300)
+    p = np.round(np.clip(rng.normal(0.4 + 0.2 * y, 0.2), 0, 1), 2)
+    sweep = threshold_sweep(y, p, target_recall=0.9)
+    brute = {t: binary_metrics(y, p, thresh=t) for t in np.unique(p)}
+    best_t = max(brute, key=lambda t: (brute[t]["f1"], t))
+    assert np.isclose(sweep["best_f1"]["f1"], brute[best_t]["f1"])
+    op = sweep["target_recall"]
+    assert op["recall"] >= 0.9 and np.isclose(op["recall"], brute[op["threshold"]]["recall"])
+    assert all(brute[t]["recall"] < 0.9 for t in brute if t > op["threshold"])
+    assert len(sweep["curves"]["roc"]["fpr"]) == len(sweep["curves"]["thresholds"]) + 1
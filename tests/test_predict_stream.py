@@ -0,0 +1,35 @@
+import csv
+import os
+import numpy as np
+from PIL import Image
+from torch.utils.data import DataLoader
+from src.data.preprocess import BatchPreprocessor, PreprocessCollate
+from src.predict_test import TestStream, merge_parts, open_partial, part_path, shard_range
+
+def test_stream_keeps_csv_order_across_workers(tmp_path):
+    ids = [f"img{i}" for i in range(11)]
+    for i in ids:
+        Image.fromarray(np.zeros((96, 96, 3), dtype=np.uint8)).save(tmp_path / f"{i}.png")
+    with open(tmp_path / "sub.csv", "w", newline="") as f:
+        csv.writer(f).writerows([["id", "label"]] + [[i, 0] for i in ids])
+    start, stop = shard_range(len(ids), 1, 2)
+    ds = TestStream(str(tmp_path / "sub.csv"), str(tmp_path), start + 1, stop, block_size=2)
+    dl = DataLoader(ds, batch_size=2, num_workers=2, collate_fn=PreprocessCollate(BatchPreprocessor(32)))
+    assert [i for _, b in dl for i in b] == ids[start + 1:stop]
+
+def test_resume_truncates_to_checkpoint_and_merge(tmp_path):
+    key = {"model": "m", "shard": [0, 2]}
+    path = part_path(str(tmp_path), "m", 0, 2)
+    out, done, ckpt = open_partial(path, key, resume=False)
+    out.write("a,0.1\n"); offset = out.tell(); out.write("b,0.")  # crash en pleine ligne
+    out.close()
+    with open(ckpt, "w") as f:
+        f.write(f'{{"model": "m", "shard": [0, 2], "done": 1, "offset": {offset}}}')
+    out, done, _ = open_partial(path, key, resume=True)
+    assert done == 1
+    out.write("b,0.2\n"); out.close()
+    os.replace(path + ".partial", path)
+    with open(part_path(str(tmp_path), "m", 1, 2), "w") as f:
+        f.write("id,label\nc,0.3\n")
+    with open(merge_parts(str(tmp_path), "m", 2)) as f:
+        assert f.read() == "id,label\na,0.1\nb,0.2\nc,0.3\n"
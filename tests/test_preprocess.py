@@ -0,0 +1,22 @@
+import numpy as np
+import torch
+import torchvision.transforms as T
+from PIL import Image
+from src.data.preprocess import BatchPreprocessor, stack_tiles
+
+def _reference(tile, size):
+    return T.Compose([T.Resize((size, size)), T.ToTensor(),
+                      T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])])(Image.fromarray(tile))
+
+def test_batch_preprocessor_matches_torchvision():
+    rng = np.random.default_rng(0)
+    tiles = [rng.integers(0, 255, (96, 96, 3), dtype=np.uint8) for _ in range(3)]
+    xb = stack_tiles(tiles, 96)
+    out = BatchPreprocessor(96)(xb)
+    ref = torch.stack([_reference(t, 96) for t in tiles])
+    assert out.is_contiguous() and torch.allclose(out, ref, atol=1e-5)
+
+    out = BatchPreprocessor(128, channels_last=True)(xb)
+    assert tuple(out.shape) == (3, 3, 128, 128) and out.is_contiguous(memory_format=torch.channels_last)
+    ref = torch.stack([_reference(t, 128) for t in tiles])
+    assert (out - ref).abs().mean() < 0.05
@@ -0,0 +1,15 @@
+import time
+from src.utils.profiling import StepProfiler, peak_rss_mb, trace_window
+
+def test_step_profiler_accumulates_phases():
+    prof = StepProfiler("train", log_every=1)  # pas de run MLflow actif : log ignoré
+    prof.start()
+    for _ in range(3):
+        time.sleep(0.002); prof.split("data")
+        time.sleep(0.001); prof.split("forward")
+        prof.end_step(8)
+    assert prof.global_step == 3 and prof.epoch_samples == 24
+    assert prof.epoch_totals["data"] > prof.epoch_totals["forward"] > 0
+    assert "data" in prof.summary() and peak_rss_mb() > 0
+    with trace_window(False) as trace:
+        trace.step()
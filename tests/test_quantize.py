@@ -0,0 +1,47 @@
+import logging
+from unittest import mock
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src import quantize
+from src.models.models import build_model
+from src.models.runtime import artifact_path, load_predictor
+
+def _loader(n=16, img=32):
+    torch.manual_seed(0)
+    return DataLoader(TensorDataset(torch.randn(n, 3, img, img), torch.arange(n) % 2), batch_size=8)
+
+def _weights(tmp_path):
+    torch.manual_seed(0)
+    path = str(tmp_path / "best_ibracancermodel.pt")
+    torch.save(build_model("ibracancermodel").state_dict(), path)
+    return path
+
+def test_dynamic_and_static_ptq_roundtrip(tmp_path):
+    weights = _weights(tmp_path)
+    x = torch.randn(3, 3, 32, 32)
+    dyn = quantize.quantize_dynamic_linear(quantize.load_eager("ibracancermodel", weights, "cpu"))
+    assert dyn(x).shape == (3, 1)
+
+    static = quantize.quantize_static(quantize.load_eager("ibracancermodel", weights, "cpu"), _loader(), calib_batches=2)
+    out_path = quantize.save_int8(static, 32, artifact_path(weights, "int8"))
+    assert out_path.endswith(".int8.ts")
+    int8 = load_predictor("ibracancermodel", weights, runtime="int8")
+    with torch.no_grad():
+        assert int8(x).shape == (3, 1)
+        assert torch.allclose(int8(x), static(x), atol=1e-5)
+
+def test_report_keys(tmp_path):
+    weights = _weights(tmp_path)
+    cfg = {"paths": {"shards_dir": str(tmp_path), "mlruns_dir": str(tmp_path / "mlruns")},
+           "train": {"img_size": 32, "batch_size": 8, "num_workers": 0, "data_format": "shards"}}
+    with mock.patch.object(quantize, "get_shard_loaders", return_value=(None, _loader())), \
+            mock.patch.object(quantize, "mlflow"):
+        report = quantize.run_quantize(cfg, logging.getLogger("test"), "ibracancermodel", weights, mode="dynamic",
+                                       calib_batches=2, out_json=str(tmp_path / "quant.json"))
+    assert {"mode", "engine", "img_size", "fp32", "int8", "auc_delta", "speedup"} <= set(report)
+    for tag in ("fp32", "int8"):
+        assert {"auc", "throughput_img_s", "latency_ms_bs1", "latency_ms_bs32", "size_mb"} <= set(report[tag])
+    assert report["auc_delta"] == report["int8"]["auc"] - report["fp32"]["auc"]
+    assert (tmp_path / "quant.json").exists()
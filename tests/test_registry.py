@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+import torch
+
+from src.data.preprocess import BatchPreprocessor
+from src.models.models import build_model
+from src.serving.registry import ModelRegistry
+from src.utils.checkpoint import file_digest
+
+def _save(path, seed):
+    torch.manual_seed(seed)
+    torch.save(build_model("ibracancermodel").state_dict(), path)
+
+def _touch(path, t):
+    os.utime(path, ns=(t, t))
+
+def test_registry_load_route_and_hot_swap(tmp_path):
+    ckpt = str(tmp_path / "best_ibracancermodel.pt")
+    _save(ckpt, 0)
+    reg = ModelRegistry(BatchPreprocessor(32), 32, checkpoint_fmt=str(tmp_path / "best_{name}.pt"))
+    entry = reg.load("ibracancermodel")
+    assert reg.default == "ibracancermodel" and entry.memory_mb > 0 and entry.warmup_ms > 0
+    xb = torch.randint(0, 255, (3, 32, 32, 3), dtype=torch.uint8)
+    before = reg.forward("ibracancermodel", xb)
+    assert before.shape == (3,)
+
+    _save(ckpt, 1)
+    _touch(ckpt, 10**18)
+    assert reg.check_updates() == []  # 1er poll : fichier modifié, on attend qu'il soit stable
+    old = reg.get()
+    swapped = reg.check_updates()
+    assert len(swapped) == 1 and reg.get().version == 2 and reg.swaps == 1
+    assert not torch.allclose(reg.forward("ibracancermodel", xb), before)
+    assert torch.allclose(reg._forward_with(old.predictor, xb), before)  # requêtes en vol : ancien modèle intact
+
+    with open(ckpt, "wb") as f:
+        f.write(b"corrompu")
+    _touch(ckpt, 2 * 10**18)
+    reg.check_updates(), reg.check_updates()
+    assert reg.get().version == 2 and reg.info()["models"]["ibracancermodel"]["version"] == 2
+
+def test_operating_point_checks_served_model(tmp_path):
+    ckpt = str(tmp_path / "best_ibracancermodel.pt")
+    _save(ckpt, 0)
+    reg = ModelRegistry(BatchPreprocessor(32), 32, checkpoint_fmt=str(tmp_path / "best_{name}.pt"))
+    reg.load("ibracancermodel")
+    fmt = str(tmp_path / "metrics_{name}.json")
+    report = {"threshold_best_f1": 0.3, "threshold_target_recall": 0.1, "model_name": "ibracancermodel",
+              "weights_digest": file_digest(ckpt), "runtime": "eager", "tta": 1, "img_size": 32}
+    (tmp_path / "metrics_ibracancermodel.json").write_text(json.dumps(report))
+    assert reg.operating_point("ibracancermodel", "target_recall", fmt) == 0.1
+
+    (tmp_path / "metrics_ibracancermodel.json").write_text(json.dumps(dict(report, tta=2, runtime="int8")))
+    with pytest.raises(RuntimeError, match="runtime, tta"):
+        reg.operating_point("ibracancermodel", "best_f1", fmt)
+
+    (tmp_path / "metrics_ibracancermodel.json").write_text(json.dumps(report))
+    _save(ckpt, 1)
+    _touch(ckpt, 10**18)
+    reg.check_updates(), reg.check_updates()  # checkpoint rechargé : le rapport décrit l'ancien
+    with pytest.raises(RuntimeError, match="weights_digest"):
+        reg.operating_point("ibracancermodel", "best_f1", fmt)
+    with pytest.raises(RuntimeError, match="introuvable"):
+        reg.operating_point("ibracancermodel", "best_f1", str(tmp_path / "absent.json"))
@@ -0,0 +1,19 @@
+import pytest
+import torch
+from src.export import export_onnx, export_torchscript
+from src.models.models import build_model
+from src.models.runtime import artifact_path, check_parity, load_predictor
+
+def test_exported_runtimes_match_eager(tmp_path):
+    weights = str(tmp_path / "best_ibracancermodel.pt")
+    model = build_model("ibracancermodel").eval()
+    torch.save(model.state_dict(), weights)
+
+    export_torchscript(model, 96, artifact_path(weights, "torchscript"))
+    ts = load_predictor("ibracancermodel", weights, "torchscript")
+    assert check_parity(model, ts, 96, batch_sizes=(1, 3)) <= 1e-4
+
+    pytest.importorskip("onnxruntime")
+    export_onnx(model, 96, artifact_path(weights, "onnxruntime"))
+    ort = load_predictor("ibracancermodel", weights, "onnxruntime")
+    assert check_parity(model, ort, 96, batch_sizes=(1, 3)) <= 1e-4
@@ -0,0 +1,15 @@
+from src.search import asha_continue, asha_rungs, sample_space
+
+def test_sample_space_is_seeded_and_bounded():
+    space = {"lr": {"type": "loguniform", "low": 1e-4, "high": 1e-2},
+             "model_name": {"type": "choice", "values": ["resnet18", "ibracancermodel"]}}
+    a, b = sample_space(space, 20, seed=0), sample_space(space, 20, seed=0)
+    assert a == b and all(1e-4 <= t["lr"] <= 1e-2 for t in a)
+    assert {t["model_name"] for t in a} == {"resnet18", "ibracancermodel"}
+
+def test_asha_rule():
+    assert asha_rungs(1, 3, 9) == [1, 3]
+    assert asha_continue([0.7], 0.7, eta=3)  # trop tôt pour élaguer
+    scores = [0.9, 0.8, 0.7, 0.6, 0.5, 0.55]
+    assert asha_continue(scores, 0.9, eta=3) and asha_continue(scores, 0.8, eta=3)
+    assert not asha_continue(scores, 0.7, eta=3)
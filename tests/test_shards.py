@@ -0,0 +1,24 @@
+import numpy as np
+import torch
+from PIL import Image
+from src.data.preprocess import BatchPreprocessor, PreprocessCollate
+from src.data.shards import ShardDataset, pack_split
+
+def test_pack_and_read_shards(tmp_path):
+    rng = np.random.default_rng(0)
+    ids = [f"img{i}" for i in range(5)]
+    tiles = {}
+    for i in ids:
+        tiles[i] = rng.integers(0, 255, (96, 96, 3), dtype=np.uint8)
+        Image.fromarray(tiles[i]).save(tmp_path / f"{i}.png")
+    pack_split(ids, [0, 1, 0, 1, None], str(tmp_path), str(tmp_path / "shards" / "val"), shard_size=2, workers=1)
+
+    ds = ShardDataset(str(tmp_path / "shards"), "val")
+    assert len(ds) == 5 and len(ds.meta["shards"]) == 3
+    img, label = ds[3]
+    assert img.dtype == torch.uint8 and np.array_equal(img.numpy(), tiles["img3"]) and label == 1
+    assert ds[4][1] == -1
+
+    ds = ShardDataset(str(tmp_path / "shards"), "val", return_ids=True)
+    xb, ids = PreprocessCollate(BatchPreprocessor(64))([ds[2], ds[0]])
+    assert tuple(xb.shape) == (2, 3, 64, 64) and ids == ["img2", "img0"]
@@ -0,0 +1,28 @@
+from src.serving.telemetry import Counter, Histogram, MetricsRegistry
+
+def test_counter_labels():
+    c = Counter(("endpoint", "status"))
+    c.inc(endpoint="/predict", status=200)
+    c.inc(2, endpoint="/predict", status=200)
+    c.inc(endpoint="/predict", status=400)
+    assert sorted(c.samples(), key=lambda s: s[0]["status"]) == [
+        ({"endpoint": "/predict", "status": "200"}, 3.0), ({"endpoint": "/predict", "status": "400"}, 1.0)]
+
+def test_render_prometheus_text():
+    reg = MetricsRegistry()
+    reg.counter("req_total", "Requêtes", ("label",)).inc(label='a"b')
+    h = reg.histogram("decode_seconds", "Décodage", (0.01, 0.1))
+    for v in (0.005, 0.05, 1.0):
+        h.observe(v)
+    wait_ms = Histogram((1, 10))
+    wait_ms.observe(5)
+    reg.register("wait_seconds", "Attente", "histogram", lambda: [({"model": "m"}, wait_ms)], scale=1e-3)
+    reg.register("depth", "File", "gauge", lambda: [({}, 3)])
+    lines = reg.render().splitlines()
+    assert "# TYPE req_total counter" in lines
+    assert 'req_total{label="a\\"b"} 1.0' in lines
+    assert ['decode_seconds_bucket{le="0.01"} 1', 'decode_seconds_bucket{le="0.1"} 2',
+            'decode_seconds_bucket{le="+Inf"} 3', "decode_seconds_count 3"] == [
+        l for l in lines if l.startswith(("decode_seconds_bucket", "decode_seconds_count"))]
+    assert 'wait_seconds_bucket{model="m",le="0.01"} 1' in lines and 'wait_seconds_sum{model="m"} 0.005' in lines
+    assert "depth 3.0" in lines
@@ -0,0 +1,38 @@
+import logging
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+
+from src import train
+
+def _fit(accum_steps, batch_size, n=8):
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Flatten(), nn.Linear(12, 1))
+    x, y = torch.randn(n, 3, 2, 2), torch.randint(0, 2, (n,))
+    optim = torch.optim.SGD(model.parameters(), lr=0.1)
+    dl = DataLoader(TensorDataset(x, y), batch_size=batch_size)
+    loss, img_s = train.train_one_epoch(model, dl, torch.device("cpu"), optim, nn.BCEWithLogitsLoss(),
+                                        logging.getLogger("test"), accum_steps=accum_steps)
+    return model[1].weight.detach(), loss, img_s
+
+def test_grad_accumulation_matches_full_batch():
+    w_full, loss_full, _ = _fit(accum_steps=1, batch_size=8)
+    w_accum, loss_accum, img_s = _fit(accum_steps=4, batch_size=2)
+    assert torch.allclose(w_full, w_accum, atol=1e-6)
+    assert abs(loss_full - loss_accum) < 1e-6 and img_s > 0
+
+def test_grad_accumulation_last_short_group():
+    # 5 micro-batchs de 2, groupes de 2 : [2, 2, 1] micro-batchs == batchs de 4, 4, 2
+    w_ref, loss_ref, _ = _fit(accum_steps=1, batch_size=4, n=10)
+    w_accum, loss_accum, _ = _fit(accum_steps=2, batch_size=2, n=10)
+    assert torch.allclose(w_ref, w_accum, atol=1e-6)
+    assert abs(loss_ref - loss_accum) < 1e-6
+
+def test_threads_budget_is_split_between_ddp_ranks(monkeypatch):
+    from unittest import mock
+    monkeypatch.setattr("sys.argv", ["train", "--model", "ibracancermodel", "--threads", "4", "--nproc", "2"])
+    with mock.patch.object(train.ddp, "spawn") as spawn, mock.patch.object(train.torch, "set_num_threads"), \
+            mock.patch.object(train, "setup_logging", return_value=logging.getLogger("test")):
+        train.main()
+    fn, nproc, *args = spawn.call_args.args
+    assert fn is train._ddp_worker and nproc == 2 and args[-1] == 2  # 4 threads du run / 2 ranks
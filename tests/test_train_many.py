@@ -0,0 +1,48 @@
+import logging
+import os
+import sys
+from argparse import Namespace
+
+from src import train_many
+
+STUB = """
+import json, os, sys, time
+model, result_json, out = sys.argv[1], sys.argv[2], sys.argv[3]
+t0 = time.time()
+time.sleep(0.6)
+print("run", model)
+with open(os.path.join(out, model + ".span"), "w") as f:
+    f.write(f"{t0} {time.time()} {os.environ['OMP_NUM_THREADS']}")
+if model == "bad":
+    sys.exit(3)
+with open(result_json, "w") as f:
+    json.dump({"best_auc": 0.5}, f)
+"""
+
+def test_run_jobs_cap_isolation_and_logs(tmp_path, monkeypatch, caplog):
+    out = tmp_path / "spans"
+    out.mkdir()
+    monkeypatch.setattr(train_many, "build_cmd",
+                        lambda m, args, threads, result_json: [sys.executable, "-c", STUB, m, result_json, str(out)])
+    cpu = os.cpu_count() or 1
+    args = Namespace(jobs=2, threads=cpu + 1, affinity=False)
+    models = ["a", "bad", "c", "d"]
+    with caplog.at_level(logging.WARNING):
+        results = train_many.run_jobs(models, args, logging.getLogger("test"), log_dir=str(tmp_path / "logs"))
+
+    assert "thread(s) par run" in caplog.text  # jobs x threads > cœurs : threads ramenés
+    assert [r["model"] for r in results] == models
+    assert [r["status"] for r in results] == ["ok", "failed (3)", "ok", "ok"]
+    assert results[1]["best_auc"] is None and results[0]["best_auc"] == 0.5
+    for m, r in zip(models, results):
+        assert r["log"] == str(tmp_path / "logs" / f"{m}.log")
+        assert open(r["log"]).read().strip() == f"run {m}"
+
+    spans = [tuple(map(float, (out / f"{m}.span").read_text().split())) for m in models]
+    assert {int(s[2]) for s in spans} == {max(1, cpu // 2)}
+    events = sorted([(s[0], 1) for s in spans] + [(s[1], -1) for s in spans], key=lambda e: (e[0], e[1]))
+    running = peak = 0
+    for _, d in events:
+        running += d
+        peak = max(peak, running)
+    assert peak <= 2
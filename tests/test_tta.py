@@ -0,0 +1,30 @@
+import pytest
+import torch
+
+from src.models.models import build_model
+from src.models.tta import expand_views, reduce_views, tta_forward
+
+def test_views_are_the_dihedral_group():
+    x = torch.arange(2 * 3 * 4 * 4, dtype=torch.float32).view(2, 3, 4, 4)
+    v = expand_views(x, 8)
+    assert v.shape == (16, 3, 4, 4)
+    views = v.view(8, 2, 3, 4, 4)
+    assert len({tuple(views[k, 0].flatten().tolist()) for k in range(8)}) == 8
+    assert torch.equal(views[0], x) and torch.equal(views[4], torch.rot90(x, 1, (2, 3)))
+    assert torch.allclose(reduce_views(v.sum((2, 3)), 8), x.sum((2, 3)))  # statistique invariante par les vues
+
+def test_tta_forward_matches_separate_forwards():
+    torch.manual_seed(0)
+    model = build_model("ibracancermodel").eval()
+    x = torch.randn(3, 3, 32, 32)
+    with torch.no_grad():
+        out = tta_forward(model, x, 4)
+        ref = torch.stack([model(x), model(x.flip(-1)), model(x.flip(-2)), model(x.flip(-2, -1))]).mean(0)
+    assert out.shape == (3, 1)
+    assert torch.allclose(out, ref, atol=1e-5)
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        expand_views(torch.zeros(1, 3, 4, 4), 3)
+    with pytest.raises(ValueError):
+        expand_views(torch.zeros(1, 3, 4, 6), 8)